@@ -1,12 +1,61 @@
-import re
+import hashlib
 import streamlit as st
 import pandas as pd
-from datetime import date, datetime, timedelta, time
-from io import BytesIO
-from copy import copy as pycopy
-
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
+from datetime import date, time, timedelta
+
+from engine import (
+    APPT_COL,
+    ASSIGNMENT_MODES,
+    DUP_KEEP_COL,
+    DUP_KEY_COL,
+    FORECAST_WEEKS,
+    LOAD_MODES,
+    PRE_PLAN_WEEK_OFFSETS,
+    SWEEP_LOADS_AS_SET,
+    WEEKDAYS,
+    BackgroundPlan,
+    PlanBoard,
+    PlanCache,
+    PrePlanner,
+    build_neighbour_index,
+    build_scenario_grid,
+    compare_assignment_modes,
+    copy_plan_result,
+    derive_work_frame,
+    forecast_clearance,
+    job_key,
+    monday_of_week,
+    parse_adjacency,
+    plan_cache_key,
+    plan_quality_metrics,
+    plan_rows_frame,
+    reband_work_frame,
+    roll_forward_frame,
+    run_scenario_sweep,
+    settings_fingerprint,
+    with_duplicate_rows,
+    work_frame_fingerprint,
+)
+from export import (
+    URGENCY_COLORS,
+    build_export_pack,
+    build_lean_export_csv,
+    build_lean_export_workbook,
+    build_metrics_workbook,
+    build_styled_completed_archive,
+    build_styled_completed_weeks,
+    build_styled_completed_workbook,
+    build_values_export_workbook,
+)
+from ingest import (
+    COLUMN_CANDIDATES,
+    INGEST_TAG_COLS,
+    ingested_sheets,
+    is_workbook,
+    pick_col,
+    read_area_centroids,
+    read_backlogs,
+)
 
 # =========================================================
 # Flowboard — MVP v0.3
@@ -196,281 +245,54 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-LOAD_MODES = ["Light", "Normal", "Heavy"]  # Heavy = +20%
-LOAD_MULTIPLIER = {"Light": 0.85, "Normal": 1.00, "Heavy": 1.20}
-
-EXPORT_SHEET_NAME = "Completed Schedule"
-EXPORT_DATE_COL = "Survey_Date"
-EXPORT_AMPM_COL = "am_pm"
-EXPORT_ISO_WEEK_COL = "ISO_Week"
-
-
-def monday_of_week(d: date) -> date:
-    return d - timedelta(days=d.weekday())
-
-
-def as_date(x):
-    if pd.isna(x):
-        return None
-    if isinstance(x, date) and not isinstance(x, datetime):
-        return x
-    if isinstance(x, datetime):
-        return x.date()
-    try:
-        return pd.to_datetime(x).date()
-    except Exception:
-        return None
-
-
-def pick_col(cols, candidates):
-    """Return first matching column (case-insensitive contains). Works even if Excel has date headers."""
-    cols_str = [str(c) for c in cols]
-    cols_lower = {c.lower(): orig for c, orig in zip(cols_str, cols)}
-    for cand in candidates:
-        for c_str, orig in zip(cols_str, cols):
-            if cand in c_str.lower():
-                return orig
-    for cand in candidates:
-        if cand in cols_lower:
-            return cols_lower[cand]
-    return None
 
-
-def normalize_address(row, number_col, street_col, suburb_col, city_col):
-    parts = []
-    if number_col and pd.notna(row.get(number_col, None)):
-        parts.append(str(row[number_col]).strip())
-    if street_col and pd.notna(row.get(street_col, None)):
-        parts.append(str(row[street_col]).strip())
-    addr = " ".join(parts).strip()
-
-    loc_parts = []
-    if suburb_col and pd.notna(row.get(suburb_col, None)):
-        loc_parts.append(str(row[suburb_col]).strip())
-    if city_col and pd.notna(row.get(city_col, None)):
-        loc_parts.append(str(row[city_col]).strip())
-    loc = ", ".join([p for p in loc_parts if p])
-
-    return addr if not loc else f"{addr} — {loc}"
+# -----------------------------
+# Shared cache: one copy per server process, not per session
+# -----------------------------
+SHARED_BACKLOG_ENTRIES = 8
+SHARED_WORK_FRAME_ENTRIES = 32
 
 
-def cutoff_date(target_date: date):
-    return (target_date + timedelta(days=30)) if target_date else None
+def backlog_content_key(files) -> tuple:
+    """(name, sha256) per uploaded file, so identical uploads from different sessions share one key."""
+    return tuple((name, hashlib.sha256(data).hexdigest()) for name, data in files)
 
 
-def urgency_band(target_date: date, week_start: date):
+@st.cache_resource(max_entries=SHARED_BACKLOG_ENTRIES, show_spinner="Reading backlog...")
+def shared_backlog(content_key: tuple, all_sheets: bool, _files):
     """
-    Bible + fix:
-    - Dark Blue if last-chance week OR already overdue (cutoff passed).
-    - Light Blue if 1-2 weeks before last-chance week.
+    Ingested backlog + source bytes, shared by every session that uploads the same files (LRU).
+    Read-only: derivation and planning only take copy-on-write shallow copies.
     """
-    if not target_date:
-        return "Flexible"
-
-    window_close = cutoff_date(target_date)
-    last_week_start = monday_of_week(window_close)
-
-    # overdue or last-chance week
-    if week_start >= last_week_start:
-        return "Dark Blue"
-
-    if week_start in (last_week_start - timedelta(days=7), last_week_start - timedelta(days=14)):
-        return "Light Blue"
-
-    return "Flexible"
-
-
-def futile_rank(status_val):
-    if status_val is None or (isinstance(status_val, float) and pd.isna(status_val)):
-        return 0
-    s = str(status_val).strip().lower()
-    if "futile 2" in s or "futile2" in s:
-        return 2
-    if "futile 1" in s or "futile1" in s:
-        return 1
-    return 0
-
+    return read_backlogs(list(_files), all_sheets=all_sheets), dict(_files)
 
-def estimate_minutes(bedrooms, inspection_type=None):
-    try:
-        b = int(float(bedrooms))
-    except Exception:
-        b = None
-
-    if b is None:
-        base = 15
-    elif b <= 1:
-        base = 7
-    elif b <= 3:
-        base = 15
-    else:
-        base = 40
 
-    if inspection_type:
-        t = str(inspection_type).lower()
-        if "plus" in t or "full" in t or "condition" in t:
-            base = int(base * 1.35)
+@st.cache_resource(max_entries=SHARED_BACKLOG_ENTRIES, show_spinner=False)
+def shared_derived_frame(backlog_key: tuple, colmap_items: tuple, _df, _week_start: date):
+    """Derived working frame per (backlog, mapping), banded for whichever week asked first (LRU). Read-only."""
+    return derive_work_frame(_df, dict(colmap_items), _week_start)
 
-    return base
 
+@st.cache_resource(max_entries=SHARED_WORK_FRAME_ENTRIES, show_spinner=False)
+def shared_work_frame(backlog_key: tuple, colmap_items: tuple, week_start: date, _df):
+    """
+    Working frame per (backlog, mapping, week), shared across sessions (LRU). Read-only.
+    Labels, minutes and keys are derived once; another week only re-bands urgency.
+    """
+    base = shared_derived_frame(backlog_key, colmap_items, _df=_df, _week_start=week_start)
+    return reband_work_frame(base, week_start)
 
-def session_capacity_minutes(time_mode, global_times, day_override_times, day_name, session_name, load_mode):
-    times = day_override_times.get(day_name) or global_times
 
-    if time_mode == "Inspection window":
-        start_t = times["start_first"]
-        end_t = times["latest_arrival_last"]
-    else:
-        start_t = times["depart_depot"]
-        end_t = times["return_depot"]
+@st.cache_resource(max_entries=SHARED_BACKLOG_ENTRIES, show_spinner=False)
+def shared_area_centroids(content_key: tuple, _data: bytes):
+    """{area: (lat, lon)} from an uploaded centroid table, shared across sessions (LRU)."""
+    return read_area_centroids(content_key[0], _data)
 
-    if not (start_t and end_t):
-        base_minutes = 240
-    else:
-        dt0 = datetime.combine(date.today(), start_t)
-        dt1 = datetime.combine(date.today(), end_t)
-        base_minutes = max(0, int((dt1 - dt0).total_seconds() // 60))
-
-    sess = int(base_minutes * 0.55) if session_name == "AM" else int(base_minutes * 0.45)
-    sess = int(sess * LOAD_MULTIPLIER[load_mode])
-    sess = int(sess * 0.90)  # safety buffer
-    return max(60, sess)
-
-
-# -----------------------------
-# Excel styled export
-# -----------------------------
-def find_or_add_column(ws, header_name: str) -> int:
-    max_col = ws.max_column
-    for c in range(1, max_col + 1):
-        val = ws.cell(row=1, column=c).value
-        if str(val).strip() == header_name:
-            return c
-
-    new_col = max_col + 1
-    hdr_cell = ws.cell(row=1, column=new_col)
-    hdr_cell.value = header_name
-
-    if max_col >= 1:
-        prev = ws.cell(row=1, column=max_col)
-        hdr_cell._style = pycopy(prev._style)
-        hdr_cell.font = pycopy(prev.font)
-        hdr_cell.fill = pycopy(prev.fill)
-        hdr_cell.border = pycopy(prev.border)
-        hdr_cell.alignment = pycopy(prev.alignment)
-        hdr_cell.number_format = prev.number_format
-        hdr_cell.protection = pycopy(prev.protection)
-
-    ws.column_dimensions[get_column_letter(new_col)].width = max(
-        14, ws.column_dimensions[get_column_letter(max_col)].width or 14
-    )
-    return new_col
-
-
-def copy_row_with_styles(ws_src, ws_dst, src_row: int, dst_row: int, max_col: int):
-    for c in range(1, max_col + 1):
-        cell_src = ws_src.cell(row=src_row, column=c)
-        cell_dst = ws_dst.cell(row=dst_row, column=c)
-
-        cell_dst.value = cell_src.value
-
-        cell_dst._style = pycopy(cell_src._style)
-        cell_dst.font = pycopy(cell_src.font)
-        cell_dst.fill = pycopy(cell_src.fill)
-        cell_dst.border = pycopy(cell_src.border)
-        cell_dst.alignment = pycopy(cell_src.alignment)
-        cell_dst.number_format = cell_src.number_format
-        cell_dst.protection = pycopy(cell_src.protection)
-
-        if cell_src.comment:
-            cell_dst.comment = pycopy(cell_src.comment)
-
-
-def build_styled_completed_workbook(original_bytes: bytes, plan_df: pd.DataFrame) -> bytes:
-    wb = load_workbook(BytesIO(original_bytes))
-    ws_src = wb.active
-
-    date_col_idx = find_or_add_column(ws_src, EXPORT_DATE_COL)
-    ampm_col_idx = find_or_add_column(ws_src, EXPORT_AMPM_COL)
-    iso_week_col_idx = find_or_add_column(ws_src, EXPORT_ISO_WEEK_COL)
-
-    if plan_df is None or plan_df.empty:
-        if EXPORT_SHEET_NAME in wb.sheetnames:
-            del wb[EXPORT_SHEET_NAME]
-        ws_out = wb.create_sheet(EXPORT_SHEET_NAME)
-
-        max_col = ws_src.max_column
-        max_row = ws_src.max_row
-        for r in range(1, max_row + 1):
-            copy_row_with_styles(ws_src, ws_out, r, r, max_col)
-
-        out = BytesIO()
-        wb.active = wb.sheetnames.index(EXPORT_SHEET_NAME)
-        wb.save(out)
-        return out.getvalue()
-
-    # write planned fields into source sheet
-    for _, r in plan_df.iterrows():
-        excel_row = int(r["_excel_row"])
-        pdate = r.get("_planned_date")
-        psess = r.get("_planned_session")
-        if pd.notna(pdate) and pdate is not None:
-            ws_src.cell(row=excel_row, column=date_col_idx).value = pdate
-            try:
-                ws_src.cell(row=excel_row, column=iso_week_col_idx).value = int(as_date(pdate).isocalendar()[1])
-            except Exception:
-                ws_src.cell(row=excel_row, column=iso_week_col_idx).value = None
-        if psess:
-            ws_src.cell(row=excel_row, column=ampm_col_idx).value = str(psess)
-
-    plan_sorted = plan_df.copy()
-    plan_sorted["_planned_date_sort"] = plan_sorted["_planned_date"].apply(lambda x: x if isinstance(x, date) else as_date(x))
-    plan_sorted["_sess_sort"] = plan_sorted["_planned_session"].map({"AM": 0, "PM": 1}).fillna(9)
-    plan_sorted = plan_sorted.sort_values(by=["_planned_date_sort", "_sess_sort", "_planned_seq"], ascending=True)
-
-    scheduled_rows = [int(x) for x in plan_sorted["_excel_row"].tolist()]
-    scheduled_set = set(scheduled_rows)
-
-    if EXPORT_SHEET_NAME in wb.sheetnames:
-        del wb[EXPORT_SHEET_NAME]
-    ws_out = wb.create_sheet(EXPORT_SHEET_NAME)
-
-    max_col = ws_src.max_column
-    max_row = ws_src.max_row
-
-    copy_row_with_styles(ws_src, ws_out, 1, 1, max_col)
-    out_row = 2
-
-    for src_r in scheduled_rows:
-        if 2 <= src_r <= max_row:
-            copy_row_with_styles(ws_src, ws_out, src_r, out_row, max_col)
-            out_row += 1
-
-    for src_r in range(2, max_row + 1):
-        if src_r not in scheduled_set:
-            copy_row_with_styles(ws_src, ws_out, src_r, out_row, max_col)
-            out_row += 1
-
-    for c in range(1, max_col + 1):
-        col_letter = get_column_letter(c)
-        ws_out.column_dimensions[col_letter].width = ws_src.column_dimensions[col_letter].width
-
-        # Ensure the export OPENS on the sorted sheet
-    try:
-        ws_out = wb[EXPORT_SHEET_NAME]
-        wb.active = wb.sheetnames.index(EXPORT_SHEET_NAME)
-        # Move Completed Schedule to be the first tab (optional but helps clarity)
-        wb._sheets.remove(ws_out)
-        wb._sheets.insert(0, ws_out)
-        wb.active = 0
-    except Exception:
-        pass
-
-    out = BytesIO()
-    wb.save(out)
-    return out.getvalue()
 
+@st.cache_resource(max_entries=SHARED_WORK_FRAME_ENTRIES, show_spinner=False)
+def shared_neighbour_index(areas: tuple, centroid_key, adjacency_text: str, _centroids):
+    """Neighbour index per (backlog areas, centroid table, adjacency), built once and shared (LRU)."""
+    return build_neighbour_index(areas, _centroids, parse_adjacency(adjacency_text))
 
 
 # -----------------------------
@@ -482,12 +304,36 @@ if "df" not in st.session_state:
     st.session_state.df = None
 if "original_bytes" not in st.session_state:
     st.session_state.original_bytes = None
+if "source_files" not in st.session_state:
+    st.session_state.source_files = {}
+if "backlog_key" not in st.session_state:
+    st.session_state.backlog_key = None
 if "colmap" not in st.session_state:
     st.session_state.colmap = {}
 if "plan" not in st.session_state:
     st.session_state.plan = None
 if "plan_df" not in st.session_state:
     st.session_state.plan_df = None
+if "plan_run" not in st.session_state:
+    st.session_state.plan_run = None
+if "carry_over" not in st.session_state:
+    st.session_state.carry_over = None
+if "rolled_weeks" not in st.session_state:
+    st.session_state.rolled_weeks = {}  # {week_start: write-back plan} of weeks rolled forward from
+if "pending_week_start" not in st.session_state:
+    st.session_state.pending_week_start = None
+if "pinned" not in st.session_state:
+    st.session_state.pinned = {}
+if "plan_board" not in st.session_state:
+    st.session_state.plan_board = None
+if "plan_cache" not in st.session_state:
+    st.session_state.plan_cache = PlanCache()
+if "pre_plan" not in st.session_state:
+    st.session_state.pre_plan = None
+if "work_fingerprint" not in st.session_state:
+    st.session_state.work_fingerprint = None
+if "plan_metrics" not in st.session_state:
+    st.session_state.plan_metrics = None  # (plan_df, plan_quality_metrics) for the plan on screen
 
 
 # -----------------------------
@@ -530,20 +376,36 @@ and using light location grouping to keep each day achievable.
 with st.sidebar:
     st.subheader("Week Setup")
 
-    uploaded = st.file_uploader("Import Backlog (Excel)", type=["xlsx", "xls"])
-    if uploaded is not None:
-        st.session_state.original_bytes = uploaded.getvalue()
-        st.session_state.df = pd.read_excel(BytesIO(st.session_state.original_bytes))
+    uploaded = st.file_uploader("Import Backlog (Excel / CSV / Parquet)", type=["xlsx", "xls", "csv", "parquet"], accept_multiple_files=True)
+    all_sheets = st.checkbox("Read every sheet", value=False, key="all_sheets")
+    if uploaded:
+        # Only re-parse when the uploaded content changes (several regional files merge into one backlog);
+        # keyed on the file digests, so an edited file re-uploaded under the same name and size still counts
+        files = [(f.name, f.getvalue()) for f in uploaded]
+        backlog_key = (backlog_content_key(files), all_sheets)
+        if st.session_state.backlog_key != backlog_key:
+            # Session state only references the shared frame and bytes
+            st.session_state.df, st.session_state.source_files = shared_backlog(*backlog_key, _files=tuple(files))
+            single_workbook = len(files) == 1 and is_workbook(files[0][0])
+            st.session_state.original_bytes = files[0][1] if single_workbook else None
+            st.session_state.backlog_key = backlog_key
+            st.session_state.carry_over = None
+            st.session_state.rolled_weeks = {}
+            st.session_state.pinned = {}
 
     df = st.session_state.df
     if df is None:
-        st.info("Upload an Excel backlog to begin.")
+        st.info("Upload a backlog (Excel, CSV or Parquet) to begin.")
         st.stop()
 
     cols = list(df.columns)
 
     # Week selection (ISO week)
     st.markdown("**Week starting**")
+    if st.session_state.pending_week_start is not None:
+        # Set by "Roll forward" on the review screen (widget state can only change before it renders)
+        st.session_state.week_start_date = st.session_state.pending_week_start
+        st.session_state.pending_week_start = None
     _picked = st.date_input(
         "Week starting",
         value=monday_of_week(date.today()),
@@ -554,6 +416,17 @@ with st.sidebar:
     iso_year, iso_week, _ = week_start.isocalendar()
     st.caption(f"ISO Wk {iso_week} ({iso_year}) — Mon {week_start.strftime('%d/%m/%Y')}")
 
+    carry = st.session_state.carry_over
+    if carry is not None:
+        st.caption(
+            f"Rolled forward: {len(carry['frame'])} unplanned jobs from the week of "
+            f"{carry['from_week'].strftime('%d/%m/%Y')}."
+        )
+        if st.button("Start from upload", key="carry_over_clear", use_container_width=True):
+            st.session_state.carry_over = None
+            st.session_state.rolled_weeks = {}
+            st.rerun()
+
     # Working days (always offer all 7 days)
     st.caption("Working days:")
     active_days = {}
@@ -671,18 +544,20 @@ with st.sidebar:
 # Main panel: mapping + overview
 # -----------------------------
 df = st.session_state.df
-cols = list(df.columns)
+cols = [c for c in df.columns if c not in INGEST_TAG_COLS]
 
 # Auto-detect mapping columns
-auto_target = pick_col(cols, ["target_date", "target date", "due", "target"])
-auto_status = pick_col(cols, ["status", "survey_status", "survey status", "state"])
-auto_bed = pick_col(cols, ["bdrm", "bed", "bedroom", "bdrm_no", "bdrm no"])
-auto_type = pick_col(cols, ["inspection type", "type", "visit type"])
-auto_ref = pick_col(cols, ["reference", "property_reference", "property reference", "id"])
-auto_street = pick_col(cols, ["street"])
-auto_number = pick_col(cols, ["number", "street number", "no."])
-auto_suburb = pick_col(cols, ["suburb"])
-auto_city = pick_col(cols, ["city", "town", "region", "area"])
+auto_target = pick_col(cols, COLUMN_CANDIDATES["target"])
+auto_status = pick_col(cols, COLUMN_CANDIDATES["status"])
+auto_bed = pick_col(cols, COLUMN_CANDIDATES["bed"])
+auto_type = pick_col(cols, COLUMN_CANDIDATES["type"])
+auto_ref = pick_col(cols, COLUMN_CANDIDATES["ref"])
+auto_street = pick_col(cols, COLUMN_CANDIDATES["street"])
+auto_number = pick_col(cols, COLUMN_CANDIDATES["number"])
+auto_suburb = pick_col(cols, COLUMN_CANDIDATES["suburb"])
+auto_city = pick_col(cols, COLUMN_CANDIDATES["city"])
+auto_appt_date = pick_col(cols, COLUMN_CANDIDATES["appt_date"])
+auto_appt_time = pick_col(cols, COLUMN_CANDIDATES["appt_time"])
 
 with st.expander("Data mapping (optional)", expanded=False):
     st.caption("Flowboard is input-format agnostic. These defaults are detected; change if needed.")
@@ -695,6 +570,18 @@ with st.expander("Data mapping (optional)", expanded=False):
     col_street = st.selectbox("Street name column", ["(none)"] + cols, index=(["(none)"] + cols).index(auto_street) if auto_street in cols else 0)
     col_suburb = st.selectbox("Suburb column", ["(none)"] + cols, index=(["(none)"] + cols).index(auto_suburb) if auto_suburb in cols else 0)
     col_city = st.selectbox("City/Area column", ["(none)"] + cols, index=(["(none)"] + cols).index(auto_city) if auto_city in cols else 0)
+    col_appt_date = st.selectbox(
+        "Appointment date column (booked jobs)",
+        ["(none)"] + cols,
+        index=(["(none)"] + cols).index(auto_appt_date) if auto_appt_date in cols else 0,
+        help="Leave as (none) when the time column holds full date-times.",
+    )
+    col_appt_time = st.selectbox(
+        "Appointment time column (booked jobs)",
+        ["(none)"] + cols,
+        index=(["(none)"] + cols).index(auto_appt_time) if auto_appt_time in cols else 0,
+        help="Jobs with a booked time are placed at that time first; the rest of the session fills around them.",
+    )
 
 st.session_state.colmap = {
     "target": None if col_target == "(none)" else col_target,
@@ -706,53 +593,33 @@ st.session_state.colmap = {
     "street": None if col_street == "(none)" else col_street,
     "suburb": None if col_suburb == "(none)" else col_suburb,
     "city": None if col_city == "(none)" else col_city,
+    "appt_date": None if col_appt_date == "(none)" else col_appt_date,
+    "appt_time": None if col_appt_time == "(none)" else col_appt_time,
 }
 cm = st.session_state.colmap
 
 st.subheader("Planning Overview")
 
 # -----------------------------
-# Area grouping (MVP)
+# Derived working frame (compact dtypes)
 # -----------------------------
-# We use a single "area" grouping column for planning. By default this is Suburb (best),
-# otherwise City/Town/Region/Area if available.
-col_geo = cm.get("suburb") if cm.get("suburb") in df.columns else None
-if col_geo is None:
-    col_geo = cm.get("city") if cm.get("city") in df.columns else None
-
-# Build derived dataframe
-df_work = df.copy()
-df_work["_excel_row"] = df_work.reset_index().index + 2
-
-# target + urgency + cutoff
-if cm["target"]:
-    df_work["_target_date"] = df_work[cm["target"]].apply(as_date)
+if st.session_state.carry_over is not None:
+    # Rolled-forward backlog: already derived, only the urgency bands follow the selected week
+    carry = st.session_state.carry_over
+    df_work = carry["frame"]
+    if carry["week_start"] != week_start:
+        df_work = reband_work_frame(df_work, week_start)
+elif st.session_state.backlog_key is not None:
+    df_work = shared_work_frame(st.session_state.backlog_key, tuple(cm.items()), week_start, _df=df)
 else:
-    df_work["_target_date"] = None
-
-df_work["_cutoff_date"] = df_work["_target_date"].apply(cutoff_date)
-df_work["_urgency"] = df_work["_target_date"].apply(lambda td: urgency_band(td, week_start))
-
-# label
-df_work["_label"] = df_work.apply(
-    lambda r: normalize_address(r, cm["number"], cm["street"], cm["suburb"], cm["city"]),
-    axis=1
-)
+    df_work = derive_work_frame(df, cm, week_start)
 
-# estimates + futile rank
-df_work["_mins"] = df_work.apply(
-    lambda r: estimate_minutes(r.get(cm["bed"]) if cm["bed"] else None,
-                               r.get(cm["type"]) if cm["type"] else None),
-    axis=1
-)
-df_work["_futile_rank"] = df_work[cm["status"]].apply(futile_rank) if cm["status"] else 0
-
-# territory from mapping
-if col_geo and col_geo in df_work.columns:
-    geo_series = df_work[col_geo].fillna("").astype(str).str.strip()
-    df_work["_territory"] = geo_series.apply(lambda v: v if v else "Unknown")
-else:
-    df_work["_territory"] = "Unknown"
+# Content fingerprint for the plan cache: hashed once per source frame and mapping, not per rerun
+fp_source = st.session_state.carry_over["frame"] if st.session_state.carry_over is not None else df
+fp_memo = st.session_state.work_fingerprint
+if fp_memo is None or fp_memo[0] is not fp_source or fp_memo[1] != tuple(cm.items()):
+    fp_memo = st.session_state.work_fingerprint = (fp_source, tuple(cm.items()), work_frame_fingerprint(df_work))
+work_fp = fp_memo[2]
 
 
 # -----------------------------
@@ -782,11 +649,15 @@ else:
                 mat[d][a] = True
     st.session_state.area_day_allowed = mat
 
-with st.expander("Area availability matrix (expand to include/exclude Areas per day)", expanded=False):
-    st.caption(
-        "Untick an Area on a specific day to prevent Auto (and scheduling) from using it that day. Re-tick to re-enable."
-    )
 
+def rerun_fragment(key):
+    """Widget callback: rerun just the named fragment, never the whole script."""
+    st.rerun(key)
+
+
+@st.fragment(key="area_matrix")
+def area_matrix(areas, active_day_list):
+    """Ticking a cell reruns only the matrix; the planner reads area_day_allowed on the next full run."""
     if not areas:
         st.caption("No Areas detected.")
     else:
@@ -798,11 +669,10 @@ with st.expander("Area availability matrix (expand to include/exclude Areas per
         with hdr_cols[0]:
             st.markdown("**Area**")
 
+        # Cells sit straight in the row columns (no nested centring columns): a rerun draws one block per cell
         for i, d in enumerate(active_day_list, start=1):
             with hdr_cols[i]:
-                hL, hM, hR = st.columns([1, 2, 1])
-                with hM:
-                    st.markdown(f"**{d[:3]}**")
+                st.markdown(f"**{d[:3]}**")
 
 
         st.markdown(
@@ -821,22 +691,67 @@ with st.expander("Area availability matrix (expand to include/exclude Areas per
                         st.session_state.area_day_allowed.get(d, {}).get(a, True)
                     )
                 with row_cols[j + 1]:
-                    cL, cM, cR = st.columns([1, 2, 1])
-                    with cM:
-                        st.checkbox("", key=key)
+                    st.checkbox(
+                        f"{a} on {d}", key=key, label_visibility="collapsed",
+                        on_change=rerun_fragment, args=("area_matrix",),
+                    )
 
                 st.session_state.area_day_allowed[d][a] = bool(st.session_state[key])
 
 
+with st.expander("Area availability matrix (expand to include/exclude Areas per day)", expanded=False):
+    st.caption(
+        "Untick an Area on a specific day to prevent Auto (and scheduling) from using it that day. Re-tick to re-enable."
+    )
+    area_matrix(areas, active_day_list)
+
+
 # Build day->allowed Areas map for the planner (only for active days)
 day_allowed = {}
 for d in active_day_list:
     allowed = {a for a in areas if st.session_state.area_day_allowed.get(d, {}).get(a, True)}
     day_allowed[d] = allowed
 
+with st.expander("Neighbouring areas (spill over when a day's Area runs out)", expanded=False):
+    st.caption(
+        "When a session's Area has no jobs left, spare time is filled from the nearest neighbouring Areas "
+        "allowed that day. Neighbours come from an Area centroid table and/or the adjacency list below."
+    )
+    spillover_on = st.checkbox("Fill spare session time from neighbouring Areas", value=True, key="spillover_on")
+    centroid_file = st.file_uploader(
+        "Area centroids (CSV / Excel with area, latitude, longitude)", type=["csv", "xlsx", "xls"], key="area_centroids_file"
+    )
+    adjacency_text = st.text_area(
+        "Adjacency overrides",
+        key="adjacency_text",
+        placeholder="Glebe: Annandale, Ultimo",
+        help="One Area per line followed by its neighbours, nearest first. Replaces that Area's centroid neighbours.",
+    )
+
+    centroids, centroid_key = {}, None
+    if centroid_file is not None:
+        centroid_bytes = centroid_file.getvalue()
+        centroid_key = (centroid_file.name, hashlib.sha256(centroid_bytes).hexdigest())
+        try:
+            centroids = shared_area_centroids(centroid_key, _data=centroid_bytes)
+        except ValueError as e:
+            st.error(str(e))
+
+    neighbour_index = shared_neighbour_index(tuple(areas), centroid_key, adjacency_text or "", _centroids=centroids)
+    linked = [(a, ", ".join(nbs)) for a, nbs in neighbour_index.items() if nbs]
+    if linked:
+        st.dataframe(pd.DataFrame(linked, columns=["Area", "Neighbours (nearest first)"]), use_container_width=True, hide_index=True)
+    else:
+        st.caption("No neighbours configured.")
+
+neighbours = neighbour_index if spillover_on and linked else None
+
 # Day Focus Area: if set, that day will schedule only jobs from that Area.
-day_focus = {}
-if active_day_list:
+@st.fragment(key="daily_focus")
+def daily_focus(areas, active_day_list):
+    """Changing a day's focus reruns only the selectors; the planner reads focus_<day> on the next full run."""
+    if not active_day_list:
+        return
     cols_focus = st.columns(len(active_day_list))
     for i, d in enumerate(active_day_list):
         with cols_focus[i]:
@@ -845,9 +760,20 @@ if active_day_list:
             prev = st.session_state.get(k, "(auto)")
             if prev not in options:
                 st.session_state[k] = "(auto)"
-            day_focus[d] = st.selectbox(f"{d[:3]}", options, index=0, key=k)
-else:
-    day_focus = {}
+            st.selectbox(f"{d[:3]}", options, index=0, key=k, on_change=rerun_fragment, args=("daily_focus",))
+
+
+daily_focus(areas, active_day_list)
+day_focus = {d: st.session_state.get(f"focus_{d}", "(auto)") for d in active_day_list}
+
+assignment_mode = st.radio(
+    "Territory assignment",
+    ASSIGNMENT_MODES,
+    horizontal=True,
+    key="assignment_mode",
+    help="Greedy picks each Auto day's Area as that day comes up. Lookahead decides all Auto days together, "
+         "so an early day can't take an Area a later day needed.",
+)
 
 # Overview metrics
 c1, c2, c3, c4 = st.columns(4)
@@ -855,6 +781,12 @@ c1.metric("Dark Blue (Must this week)", int((df_work["_urgency"] == "Dark Blue")
 c2.metric("Light Blue (Warning band)", int((df_work["_urgency"] == "Light Blue").sum()))
 c3.metric("Areas detected", len(areas))
 c4.metric("Flexible backlog", int((df_work["_urgency"] == "Flexible").sum()))
+if DUP_KEEP_COL in df_work.columns and not df_work[DUP_KEEP_COL].all():
+    dup_copies = df_work[~df_work[DUP_KEEP_COL]]
+    st.caption(
+        f"{len(dup_copies)} duplicate rows (same address + reference) linked to "
+        f"{dup_copies[DUP_KEY_COL].nunique()} jobs: each job is planned once and exports write every copy."
+    )
 
 # Quick territory workload view (top 10)
 t_counts = df_work["_territory"].value_counts().head(10).reset_index()
@@ -864,244 +796,94 @@ st.dataframe(t_counts, use_container_width=True, hide_index=True)
 
 
 # -----------------------------
-# Planning Engine: territory-aware + day focus
+# What-if scenario sweep
 # -----------------------------
-def build_week_plan(df_in: pd.DataFrame, week_start: date, active_days, day_sessions, time_mode, global_times, day_override_times, day_focus, day_allowed=None):
-    jobs = df_in.copy()
-
-    # -----------------------------
-    # Priority hierarchy (lower = more urgent)
-    # -----------------------------
-    urgency_order = {"Dark Blue": 0, "Light Blue": 1, "Flexible": 2}
-    jobs["_urg_order"] = jobs["_urgency"].map(urgency_order).fillna(2).astype(int)
-
-    # Tie-breakers / sorts
-    jobs["_dark_tie"] = jobs.apply(lambda r: r.get("_futile_rank", 0) if r.get("_urgency") == "Dark Blue" else 0, axis=1)
-    jobs["_cutoff_sort"] = jobs["_cutoff_date"].fillna(date.max)
-
-    # Light geo grouping key (still helpful inside territory)
-    geo_key_cols = []
-    if cm.get("street"):
-        geo_key_cols.append(cm["street"])
-    if geo_key_cols and all(c in jobs.columns for c in geo_key_cols):
-        jobs["_geo_key"] = jobs[geo_key_cols].astype(str).agg(" | ".join, axis=1)
-    else:
-        jobs["_geo_key"] = "Unknown"
-
-    # Sort primarily by urgency + cutoff + futile, then territory, then street
-    jobs = jobs.sort_values(
-        by=["_urg_order", "_cutoff_sort", "_dark_tie", "_territory", "_geo_key", "_mins"],
-        ascending=[True, True, True, True, True, True]
-    ).reset_index(drop=True)
-
-    # -----------------------------
-    # Buckets init
-    # -----------------------------
-    buckets = {}
-    for d in WEEKDAYS:
-        if not active_days.get(d, False):
-            continue
-        buckets[d] = {"AM": [], "PM": []}
-
-    remaining = jobs.to_dict(orient="records")
-
-    # -----------------------------
-    # Cluster key helper (conservative)
-    # -----------------------------
-    def derive_cluster_key(job: dict) -> str:
-        label = str(job.get("_label", "") or "").strip().lower()
-        if not label:
-            return f"geo|{str(job.get('_geo_key','Unknown')).strip().lower()}"
-
-        label = re.sub(r"^(unit|apt|apartment|flat)\s*\w+\s*,\s*", "", label)
-        label = re.sub(r"^[a-z0-9]+\s*/\s*", "", label)
-
-        m = re.match(r"^(\d+[a-z]?)\s+([a-z\s]+?)\s+(ave|avenue|rd|road|st|street|cres|crescent|pl|place|dr|drive|tce|terrace|ln|lane)\b", label)
-        if m:
-            num = m.group(1)
-            street = re.sub(r"\s+", " ", m.group(2).strip())
-            st_type = m.group(3)
-            return f"bldg|{num}|{street}|{st_type}"
-
-        return f"geo|{str(job.get('_geo_key','Unknown')).strip().lower()}"
-
-    # -----------------------------
-    # Territory choice (existing behaviour)
-    # -----------------------------
-    def choose_auto_territory(rem_list, allowed_terr=None):
-        """Pick the territory with the most urgent weight remaining (Dark > Light > Flexible)."""
-        if not rem_list:
-            return None
-        score = {}
-        for r in rem_list:
-            terr = str(r.get("_territory", "Unknown"))
-            if allowed_terr is not None and terr not in allowed_terr:
-                continue
-            urg = r.get("_urgency", "Flexible")
-            w = 100 if urg == "Dark Blue" else 10 if urg == "Light Blue" else 1
-            score[terr] = score.get(terr, 0) + w
-        return max(score.items(), key=lambda kv: kv[1])[0] if score else None
-
-    def pop_first_matching(predicate):
-        """Pop first item in remaining that matches predicate."""
-        for i, item in enumerate(remaining):
-            if predicate(item):
-                return remaining.pop(i)
-        return None
-
-    def peek_any(predicate):
-        """Check if any remaining item matches predicate."""
-        return any(predicate(x) for x in remaining)
-
-    # -----------------------------
-    # Core scheduling loop
-    # -----------------------------
-    for d in [wd for wd in WEEKDAYS if active_days.get(wd, False)]:
-        allowed_today = None
-        if day_allowed is not None:
-            allowed_today = set(day_allowed.get(d, []))
-            if not allowed_today:
-                allowed_today = None
-
-        focus = day_focus.get(d, "(auto)")
-        if focus is not None and focus != "(auto)" and allowed_today is not None and str(focus) not in allowed_today:
-            focus = "(auto)"
-        focus_terr = None if (focus is None or focus == "(auto)") else str(focus)
-
-        if focus_terr is None:
-            focus_terr = choose_auto_territory(remaining, allowed_today)
-
-        if focus_terr is None:
-            continue
-
-        for sess in ["AM", "PM"]:
-            if not day_sessions[d][sess]["enabled"]:
-                continue
-
-            load = day_sessions[d][sess]["load"]
-            budget = session_capacity_minutes(time_mode, global_times, day_override_times, d, sess, load)
-
-            used = 0
-            picked = []
-
-            while True:
-                tier_in_terr = None
-                for tier_name in ["Dark Blue", "Light Blue", "Flexible"]:
-                    if peek_any(lambda x, t=tier_name: str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == t):
-                        tier_in_terr = tier_name
-                        break
-
-                if tier_in_terr is None:
-                    break
+with st.expander("What-if scenario sweep (compare load modes, extra days and times)", expanded=False):
+    st.caption(
+        "Plans every combination below in parallel against the current backlog and settings. "
+        "Nothing here changes your plan."
+    )
+    sw1, sw2, sw3 = st.columns([2, 2, 1])
+    with sw1:
+        sweep_loads = st.multiselect(
+            "Session load",
+            [SWEEP_LOADS_AS_SET] + LOAD_MODES,
+            default=[SWEEP_LOADS_AS_SET] + LOAD_MODES,
+            key="sweep_loads",
+        )
+    with sw2:
+        sweep_extra_days = st.multiselect(
+            "Extra working days to try",
+            [d for d in WEEKDAYS if not active_days.get(d, False)],
+            key="sweep_extra_days",
+        )
+    with sw3:
+        sweep_global_times = st.checkbox(
+            "Also try without per-day time overrides",
+            value=False,
+            key="sweep_global_times",
+            disabled=not day_override_times,
+        )
 
-                anchor = pop_first_matching(lambda x: str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == tier_in_terr)
-                if not anchor:
-                    break
+    scenarios = build_scenario_grid(
+        active_days, day_sessions, day_override_times, sweep_loads, sweep_extra_days, sweep_global_times
+    )
+    if st.button(f"Run sweep ({len(scenarios)} scenarios)", disabled=not scenarios, key="sweep_run"):
+        with st.spinner("Planning scenarios…"):
+            st.session_state.sweep_results = run_scenario_sweep(
+                df_work, scenarios, week_start, time_mode, global_times, day_focus, day_allowed,
+                street_col=cm["street"], assignment=assignment_mode, pinned=st.session_state.pinned,
+                neighbours=neighbours,
+            )
 
-                anchor_m = int(anchor.get("_mins", 15))
-                if used + anchor_m > int(budget * 1.10):
-                    remaining.insert(0, anchor)
-                    break
+    if st.session_state.get("sweep_results") is not None:
+        st.dataframe(st.session_state.sweep_results, use_container_width=True, hide_index=True)
 
-                ck = derive_cluster_key(anchor)
-                batch = [anchor]
-                batch_minutes = anchor_m
 
-                def pop_same_tier_same_cluster():
-                    return pop_first_matching(
-                        lambda x: str(x.get("_territory", "Unknown")) == focus_terr
-                        and x.get("_urgency") == tier_in_terr
-                        and derive_cluster_key(x) == ck
-                    )
+# -----------------------------
+# Backlog clearance forecast
+# -----------------------------
+with st.expander("Backlog clearance forecast (weeks until each Area's Dark Blue is clear)", expanded=False):
+    st.caption(
+        "Simulates the weeks ahead at the current days, sessions and Area matrix, every day on auto focus "
+        "and no new work arriving. The fast model only weighs each Area's minutes against session budgets; "
+        "tick the exact planner to check it against full weekly plans."
+    )
+    fc1, fc2 = st.columns([1, 2])
+    with fc1:
+        forecast_weeks = st.number_input("Weeks ahead", min_value=1, max_value=156, value=FORECAST_WEEKS, step=1, key="forecast_weeks")
+    with fc2:
+        forecast_exact = st.checkbox(
+            "Use the exact planner (slow: plans every week in full)", value=False, key="forecast_exact"
+        )
+    if st.button("Run forecast", disabled=not active_day_list, key="forecast_run"):
+        with st.spinner("Planning the weeks ahead…" if forecast_exact else "Forecasting…"):
+            st.session_state.forecast_results = forecast_clearance(
+                df_work, week_start, int(forecast_weeks), active_days, day_sessions, time_mode, global_times,
+                day_override_times, day_allowed, neighbours, exact=forecast_exact,
+                street_col=cm["street"], status_col=cm["status"],
+            )
 
-                while len(batch) < 3:
-                    nxt = pop_same_tier_same_cluster()
-                    if not nxt:
-                        break
-                    m = int(nxt.get("_mins", 15))
-                    if used + batch_minutes + m <= int(budget * 1.10):
-                        batch.append(nxt)
-                        batch_minutes += m
-                    else:
-                        remaining.insert(0, nxt)
-                        break
-
-                if len(batch) < 3:
-                    if tier_in_terr == "Dark Blue":
-                        lower_tiers = ["Flexible", "Light Blue"]
-                    elif tier_in_terr == "Light Blue":
-                        lower_tiers = ["Flexible"]
-                    else:
-                        lower_tiers = []
-
-                    def would_starve_same_tier_if_add(extra_minutes: int) -> bool:
-                        remaining_budget_after = int(budget * 1.10) - (used + batch_minutes + extra_minutes)
-                        if remaining_budget_after <= 0:
-                            return True
-                        mins_same_tier = [
-                            int(x.get("_mins", 15))
-                            for x in remaining
-                            if str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == tier_in_terr
-                        ]
-                        if not mins_same_tier:
-                            return False
-                        return remaining_budget_after < min(mins_same_tier)
-
-                    for lt in lower_tiers:
-                        while len(batch) < 3:
-                            pad = pop_first_matching(
-                                lambda x, lt=lt: str(x.get("_territory", "Unknown")) == focus_terr
-                                and x.get("_urgency") == lt
-                                and derive_cluster_key(x) == ck
-                            )
-                            if not pad:
-                                break
-
-                            m = int(pad.get("_mins", 15))
-                            if used + batch_minutes + m > int(budget * 1.10):
-                                remaining.insert(0, pad)
-                                break
-
-                            if would_starve_same_tier_if_add(m):
-                                remaining.insert(0, pad)
-                                break
-
-                            batch.append(pad)
-                            batch_minutes += m
-
-                        if len(batch) >= 3:
-                            break
-
-                for item in batch:
-                    picked.append(item)
-                used += batch_minutes
-
-            for i, job in enumerate(picked, start=1):
-                job["_planned_day"] = d
-                job["_planned_date"] = week_start + timedelta(days=WEEKDAYS.index(d))
-                job["_planned_session"] = sess
-                job["_planned_seq"] = i
-
-            buckets[d][sess] = picked
-
-    planned_rows = []
-    for d, sessions in buckets.items():
-        for sess, items in sessions.items():
-            planned_rows.extend(items)
-
-    plan_df = pd.DataFrame(planned_rows) if planned_rows else pd.DataFrame()
-    return buckets, plan_df, remaining
+    forecast = st.session_state.get("forecast_results")
+    if forecast is not None:
+        clearance = forecast["Clearance"]
+        weeks_to_clear = clearance["Weeks to clear Dark Blue"]
+        if weeks_to_clear.isna().any():
+            all_clear = "beyond horizon"
+        else:
+            all_clear = int(weeks_to_clear.max()) if len(clearance) else 0
+        f1, f2 = st.columns(2)
+        f1.metric("Weeks until all Dark Blue is clear", all_clear)
+        f2.metric("Areas not clear within the horizon", int(weeks_to_clear.isna().sum()))
+        weekly_totals = forecast["Weekly"].groupby("Week")[["Dark Blue left", "Overdue", "Left"]].sum()
+        st.line_chart(weekly_totals)
+        st.dataframe(clearance, use_container_width=True, hide_index=True)
 
 
 # -----------------------------
-# GO button
+# Planner settings (what PLAN would run with) + pre-planned weeks
 # -----------------------------
-if go:
-    try:
-        st.toast("Planning initiated. Hasta la vista, crazy. Removing the crazy from your work week.")
-    except Exception:
-        st.success("Planning initiated. Hasta la vista, crazy. Removing the crazy from your work week.")
-
+def current_run_settings():
     act = {d: st.session_state.get(f"day_{d}", False) for d in WEEKDAYS}
     sessions = {}
     for d in WEEKDAYS:
@@ -1112,44 +894,180 @@ if go:
             "PM": {"enabled": st.session_state.get(f"{d}_pm_on", True), "load": st.session_state.get(f"{d}_pm_load", "Normal")},
         }
 
-    for d in list(day_focus.keys()):
+    focus = dict(day_focus)
+    for d in list(focus.keys()):
         allowed_today = set(day_allowed.get(d, [])) if isinstance(day_allowed, dict) else set()
-        if allowed_today and day_focus.get(d) not in ("(auto)", None) and day_focus[d] not in allowed_today:
-            day_focus[d] = "(auto)"
+        if allowed_today and focus.get(d) not in ("(auto)", None) and focus[d] not in allowed_today:
+            focus[d] = "(auto)"
 
-    buckets, plan_df, remaining = build_week_plan(
-        df_work, week_start, act, sessions, time_mode, global_times, day_override_times, day_focus, day_allowed
-    )
-
-    st.session_state.plan = {
-        "week_start": week_start,
+    return {
         "active_days": act,
         "day_sessions": sessions,
         "time_mode": time_mode,
         "global_times": global_times,
         "day_override_times": day_override_times,
-        "buckets": buckets,
-        "remaining": remaining,
-        "day_focus": day_focus,
+        "day_focus": focus,
         "day_allowed": day_allowed,
+        "assignment": assignment_mode,
+        "neighbours": neighbours,
+    }
+
+
+def planner_args(settings):
+    """Positional / keyword arguments for build_week_plan after (df, week_start)."""
+    args = (
+        settings["active_days"], settings["day_sessions"], settings["time_mode"], settings["global_times"],
+        settings["day_override_times"], settings["day_focus"], settings["day_allowed"],
+    )
+    kwargs = {
+        "street_col": cm["street"], "assignment": settings["assignment"],
+        "pinned": dict(st.session_state.pinned), "neighbours": settings["neighbours"],
     }
+    return args, kwargs
+
+
+def adopt_plan(settings, result):
+    buckets, plan_df, remaining = result
+    st.session_state.plan = dict(settings, buckets=buckets, remaining=remaining)
     st.session_state.plan_df = plan_df
+    st.session_state.assignment_compare = None
     st.session_state.view = "review"
 
 
+run_settings = current_run_settings()
+
+# Plans are memoised per (working frame content, week, settings): the planner is deterministic
+plan_cache = st.session_state.plan_cache
+plan_scope = (
+    work_fp,
+    settings_fingerprint(dict(run_settings, street_col=cm["street"], pinned=st.session_state.pinned)),
+)
+if st.session_state.pre_plan is not None and st.session_state.pre_plan.scope != plan_scope:
+    st.session_state.pre_plan.cancel()
+    st.session_state.pre_plan = None
+
+
+# -----------------------------
+# GO button
+# -----------------------------
+if go:
+    try:
+        st.toast("Planning initiated. Hasta la vista, crazy. Removing the crazy from your work week.")
+    except Exception:
+        st.success("Planning initiated. Hasta la vista, crazy. Removing the crazy from your work week.")
+
+    # A fresh click supersedes any plan still running
+    prev_run = st.session_state.plan_run
+    if prev_run is not None and not prev_run.finished:
+        prev_run.cancel()
+    st.session_state.plan_run = None
+
+    st.session_state.plan_run_settings = dict(run_settings, week_start=week_start, plan_scope=plan_scope)
+    cached = plan_cache.get(plan_cache_key(plan_scope, week_start))
+    if cached is not None:
+        # Same backlog, week and settings as an earlier plan (or pre-planned in the background)
+        adopt_plan(st.session_state.plan_run_settings, cached)
+    else:
+        args, kwargs = planner_args(run_settings)
+        st.session_state.plan_run = BackgroundPlan(df_work, week_start, *args, **kwargs).start()
+
+elif (
+    st.session_state.view == "review"
+    and st.session_state.plan is not None
+    and st.session_state.plan_run is None
+    and st.session_state.plan["week_start"] != week_start
+):
+    # Week picker flipped on the review page: show that week's plan if it was pre-planned
+    cached = plan_cache.get(plan_cache_key(plan_scope, week_start))
+    if cached is not None:
+        adopt_plan(dict(run_settings, week_start=week_start, plan_scope=plan_scope), cached)
+
+
+# -----------------------------
+# Planning progress (polls the background worker)
+# -----------------------------
+def partial_plan_table(buckets):
+    rows = []
+    for d, sessions in list(buckets.items()):
+        for sess, items in list(sessions.items()):
+            for i, job in enumerate(list(items), start=1):
+                rows.append({
+                    "Day": d,
+                    "Session": sess,
+                    "Stop": i,
+                    "Address": job.get("_label", ""),
+                    "Urgency": job.get("_urgency", "Flexible"),
+                    "Area": job.get("_territory", "Unknown"),
+                    "Est mins": job.get("_mins", 0),
+                })
+    return pd.DataFrame(rows)
+
+
+@st.fragment(run_every=0.5)
+def planning_progress():
+    run = st.session_state.plan_run
+    if run is None:
+        return
+
+    if run.status == "done":
+        settings = st.session_state.plan_run_settings
+        st.session_state.plan_cache.put(plan_cache_key(settings["plan_scope"], settings["week_start"]), copy_plan_result(run.result))
+        adopt_plan(settings, run.result)
+        st.session_state.plan_run = None
+        st.rerun()
+
+    prog = run.progress
+    sessions_total = max(1, prog["sessions_total"])
+    st.progress(
+        min(1.0, prog["sessions_done"] / sessions_total),
+        text=(
+            f"Planning… days {prog['days_done']}/{prog['days_total']} • "
+            f"sessions {prog['sessions_done']}/{prog['sessions_total']} • {prog['jobs_placed']} jobs placed"
+        ),
+    )
+
+    if run.status == "cancelled":
+        st.warning("Planning cancelled. Partial results below were not applied.")
+    elif run.status == "failed":
+        st.error(f"Planning failed: {run.error}")
+
+    if run.finished:
+        if st.button("Dismiss", key="plan_run_dismiss"):
+            st.session_state.plan_run = None
+            st.rerun()
+    elif st.button("Cancel planning", key="plan_run_cancel"):
+        run.cancel()
+
+    with st.expander("Partial plan so far", expanded=False):
+        partial = partial_plan_table(prog["buckets"])
+        if partial.empty:
+            st.caption("— nothing placed yet —")
+        else:
+            st.dataframe(partial, use_container_width=True, hide_index=True)
+
+
+if st.session_state.plan_run is not None:
+    planning_progress()
+
+
 # -----------------------------
 # Review Screen
 # -----------------------------
-URGENCY_COLORS = {"Dark Blue": "#1f4cff", "Light Blue": "#5aa9ff", "Flexible": "#9aa3af"}
+MANUAL_EDIT_UNPLANNED_OPTIONS = 200  # most urgent unplanned jobs offered in the edit pickers
 
 
-def render_job(job):
+def render_job(job, pinned=False):
     urg = job.get("_urgency", "Flexible")
     col = URGENCY_COLORS.get(urg, "#9aa3af")
     seq = job.get("_planned_seq", "")
     label = job.get("_label", "Unknown address")
     mins = job.get("_mins", 0)
     terr = job.get("_territory", "Unknown")
+    if pinned:
+        terr = f"{terr} • pinned"
+    appt = job.get(APPT_COL)
+    if appt is not None and not pd.isna(appt):
+        terr = f"{terr} • booked {appt.strftime('%a %H:%M')}"
     return f"""
     <div style="display:flex;align-items:center;gap:10px;padding:6px 8px;border-bottom:1px dashed #e5e7eb;">
       <div style="width:26px;height:26px;border-radius:6px;background:{col};color:white;display:flex;align-items:center;justify-content:center;font-weight:800;">{seq}</div>
@@ -1175,83 +1093,325 @@ if st.session_state.view == "review" and st.session_state.plan is not None:
             f"Week starting: {week_start.strftime('%a %d %b %Y')} • Plans are conservative. Overflow is expected."
         )
 
+    @st.fragment(key="review_roll_forward")
+    def roll_forward_button():
+        """Own fragment: a day Reset can unplan this week's last jobs, so it reruns this to enable the button."""
+        if st.button(
+            "Roll forward to next week",
+            key="roll_forward",
+            disabled=not plan["remaining"],
+            use_container_width=True,
+            help="Plan next week from this week's unplanned jobs (including Reset days) instead of the full upload.",
+        ):
+            next_week = week_start + timedelta(days=7)
+            # Kept for the multi-week styled export; later weeks only hold jobs this one left unplanned.
+            # Read from session state: after a Reset, this fragment may be newer than the page's plan_df
+            st.session_state.rolled_weeks[week_start] = with_duplicate_rows(st.session_state.plan_df, df_work)
+            st.session_state.carry_over = {
+                "week_start": next_week,
+                "from_week": week_start,
+                "frame": roll_forward_frame(
+                    plan["remaining"], next_week, st.session_state.colmap.get("street"), st.session_state.colmap.get("status"),
+                    df_work=df_work,
+                ),
+            }
+            st.session_state.pending_week_start = next_week
+            st.session_state.pinned = {}
+            st.session_state.sweep_results = None
+            st.session_state.forecast_results = None
+            st.session_state.assignment_compare = None
+            st.session_state.plan = None
+            st.session_state.plan_df = None
+            st.session_state.view = "setup"
+            st.rerun()
+
     with h2:
         if st.button("Back to Week Setup", use_container_width=True):
             st.session_state.view = "setup"
+        roll_forward_button()
+
+    # Exports are built when their button is clicked (deferred download), from the plan as edited so far:
+    # a day reset reruns only its own board fragment, so nothing here may hold a copy of plan_df
+    colmap = st.session_state.colmap
+    original_bytes = st.session_state.original_bytes
+    source_files = st.session_state.source_files
+    sheets_by_file = ingested_sheets(st.session_state.df)
+    rolled_weeks = dict(st.session_state.rolled_weeks)
+
+    def edited_plan_df():
+        return plan_rows_frame(plan["buckets"])
 
     with h3:
-        if st.session_state.original_bytes is not None:
-            # --- ensure export order: Survey_Date, then am_pm, then stop sequence ---
-            plan_df_export = plan_df.copy()
-
-            if not plan_df_export.empty:
-                date_col = "Survey_Date" if "Survey_Date" in plan_df_export.columns else "_planned_date"
-                if date_col in plan_df_export.columns:
-                    plan_df_export[date_col] = pd.to_datetime(plan_df_export[date_col], errors="coerce")
-
-                sess_col = "am_pm" if "am_pm" in plan_df_export.columns else "_planned_session"
-                sess_order = {"AM": 0, "PM": 1}
-                plan_df_export["_sess_sort"] = (
-                    plan_df_export.get(sess_col, "")
-                    .astype(str)
-                    .map(sess_order)
-                    .fillna(9)
-                    .astype(int)
+        export_modes = ["Styled workbook", "Lean workbook", "Lean CSV", "Export pack (zip)"]
+        multi_week = bool(rolled_weeks) and original_bytes is not None
+        if multi_week:
+            export_modes[1:1] = ["Styled workbook, all weeks", "Styled workbooks per week (zip)"]
+        export_mode = st.selectbox(
+            "Export mode",
+            export_modes,
+            key="export_mode",
+            label_visibility="collapsed",
+            help=(
+                "Lean modes stream only the planned rows and scale to very large schedules. "
+                "The export pack has a CSV and a printable run sheet per session plus an ICS calendar."
+            ),
+        )
+        if export_mode == "Lean workbook":
+            st.download_button(
+                "Export Completed Schedule",
+                data=lambda: build_lean_export_workbook(edited_plan_df(), colmap),
+                file_name=f"flowboard_lean_{week_start.isoformat()}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True,
+            )
+        elif export_mode == "Export pack (zip)":
+            st.download_button(
+                "Export run sheets + calendar",
+                data=lambda: build_export_pack(
+                    edited_plan_df(), colmap, week_start,
+                    plan["time_mode"], plan["global_times"], plan["day_override_times"],
+                ),
+                file_name=f"flowboard_pack_{week_start.isoformat()}.zip",
+                mime="application/zip",
+                use_container_width=True,
+            )
+        elif export_mode == "Lean CSV":
+            st.download_button(
+                "Export Completed Schedule",
+                data=lambda: build_lean_export_csv(edited_plan_df(), colmap),
+                file_name=f"flowboard_lean_{week_start.isoformat()}.csv",
+                mime="text/csv",
+                use_container_width=True,
+            )
+        elif export_mode in ("Styled workbook, all weeks", "Styled workbooks per week (zip)"):
+            # Every rolled-forward week plus this one, written from a single parse of the source workbook
+            week_span = sorted(rolled_weeks) + [week_start]
+            only_file = next(iter(source_files))
+            per_week = export_mode == "Styled workbooks per week (zip)"
+            span = f"{min(week_span).isoformat()}_to_{max(week_span).isoformat()}"
+
+            def all_weeks_export():
+                week_plans = dict(rolled_weeks)
+                week_plans[week_start] = with_duplicate_rows(edited_plan_df(), df_work)
+                return build_styled_completed_weeks(
+                    original_bytes, week_plans, sheets_by_file.get(only_file), per_week_files=per_week,
                 )
 
-                sort_cols = [c for c in [date_col, "_sess_sort", "_planned_seq"] if c in plan_df_export.columns]
-                plan_df_export = (
-                    plan_df_export.sort_values(
-                        by=sort_cols,
-                        ascending=[True] * len(sort_cols),
-                        kind="mergesort",
-                    )
-                    .drop(columns=["_sess_sort"], errors="ignore")
+            st.download_button(
+                f"Export {len(set(week_span))} weeks",
+                data=all_weeks_export,
+                file_name=f"flowboard_completed_{span}.{'zip' if per_week else 'xlsx'}",
+                mime="application/zip" if per_week else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True,
+            )
+        elif source_files and all(is_workbook(name) for name in source_files):
+            # build_styled_completed_workbook orders rows itself (Survey_Date, am_pm, stop), so plan_df goes in as is;
+            # linked duplicate rows are added so every source row of a planned job gets its Survey_Date
+            if original_bytes is not None:
+                only_file = next(iter(source_files))
+                st.download_button(
+                    "Export Completed Schedule",
+                    data=lambda: build_styled_completed_workbook(
+                        original_bytes, with_duplicate_rows(edited_plan_df(), df_work), sheets_by_file.get(only_file)
+                    ),
+                    file_name=f"flowboard_completed_{week_start.isoformat()}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True,
                 )
-
-            out_bytes = build_styled_completed_workbook(st.session_state.original_bytes, plan_df_export)
-
+            else:
+                st.download_button(
+                    "Export Completed Schedules (zip)",
+                    data=lambda: build_styled_completed_archive(
+                        source_files, with_duplicate_rows(edited_plan_df(), df_work), sheets_by_file
+                    ),
+                    file_name=f"flowboard_completed_{week_start.isoformat()}.zip",
+                    mime="application/zip",
+                    use_container_width=True,
+                )
+        elif source_files:
+            # CSV / Parquet in the upload: no workbook to style from, so the same columns as values only
             st.download_button(
                 "Export Completed Schedule",
-                data=out_bytes,
+                data=lambda: build_values_export_workbook(with_duplicate_rows(edited_plan_df(), df_work)),
                 file_name=f"flowboard_completed_{week_start.isoformat()}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 use_container_width=True,
             )
+            st.caption("Values only — styling needs Excel sources.")
         else:
             st.caption("Upload Excel to enable styled export.")
 
+    # Manual edits go through one board per plan; it edits plan["buckets"] / plan["remaining"] in place
+    board = st.session_state.plan_board
+    if board is None or board.buckets is not plan["buckets"]:
+        board = st.session_state.plan_board = PlanBoard(
+            plan["buckets"], plan["remaining"], week_start, plan["day_sessions"], plan["time_mode"],
+            plan["global_times"], plan["day_override_times"], st.session_state.pinned,
+        )
+
+    def apply_board_edit():
+        st.session_state.plan_df = plan_rows_frame(plan["buckets"])
+        st.rerun()
+
+    def reset_board_day(d):
+        """Reset button callback: only that day's column, the panels summarising the board and Roll forward rerun."""
+        board.reset_day(d)
+        st.session_state.plan_df = plan_rows_frame(plan["buckets"])
+        st.rerun([f"review_day_{d}", "review_metrics", "review_edits", "review_roll_forward"])
+
+    def job_choice_label(key):
+        job, loc = board.jobs[key], board.where[key]
+        place = "Unplanned" if loc is None else f"{loc[0][:3]} {loc[1]} #{job.get('_planned_seq', '')}"
+        pin = " • pinned" if key in board.pinned else ""
+        return f"{place} — {job.get('_label', '')} ({job.get('_urgency', 'Flexible')}){pin}"
+
+    @st.fragment(key="review_metrics")
+    def review_metrics():
+        # Every board edit stores a new plan_df, so the frame itself tells whether the metrics are current
+        memo = st.session_state.plan_metrics
+        if memo is None or memo[0] is not st.session_state.plan_df:
+            memo = st.session_state.plan_metrics = (st.session_state.plan_df, plan_quality_metrics(
+                st.session_state.plan_df, plan["remaining"], week_start, plan["day_sessions"],
+                plan["time_mode"], plan["global_times"], plan["day_override_times"],
+            ))
+        metrics = memo[1]
+
+        with st.expander("Plan quality metrics", expanded=False):
+            summary = metrics["Summary"].iloc[0]
+            m1, m2, m3, m4, m5 = st.columns(5)
+            m1.metric("Utilisation", "—" if pd.isna(summary["Utilisation %"]) else f"{summary['Utilisation %']}%")
+            m2.metric("Dark Blue unplanned", int(summary["Dark Blue unplanned"]))
+            m3.metric("Light Blue unplanned", int(summary["Light Blue unplanned"]))
+            m4.metric("Cutoff at risk", int(summary["Cutoff at risk"]))
+            m5.metric("Territory switches", int(summary["Territory switches"]))
+
+            for title in ["Session utilisation", "Unplanned urgent", "Cutoff at risk", "Territory switches", "Cluster batches"]:
+                st.write(f"**{title}**")
+                st.dataframe(metrics[title], use_container_width=True, hide_index=True)
+
+            st.write("**Territory assignment: Lookahead vs Greedy**")
+            if st.button("Compare assignment modes", key="assignment_compare_run"):
+                with st.spinner("Planning the week both ways..."):
+                    st.session_state.assignment_compare = compare_assignment_modes(
+                        df_work, week_start, plan["active_days"], plan["day_sessions"], plan["time_mode"],
+                        plan["global_times"], plan["day_override_times"], plan["day_focus"], plan.get("day_allowed"),
+                        street_col=colmap.get("street"), pinned=st.session_state.pinned,
+                        neighbours=plan.get("neighbours"),
+                    )
+            if st.session_state.get("assignment_compare") is not None:
+                st.dataframe(st.session_state.assignment_compare, use_container_width=True, hide_index=True)
+
+            st.download_button(
+                "Export metrics sheet",
+                data=lambda: build_metrics_workbook(metrics),
+                file_name=f"flowboard_metrics_{week_start.isoformat()}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+
+    @st.fragment(key="review_edits")
+    def review_edits():
+        with st.expander("Manual edits (move, swap, pin)", expanded=False):
+            loc_order = {loc: i for i, loc in enumerate(board.locations)}
+            planned_keys = [k for k, loc in board.where.items() if loc is not None]
+            planned_keys.sort(key=lambda k: (loc_order[board.where[k]], board.jobs[k].get("_planned_seq", 0)))
+            unplanned_keys = [job_key(j) for j in plan["remaining"][:MANUAL_EDIT_UNPLANNED_OPTIONS]]
+            job_choices = planned_keys + unplanned_keys
+            session_choices = board.locations + [None]
+
+            if not job_choices:
+                st.caption("— no jobs —")
+            else:
+                e1, e2, e3 = st.columns([3, 2, 1])
+                with e1:
+                    edit_key = st.selectbox("Job", job_choices, format_func=job_choice_label, key="edit_job")
+                with e2:
+                    edit_to = st.selectbox(
+                        "Move to",
+                        session_choices,
+                        format_func=lambda loc: "Unplanned" if loc is None else f"{loc[0]} {loc[1]}",
+                        key="edit_to",
+                    )
+                with e3:
+                    st.write("")
+                    if st.button("Move", key="edit_move", use_container_width=True):
+                        board.move(edit_key, edit_to)
+                        apply_board_edit()
+
+                s1, s2, s3 = st.columns([3, 2, 1])
+                with s1:
+                    swap_key = st.selectbox("Swap with", job_choices, format_func=job_choice_label, key="edit_swap_with")
+                with s2:
+                    st.write("")
+                    if st.button("Swap", key="edit_swap", disabled=swap_key == edit_key, use_container_width=True):
+                        board.swap(edit_key, swap_key)
+                        apply_board_edit()
+                with s3:
+                    st.write("")
+                    if edit_key in board.pinned:
+                        if st.button("Unpin", key="edit_unpin", use_container_width=True):
+                            board.unpin(edit_key)
+                            st.rerun()
+                    elif st.button("Pin", key="edit_pin", disabled=board.where[edit_key] is None, use_container_width=True):
+                        board.pin(edit_key)
+                        st.rerun()
+
+            st.caption(
+                f"{len(board.pinned)} pinned (kept in place by the next PLAN) • "
+                f"{board.dark_unplanned} Dark Blue unplanned"
+            )
+
+    def review_day(d):
+        sessions = plan["day_sessions"][d]
+        focus = plan["day_focus"].get(d, "(auto)")
+        st.markdown(f"### {d}")
+        st.caption(f"Focus: {focus}")
+
+        st.button(
+            "Reset", key=f"reset_{d}", on_click=reset_board_day, args=(d,),
+            use_container_width=True, help="Unplan this day's jobs (pinned jobs stay).",
+        )
+
+        for sess in ["AM", "PM"]:
+            if not sessions[sess]["enabled"]:
+                continue
+
+            st.markdown(f"**{sess}**")
+            items = plan["buckets"][d][sess]
+            st.caption(f"{board.minutes[(d, sess)]} / {board.capacity[(d, sess)]} mins")
+            for warning in board.warnings((d, sess)):
+                st.warning(warning)
+
+            box = st.container(border=True)
+            with box:
+                if not items:
+                    st.caption("— empty —")
+                else:
+                    for job in items:
+                        st.markdown(render_job(job, job_key(job) in board.pinned), unsafe_allow_html=True)
+            st.write("")
+
+    review_metrics()
+    review_edits()
+
     active_day_list = [d for d in WEEKDAYS if plan["active_days"].get(d, False)]
     day_cols = st.columns(len(active_day_list)) if active_day_list else []
 
+    # One fragment per day column, so a day's Reset redraws that column alone
     for idx, d in enumerate(active_day_list):
         with day_cols[idx]:
-            sessions = plan["day_sessions"][d]
-            focus = plan["day_focus"].get(d, "(auto)")
-            st.markdown(f"### {d}")
-            st.caption(f"Focus: {focus}")
-
-            if st.button("Reset", key=f"reset_{d}", use_container_width=True):
-                for sess in ["AM", "PM"]:
-                    plan["remaining"] = plan["buckets"][d][sess] + plan["remaining"]
-                    plan["buckets"][d][sess] = []
-                st.session_state.plan = plan
-                st.experimental_rerun()
-
-            for sess in ["AM", "PM"]:
-                if not sessions[sess]["enabled"]:
-                    continue
-
-                st.markdown(f"**{sess}**")
-                items = plan["buckets"][d][sess]
-
-                box = st.container(border=True)
-                with box:
-                    if not items:
-                        st.caption("— empty —")
-                    else:
-                        for i, job in enumerate(items, start=1):
-                            job["_planned_seq"] = i
-                        for job in items:
-                            st.markdown(render_job(job), unsafe_allow_html=True)
-                st.write("")
+            st.fragment(review_day, key=f"review_day_{d}")(d)
+
+
+# -----------------------------
+# Speculative pre-planning (started last, once the page is drawn)
+# -----------------------------
+# Once a plan for the current settings is on screen, plan the weeks either side of it in the background
+shown = st.session_state.plan
+if shown is not None and shown.get("plan_scope") == plan_scope and st.session_state.plan_run is None:
+    weeks = [shown["week_start"] + timedelta(days=offset) for offset in PRE_PLAN_WEEK_OFFSETS]
+    pre = st.session_state.pre_plan
+    if pre is None or pre.weeks != weeks:
+        if pre is not None:
+            pre.cancel()
+        args, kwargs = planner_args(run_settings)
+        st.session_state.pre_plan = PrePlanner(plan_cache, plan_scope, weeks, df_work, *args, **kwargs).start()
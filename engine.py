@@ -0,0 +1,2262 @@
+import hashlib
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from functools import partial
+from itertools import combinations, count
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, time, timedelta
+
+from ingest import INGEST_TAG_COLS, concat_compact
+
+# =========================================================
+# Flowboard — planning engine
+# - Bible rules (urgency bands, cutoff, futile rank, minute estimates)
+# - Session capacity from time bounds + load
+# - Territory-aware week planner (importable: no Streamlit here)
+# =========================================================
+
+# Copy-on-write is the default from pandas 3; opt in on pandas 2 so the
+# shallow copies / views below never write through to the uploaded backlog.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+LOAD_MODES = ["Light", "Normal", "Heavy"]  # Heavy = +20%
+LOAD_MULTIPLIER = {"Light": 0.85, "Normal": 1.00, "Heavy": 1.20}
+
+
+def monday_of_week(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def as_date(x):
+    if pd.isna(x):
+        return None
+    if isinstance(x, date) and not isinstance(x, datetime):
+        return x
+    if isinstance(x, datetime):
+        return x.date()
+    try:
+        return pd.to_datetime(x).date()
+    except Exception:
+        return None
+
+
+def normalize_address(row, number_col, street_col, suburb_col, city_col):
+    parts = []
+    if number_col and pd.notna(row.get(number_col, None)):
+        parts.append(str(row[number_col]).strip())
+    if street_col and pd.notna(row.get(street_col, None)):
+        parts.append(str(row[street_col]).strip())
+    addr = " ".join(parts).strip()
+
+    loc_parts = []
+    if suburb_col and pd.notna(row.get(suburb_col, None)):
+        loc_parts.append(str(row[suburb_col]).strip())
+    if city_col and pd.notna(row.get(city_col, None)):
+        loc_parts.append(str(row[city_col]).strip())
+    loc = ", ".join([p for p in loc_parts if p])
+
+    return addr if not loc else f"{addr} — {loc}"
+
+
+def cutoff_date(target_date: date):
+    return (target_date + timedelta(days=30)) if target_date else None
+
+
+def urgency_band(target_date: date, week_start: date):
+    """
+    Bible + fix:
+    - Dark Blue if last-chance week OR already overdue (cutoff passed).
+    - Light Blue if 1-2 weeks before last-chance week.
+    """
+    if not target_date:
+        return "Flexible"
+
+    window_close = cutoff_date(target_date)
+    last_week_start = monday_of_week(window_close)
+
+    # overdue or last-chance week
+    if week_start >= last_week_start:
+        return "Dark Blue"
+
+    if week_start in (last_week_start - timedelta(days=7), last_week_start - timedelta(days=14)):
+        return "Light Blue"
+
+    return "Flexible"
+
+
+def futile_rank(status_val):
+    if status_val is None or (isinstance(status_val, float) and pd.isna(status_val)):
+        return 0
+    s = str(status_val).strip().lower()
+    if "futile 2" in s or "futile2" in s:
+        return 2
+    if "futile 1" in s or "futile1" in s:
+        return 1
+    return 0
+
+
+def estimate_minutes(bedrooms, inspection_type=None):
+    try:
+        b = int(float(bedrooms))
+    except Exception:
+        b = None
+
+    if b is None:
+        base = 15
+    elif b <= 1:
+        base = 7
+    elif b <= 3:
+        base = 15
+    else:
+        base = 40
+
+    if inspection_type:
+        t = str(inspection_type).lower()
+        if "plus" in t or "full" in t or "condition" in t:
+            base = int(base * 1.35)
+
+    return base
+
+
+def session_capacity_minutes(time_mode, global_times, day_override_times, day_name, session_name, load_mode):
+    times = day_override_times.get(day_name) or global_times
+
+    if time_mode == "Inspection window":
+        start_t = times["start_first"]
+        end_t = times["latest_arrival_last"]
+    else:
+        start_t = times["depart_depot"]
+        end_t = times["return_depot"]
+
+    if not (start_t and end_t):
+        base_minutes = 240
+    else:
+        dt0 = datetime.combine(date.today(), start_t)
+        dt1 = datetime.combine(date.today(), end_t)
+        base_minutes = max(0, int((dt1 - dt0).total_seconds() // 60))
+
+    sess = int(base_minutes * 0.55) if session_name == "AM" else int(base_minutes * 0.45)
+    sess = int(sess * LOAD_MULTIPLIER[load_mode])
+    sess = int(sess * 0.90)  # safety buffer
+    return max(60, sess)
+
+
+DEFAULT_DAY_START = "08:00"  # used for session windows when no time bounds are set
+
+
+def session_window(time_mode, global_times, day_override_times, day_name, session_name):
+    """(start, end) time of day of a session: the day window split 55% AM / 45% PM, as in session_capacity_minutes."""
+    times = day_override_times.get(day_name) or global_times
+    if time_mode == "Inspection window":
+        start_t, end_t = times["start_first"], times["latest_arrival_last"]
+    else:
+        start_t, end_t = times["depart_depot"], times["return_depot"]
+
+    if start_t and end_t:
+        dt0 = datetime.combine(date.today(), start_t)
+        base_minutes = max(0, int((datetime.combine(date.today(), end_t) - dt0).total_seconds() // 60))
+    else:
+        dt0 = datetime.combine(date.today(), datetime.strptime(DEFAULT_DAY_START, "%H:%M").time())
+        base_minutes = 240
+
+    am_minutes = int(base_minutes * 0.55)
+    if session_name == "AM":
+        return dt0.time(), (dt0 + timedelta(minutes=am_minutes)).time()
+    return (dt0 + timedelta(minutes=am_minutes)).time(), (dt0 + timedelta(minutes=base_minutes)).time()
+
+
+# -----------------------------
+# Derivation stage: backlog -> compact working frame
+# -----------------------------
+URGENCY_LEVELS = ["Dark Blue", "Light Blue", "Flexible"]
+URGENCY_ORDER = {"Dark Blue": 0, "Light Blue": 1, "Flexible": 2}
+
+
+def to_datetime_days(values) -> pd.Series:
+    """as_date semantics, vectorised: datetime64[ns] at midnight, NaT where unparseable."""
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Parse each distinct value once, then broadcast through the codes
+        parsed = to_datetime_days(pd.Series(s.cat.categories.to_numpy(dtype=object))).to_numpy()
+        codes = s.cat.codes.to_numpy()
+        out = np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[ns]")
+        out[codes >= 0] = parsed[codes[codes >= 0]]
+        return pd.Series(out, index=s.index)
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        if getattr(s.dt, "tz", None) is not None:
+            s = s.dt.tz_localize(None)
+        return s.dt.normalize().astype("datetime64[ns]")
+    return pd.to_datetime(s.map(as_date), errors="coerce").astype("datetime64[ns]")
+
+
+def urgency_band_series(target_dates: pd.Series, week_start: date) -> pd.Series:
+    """urgency_band over a datetime64 Series, as a categorical."""
+    t = to_datetime_days(target_dates)
+    cutoff = t + pd.Timedelta(days=30)
+    last_week_start = cutoff - pd.to_timedelta(cutoff.dt.weekday, unit="D")
+    ws = pd.Timestamp(week_start)
+    dark = (ws >= last_week_start).to_numpy()
+    light = ((last_week_start - pd.Timedelta(days=7) == ws) | (last_week_start - pd.Timedelta(days=14) == ws)).to_numpy()
+    bands = np.where(t.isna().to_numpy(), "Flexible", np.where(dark, "Dark Blue", np.where(light, "Light Blue", "Flexible")))
+    return pd.Series(pd.Categorical(bands, categories=URGENCY_LEVELS), index=t.index)
+
+
+# Appointment columns (optional mapping): booked jobs carry their start in APPT_COL
+APPT_COL = "_appt_start"
+APPT_TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M%p", "%I %p", "%I%p", "%H.%M")
+
+
+def appointment_cell(value):
+    """One appointment-time cell -> (minutes after midnight, date or None); (None, None) when unreadable."""
+    if isinstance(value, time):
+        return value.hour * 60 + value.minute, None
+    if value is None or pd.isna(value):
+        return None, None
+    if isinstance(value, datetime):
+        # Time-only Excel cells can come back on the 1899 / 1900 epoch
+        return value.hour * 60 + value.minute, value.date() if value.year > 1900 else None
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        # Excel stores a bare time as a fraction of a day
+        return (int(round(float(value) * 1440)), None) if 0 <= float(value) < 1 else (None, None)
+    text = str(value).strip().upper()
+    for fmt in APPT_TIME_FORMATS:
+        try:
+            t = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return t.hour * 60 + t.minute, None
+    try:
+        ts = pd.to_datetime(text)
+    except (ValueError, TypeError, OverflowError):
+        return None, None
+    if pd.isna(ts):
+        return None, None
+    return ts.hour * 60 + ts.minute, ts.date()
+
+
+def appointment_starts(df: pd.DataFrame, cm: dict):
+    """
+    Booked start per row (datetime64, NaT when not booked), or None when no appointment time is mapped.
+    The date comes from the appointment date column, else from a full date-time in the time column;
+    a row needs both a date and a time to count as booked. Each distinct cell is parsed once.
+    """
+    time_col = cm.get("appt_time") if cm.get("appt_time") in df.columns else None
+    if time_col is None:
+        return None
+    date_col = cm.get("appt_date") if cm.get("appt_date") in df.columns else None
+
+    codes, uniques = pd.factorize(df[time_col].astype(object))
+    parsed = [appointment_cell(v) for v in uniques]
+    # code -1 (missing cell) picks the trailing NaN / NaT
+    mins = np.array([np.nan if m is None else m for m, _ in parsed] + [np.nan], dtype=float)[codes]
+    if date_col is not None:
+        days = to_datetime_days(df[date_col]).to_numpy()
+    else:
+        stamped = [np.datetime64("NaT") if d is None else np.datetime64(d) for _, d in parsed]
+        days = np.array(stamped + [np.datetime64("NaT")], dtype="datetime64[ns]")[codes]
+    return pd.Series(days, index=df.index) + pd.to_timedelta(mins, unit="m")
+
+
+def geo_key_series(frame: pd.DataFrame, street_col=None) -> pd.Series:
+    """Light geo grouping key (street), str() per cell like the planner has always done."""
+    geo_key_cols = []
+    if street_col:
+        geo_key_cols.append(street_col)
+    if geo_key_cols and all(c in frame.columns for c in geo_key_cols):
+        return frame[geo_key_cols].astype(object).apply(lambda c: c.map(str)).agg(" | ".join, axis=1)
+    return pd.Series("Unknown", index=frame.index, dtype=object)
+
+
+def compact_work_frame(df_work: pd.DataFrame, street_col=None, status_col=None) -> pd.DataFrame:
+    """
+    Shrink a derived working frame: categoricals for urgency / territory / geo key / status,
+    datetime64 for dates, small ints for minutes, ranks, urgency order and Excel row.
+    Categories are lexically sorted, so sorting on codes matches sorting on the strings.
+    """
+    df_work["_target_date"] = to_datetime_days(df_work["_target_date"])
+    df_work["_cutoff_date"] = to_datetime_days(df_work["_cutoff_date"])
+    df_work["_urgency"] = pd.Categorical(df_work["_urgency"].astype(object), categories=URGENCY_LEVELS)
+    df_work["_urg_order"] = df_work["_urgency"].map(URGENCY_ORDER).astype(float).fillna(2).astype("int8")
+    df_work["_territory"] = df_work["_territory"].astype(object).map(str).astype("category")
+    if "_geo_key" not in df_work.columns:
+        df_work["_geo_key"] = geo_key_series(df_work, street_col)
+    df_work["_geo_key"] = df_work["_geo_key"].astype("category")
+    df_work["_mins"] = pd.to_numeric(df_work["_mins"]).astype("int16")
+    df_work["_futile_rank"] = pd.to_numeric(df_work["_futile_rank"]).astype("int8")
+    df_work["_excel_row"] = pd.to_numeric(df_work["_excel_row"]).astype("int32")
+    if status_col and status_col in df_work.columns:
+        df_work[status_col] = df_work[status_col].astype("category")
+    return df_work
+
+
+DERIVE_CHUNK_ROWS = 50_000
+
+
+def derive_work_frame_chunked(chunks, cm: dict, week_start: date) -> pd.DataFrame:
+    """derive_work_frame over an iterable of backlog chunks; only the compact results are kept and joined."""
+    return mark_duplicates(concat_compact([derive_row_columns(chunk, cm, week_start) for chunk in chunks]), cm)
+
+
+def derive_work_frame(df: pd.DataFrame, cm: dict, week_start: date) -> pd.DataFrame:
+    """
+    Backlog + column map -> compact working frame the planner, overview and exports read.
+    Large backlogs are derived DERIVE_CHUNK_ROWS at a time, so per-row temporaries stay chunk-sized.
+    Duplicate copies of a job are linked across the whole frame (mark_duplicates).
+    """
+    if len(df) > DERIVE_CHUNK_ROWS:
+        if "_excel_row" not in df.columns:
+            df = df.copy(deep=False)
+            df["_excel_row"] = range(2, len(df) + 2)
+        return derive_work_frame_chunked(
+            (df.iloc[i:i + DERIVE_CHUNK_ROWS] for i in range(0, len(df), DERIVE_CHUNK_ROWS)), cm, week_start
+        )
+    return mark_duplicates(derive_row_columns(df, cm, week_start), cm)
+
+
+def derive_row_columns(df: pd.DataFrame, cm: dict, week_start: date) -> pd.DataFrame:
+    """The row-local derived columns (dates, urgency, label, minutes, rank, territory), compacted."""
+    # We use a single "area" grouping column for planning. By default this is Suburb (best),
+    # otherwise City/Town/Region/Area if available.
+    col_geo = cm.get("suburb") if cm.get("suburb") in df.columns else None
+    if col_geo is None:
+        col_geo = cm.get("city") if cm.get("city") in df.columns else None
+
+    # Copy-on-write shallow copy: only the derived columns below get materialised
+    df_work = df.copy(deep=False)
+    if "_excel_row" not in df_work.columns:
+        df_work["_excel_row"] = df_work.reset_index().index + 2
+
+    # target + urgency + cutoff
+    if cm["target"]:
+        df_work["_target_date"] = to_datetime_days(df_work[cm["target"]])
+    else:
+        df_work["_target_date"] = pd.Series(pd.NaT, index=df_work.index, dtype="datetime64[ns]")
+
+    df_work["_cutoff_date"] = df_work["_target_date"] + pd.Timedelta(days=30)
+    df_work["_urgency"] = urgency_band_series(df_work["_target_date"], week_start)
+
+    # label
+    df_work["_label"] = df_work.apply(
+        lambda r: normalize_address(r, cm["number"], cm["street"], cm["suburb"], cm["city"]),
+        axis=1
+    ) if len(df_work) else pd.Series(dtype=object)
+
+    # estimates + futile rank
+    beds = df_work[cm["bed"]] if cm["bed"] else [None] * len(df_work)
+    types = df_work[cm["type"]] if cm["type"] else [None] * len(df_work)
+    df_work["_mins"] = [estimate_minutes(b, t) for b, t in zip(beds, types)]
+    df_work["_futile_rank"] = df_work[cm["status"]].astype(object).map(futile_rank) if cm["status"] else 0
+
+    # territory from mapping
+    if col_geo and col_geo in df_work.columns:
+        geo_series = df_work[col_geo].astype(object).fillna("").astype(str).str.strip()
+        df_work["_territory"] = geo_series.where(geo_series != "", "Unknown")
+    else:
+        df_work["_territory"] = "Unknown"
+
+    # booked appointment (only when an appointment time column is mapped)
+    appt = appointment_starts(df_work, cm)
+    if appt is not None:
+        df_work[APPT_COL] = appt
+
+    return compact_work_frame(df_work, cm.get("street"), cm.get("status"))
+
+
+PLANNED_COLS = ["_planned_day", "_planned_date", "_planned_session", "_planned_seq"]
+
+
+def reband_work_frame(df_work: pd.DataFrame, week_start: date) -> pd.DataFrame:
+    """
+    Working frame banded for another week (copy-on-write): only _urgency / _urg_order change, plus
+    which duplicate copy leads, since that follows urgency. Equal to deriving for week_start afresh.
+    """
+    out = df_work.copy(deep=False)
+    out["_urgency"] = urgency_band_series(out["_target_date"], week_start)
+    out["_urg_order"] = out["_urgency"].map(URGENCY_ORDER).astype(float).fillna(2).astype("int8")
+    if DUP_KEY_COL in out.columns:
+        out[DUP_KEEP_COL] = duplicate_keep(out)
+    return out
+
+
+def roll_forward_frame(remaining, week_start: date, street_col=None, status_col=None, df_work=None) -> pd.DataFrame:
+    """
+    Unplanned jobs (plan `remaining`, including per-day Reset pull-backs) -> working frame for week_start.
+    Labels, minutes, ranks, territory and geo keys carry over as derived; only urgency is re-banded.
+    df_work: the frame the plan came from; the linked duplicate copies of the unplanned jobs come along,
+    so a later week that plans the job still writes back to every copy (with_duplicate_rows).
+    """
+    frame = pd.DataFrame.from_records(remaining or [])
+    if frame.empty:
+        return frame
+    frame = frame.drop(columns=[c for c in PLANNED_COLS + [DUP_KEEP_COL] if c in frame.columns])
+    if df_work is not None and DUP_KEEP_COL in df_work.columns and DUP_KEY_COL in frame.columns:
+        copies = df_work[~df_work[DUP_KEEP_COL].to_numpy()]
+        unplanned_keys = frame[DUP_KEY_COL][(frame[DUP_KEY_COL] != 0).to_numpy()]
+        copies = copies[copies[DUP_KEY_COL].isin(unplanned_keys).to_numpy()]
+        if not copies.empty:
+            copies = copies.drop(columns=[c for c in PLANNED_COLS + [DUP_KEEP_COL] if c in copies.columns])
+            frame = pd.concat([frame, copies], ignore_index=True)
+    return reband_work_frame(compact_work_frame(frame, street_col, status_col), week_start)
+
+
+# -----------------------------
+# Duplicate jobs (same address + reference)
+# -----------------------------
+DUP_KEY_COL = "_dup_key"
+DUP_KEEP_COL = "_dup_keep"
+
+
+DUP_KEY_PARTS = ["number", "street", "suburb", "city", "ref"]
+HASH_MIX = np.uint64(0x100000001B3)
+
+
+def normalised_text_series(s: pd.Series) -> pd.Series:
+    """Lower-cased, punctuation folded to single spaces, trailing ".0" dropped; "" for missing."""
+    text = s.astype(object).where(s.notna(), "").map(str)
+    return (
+        text.str.replace(r"\.0$", "", regex=True)
+        .str.lower()
+        .str.replace(r"[\W_]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+EMPTY_TEXT_HASH = pd.util.hash_array(np.array([""], dtype=object))[0]
+
+
+def normalised_hashes(s: pd.Series):
+    """(per-row hash of the normalised text, non-empty mask); each distinct value is normalised and hashed once."""
+    codes, uniques = pd.factorize(s)
+    norm = normalised_text_series(pd.Series(np.asarray(uniques, dtype=object)))
+    # Missing values have code -1, which picks the appended "" entry
+    hashes = np.append(pd.util.hash_array(norm.to_numpy(dtype=object)), EMPTY_TEXT_HASH)
+    filled = np.append((norm != "").to_numpy(), False)
+    return hashes[codes], filled[codes]
+
+
+def address_key_hashes(df: pd.DataFrame, cm: dict) -> np.ndarray:
+    """
+    int64 hash of normalize_address's parts (number, street, suburb, city) plus the reference,
+    each normalised; 0 for rows with no address at all (those are never treated as duplicates).
+    """
+    n = len(df)
+    key = np.zeros(n, dtype="uint64")
+    has_address = np.zeros(n, dtype=bool)
+    for part in DUP_KEY_PARTS:
+        col = cm.get(part)
+        if col and col in df.columns:
+            hashes, filled = normalised_hashes(df[col])
+        else:
+            hashes, filled = np.full(n, EMPTY_TEXT_HASH, dtype="uint64"), np.zeros(n, dtype=bool)
+        key = key * HASH_MIX ^ hashes
+        if part != "ref":
+            has_address |= filled
+    # int64 view of the 64-bit hash: survives the planner's records round trip with one dtype
+    return np.where(has_address, key.view("int64"), 0)
+
+
+def mark_duplicates(df_work: pd.DataFrame, cm: dict) -> pd.DataFrame:
+    """
+    Hash each row's address key into DUP_KEY_COL (0 = no address) and set DUP_KEEP_COL on the copy
+    the planner should use: the most urgent one (urgency, cutoff, futile rank, then upload order).
+    One vectorised sort groups every duplicate; the other copies stay in the frame for write-back.
+    """
+    df_work[DUP_KEY_COL] = address_key_hashes(df_work, cm)
+    df_work[DUP_KEEP_COL] = duplicate_keep(df_work)
+    return df_work
+
+
+def duplicate_keep(df_work: pd.DataFrame) -> np.ndarray:
+    """DUP_KEEP_COL from the DUP_KEY_COL hashes and the current urgency (re-run when a frame is re-banded)."""
+    hashed = df_work[DUP_KEY_COL].to_numpy()
+    order = pd.DataFrame({
+        "h": hashed,
+        "u": df_work["_urg_order"].to_numpy(),
+        "c": df_work["_cutoff_date"].to_numpy(),
+        "f": df_work["_futile_rank"].to_numpy(),
+    }).sort_values(by=["h", "u", "c", "f"], kind="mergesort")
+    keep = np.ones(len(df_work), dtype=bool)
+    keep[order.index.to_numpy()] = ~pd.Series(order["h"].to_numpy()).duplicated().to_numpy()
+    keep |= hashed == 0
+    return keep
+
+
+def with_duplicate_rows(plan_df: pd.DataFrame, df_work: pd.DataFrame) -> pd.DataFrame:
+    """
+    plan_df plus each planned job's linked duplicate rows, carrying the same planned day / session /
+    stop, so a write-back export reaches every source row of the job.
+    """
+    if plan_df is None or plan_df.empty or DUP_KEY_COL not in plan_df.columns or DUP_KEEP_COL not in df_work.columns:
+        return plan_df
+    copies = df_work[~df_work[DUP_KEEP_COL].to_numpy()]
+    if copies.empty:
+        return plan_df
+    planned = plan_df[[DUP_KEY_COL] + [c for c in PLANNED_COLS if c in plan_df.columns]]
+    linked = copies.merge(planned[planned[DUP_KEY_COL] != 0], on=DUP_KEY_COL, how="inner")
+    return plan_df if linked.empty else pd.concat([plan_df, linked], ignore_index=True)
+
+
+# -----------------------------
+# Cluster key helper (conservative)
+# -----------------------------
+CLUSTER_UNIT_PREFIX_RE = r"^(unit|apt|apartment|flat)\s*\w+\s*,\s*"
+CLUSTER_SLASH_PREFIX_RE = r"^[a-z0-9]+\s*/\s*"
+CLUSTER_BLDG_RE = r"^(\d+[a-z]?)\s+([a-z\s]+?)\s+(ave|avenue|rd|road|st|street|cres|crescent|pl|place|dr|drive|tce|terrace|ln|lane)\b"
+
+
+def derive_cluster_key(job: dict) -> str:
+    label = str(job.get("_label", "") or "").strip().lower()
+    if not label:
+        return f"geo|{str(job.get('_geo_key','Unknown')).strip().lower()}"
+
+    label = re.sub(CLUSTER_UNIT_PREFIX_RE, "", label)
+    label = re.sub(CLUSTER_SLASH_PREFIX_RE, "", label)
+
+    m = re.match(CLUSTER_BLDG_RE, label)
+    if m:
+        num = m.group(1)
+        street = re.sub(r"\s+", " ", m.group(2).strip())
+        st_type = m.group(3)
+        return f"bldg|{num}|{street}|{st_type}"
+
+    return f"geo|{str(job.get('_geo_key','Unknown')).strip().lower()}"
+
+
+def cluster_key_series(frame: pd.DataFrame) -> pd.Series:
+    """Vectorised derive_cluster_key over a frame with _label / _geo_key columns."""
+    n = len(frame)
+    labels = frame["_label"] if "_label" in frame.columns else pd.Series([""] * n, index=frame.index)
+    geo = frame["_geo_key"] if "_geo_key" in frame.columns else pd.Series(["Unknown"] * n, index=frame.index)
+
+    label = labels.where(labels.notna() & (labels.astype(str) != ""), "").astype(str).str.strip().str.lower()
+    geo_key = "geo|" + geo.astype(object).map(str).str.strip().str.lower()
+
+    stripped = label.str.replace(CLUSTER_UNIT_PREFIX_RE, "", n=1, regex=True)
+    stripped = stripped.str.replace(CLUSTER_SLASH_PREFIX_RE, "", n=1, regex=True)
+    parts = stripped.str.extract(CLUSTER_BLDG_RE)
+    street = parts[1].str.strip().str.replace(r"\s+", " ", regex=True)
+    bldg_key = "bldg|" + parts[0] + "|" + street + "|" + parts[2]
+
+    return bldg_key.where(parts[0].notna() & (label != ""), geo_key)
+
+
+def job_key(job) -> tuple:
+    """(source file, sheet, Excel row): identifies a job across replans and manual edits."""
+    return tuple(
+        None if v is None or (not isinstance(v, str) and pd.isna(v)) else v
+        for v in (job.get(c) for c in INGEST_TAG_COLS)
+    )
+
+
+def plan_rows_frame(buckets) -> pd.DataFrame:
+    planned_rows = []
+    for d, sessions in buckets.items():
+        for sess, items in sessions.items():
+            planned_rows.extend(items)
+    return pd.DataFrame(planned_rows) if planned_rows else pd.DataFrame()
+
+
+# -----------------------------
+# Planning Engine: territory-aware + day focus
+# -----------------------------
+class PlanCancelled(Exception):
+    """Raised inside build_week_plan when its cancel event is set."""
+
+
+PLAN_SORT_KEYS = ["_urg_order", "_cutoff_sort", "_dark_tie", "_territory", "_geo_key", "_mins"]
+
+
+def with_plan_keys(df_in: pd.DataFrame, street_col=None) -> pd.DataFrame:
+    """
+    Shallow (copy-on-write) view of df_in plus the derived planner columns it is missing.
+    Linked duplicate copies (DUP_KEEP_COL false) are left out: each job is planned once. The flag
+    itself is then constant, so it is dropped rather than carried on every record (re-banding a
+    rolled-forward frame derives it again).
+    """
+    if DUP_KEEP_COL in df_in.columns:
+        jobs = df_in if df_in[DUP_KEEP_COL].all() else df_in[df_in[DUP_KEEP_COL].to_numpy()]
+        jobs = jobs.drop(columns=DUP_KEEP_COL)
+    else:
+        jobs = df_in.copy(deep=False)
+
+    # -----------------------------
+    # Priority hierarchy (lower = more urgent)
+    # -----------------------------
+    if "_urg_order" not in jobs.columns:
+        jobs["_urg_order"] = jobs["_urgency"].map(URGENCY_ORDER).astype(float).fillna(2).astype("int8")
+
+    # Light geo grouping key (still helpful inside territory)
+    if "_geo_key" not in jobs.columns:
+        jobs["_geo_key"] = geo_key_series(jobs, street_col)
+    return jobs
+
+
+def plan_sort_order(jobs: pd.DataFrame) -> np.ndarray:
+    """
+    Row positions in planner priority order. Only the six small key columns are gathered
+    for the sort; the backlog itself is never reordered or copied.
+    """
+    # Tie-breakers / sorts
+    is_dark = (jobs["_urgency"] == "Dark Blue").to_numpy()
+    futile = jobs["_futile_rank"].to_numpy() if "_futile_rank" in jobs.columns else 0
+    if pd.api.types.is_datetime64_any_dtype(jobs["_cutoff_date"].dtype):
+        # NaT sorts last, exactly where date.max used to put missing cutoffs
+        cutoff_sort = jobs["_cutoff_date"]
+    else:
+        cutoff_sort = jobs["_cutoff_date"].fillna(date.max)
+
+    keys = pd.DataFrame({
+        "_urg_order": jobs["_urg_order"].reset_index(drop=True),
+        "_cutoff_sort": cutoff_sort.reset_index(drop=True),
+        "_dark_tie": np.where(is_dark, futile, 0).astype("int8"),
+        "_territory": jobs["_territory"].reset_index(drop=True),
+        "_geo_key": jobs["_geo_key"].reset_index(drop=True),
+        "_mins": jobs["_mins"].reset_index(drop=True),
+    })
+
+    # Sort primarily by urgency + cutoff + futile, then territory, then street
+    return keys.sort_values(by=PLAN_SORT_KEYS, ascending=[True] * len(PLAN_SORT_KEYS)).index.to_numpy()
+
+
+def prepare_plan_jobs(df_in: pd.DataFrame, street_col=None) -> pd.DataFrame:
+    """Planner keys + priority order, materialised once so it can be shared across many plans."""
+    jobs = with_plan_keys(df_in, street_col)
+    return jobs.take(plan_sort_order(jobs)).reset_index(drop=True)
+
+
+def fill_session(remaining, focus_terr, budget, check_cancel=None, cluster_keys=None, used=0, tail_mins=None):
+    """
+    Fill one session from focus_terr: most urgent tier first, anchors batched with up to two
+    same-cluster jobs (padded from lower tiers when that doesn't starve the tier), up to 110%
+    of budget. Picked jobs are popped from `remaining` (priority-ordered records).
+    cluster_keys: optional {id(job): cluster key} cache shared across calls.
+    used: minutes already taken in the session (pinned jobs).
+    tail_mins: optional {(territory, urgency): shortest job} of jobs left out of `remaining`
+    (plan_candidate_mask), so the starve check still sees the whole tier.
+    """
+    if cluster_keys is None:
+        cluster_keys = {}
+
+    def cluster_key(job):
+        key = cluster_keys.get(id(job))
+        if key is None:
+            key = cluster_keys[id(job)] = derive_cluster_key(job)
+        return key
+
+    def pop_first_matching(predicate):
+        """Pop first item in remaining that matches predicate."""
+        for i, item in enumerate(remaining):
+            if predicate(item):
+                return remaining.pop(i)
+        return None
+
+    def peek_any(predicate):
+        """Check if any remaining item matches predicate."""
+        return any(predicate(x) for x in remaining)
+
+    picked = []
+
+    while True:
+        if check_cancel is not None:
+            check_cancel()
+        tier_in_terr = None
+        for tier_name in ["Dark Blue", "Light Blue", "Flexible"]:
+            if peek_any(lambda x, t=tier_name: str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == t):
+                tier_in_terr = tier_name
+                break
+
+        if tier_in_terr is None:
+            break
+
+        anchor = pop_first_matching(lambda x: str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == tier_in_terr)
+        if not anchor:
+            break
+
+        anchor_m = int(anchor.get("_mins", 15))
+        if used + anchor_m > int(budget * 1.10):
+            remaining.insert(0, anchor)
+            break
+
+        ck = cluster_key(anchor)
+        batch = [anchor]
+        batch_minutes = anchor_m
+
+        def pop_same_tier_same_cluster():
+            return pop_first_matching(
+                lambda x: str(x.get("_territory", "Unknown")) == focus_terr
+                and x.get("_urgency") == tier_in_terr
+                and cluster_key(x) == ck
+            )
+
+        while len(batch) < 3:
+            nxt = pop_same_tier_same_cluster()
+            if not nxt:
+                break
+            m = int(nxt.get("_mins", 15))
+            if used + batch_minutes + m <= int(budget * 1.10):
+                batch.append(nxt)
+                batch_minutes += m
+            else:
+                remaining.insert(0, nxt)
+                break
+
+        if len(batch) < 3:
+            if tier_in_terr == "Dark Blue":
+                lower_tiers = ["Flexible", "Light Blue"]
+            elif tier_in_terr == "Light Blue":
+                lower_tiers = ["Flexible"]
+            else:
+                lower_tiers = []
+
+            def would_starve_same_tier_if_add(extra_minutes: int) -> bool:
+                remaining_budget_after = int(budget * 1.10) - (used + batch_minutes + extra_minutes)
+                if remaining_budget_after <= 0:
+                    return True
+                mins_same_tier = [
+                    int(x.get("_mins", 15))
+                    for x in remaining
+                    if str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == tier_in_terr
+                ]
+                if tail_mins and (focus_terr, tier_in_terr) in tail_mins:
+                    mins_same_tier.append(tail_mins[(focus_terr, tier_in_terr)])
+                if not mins_same_tier:
+                    return False
+                return remaining_budget_after < min(mins_same_tier)
+
+            for lt in lower_tiers:
+                while len(batch) < 3:
+                    pad = pop_first_matching(
+                        lambda x, lt=lt: str(x.get("_territory", "Unknown")) == focus_terr
+                        and x.get("_urgency") == lt
+                        and cluster_key(x) == ck
+                    )
+                    if not pad:
+                        break
+
+                    m = int(pad.get("_mins", 15))
+                    if used + batch_minutes + m > int(budget * 1.10):
+                        remaining.insert(0, pad)
+                        break
+
+                    if would_starve_same_tier_if_add(m):
+                        remaining.insert(0, pad)
+                        break
+
+                    batch.append(pad)
+                    batch_minutes += m
+
+                if len(batch) >= 3:
+                    break
+
+        for item in batch:
+            picked.append(item)
+        used += batch_minutes
+    return picked
+
+
+# -----------------------------
+# Appointment slots (booked jobs on a per-day interval index)
+# -----------------------------
+class DayTimeline:
+    """
+    One day's booked intervals (minutes after midnight), kept sorted and disjoint, so a conflict
+    check or a session's slice is a bisect: O(log n) however many bookings the day holds.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.jobs = []
+
+    def conflicts(self, start: int, end: int) -> bool:
+        i = bisect_right(self.starts, start)
+        if i and self.ends[i - 1] > start:
+            return True
+        return i < len(self.starts) and self.starts[i] < end
+
+    def add(self, start: int, end: int, job) -> bool:
+        """Book [start, end) for job; False (nothing booked) when it overlaps an earlier booking."""
+        if self.conflicts(start, end):
+            return False
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.jobs.insert(i, job)
+        return True
+
+    def between(self, lo: float, hi: float):
+        """(start, end, job) of the bookings starting in [lo, hi), in time order."""
+        i, j = bisect_left(self.starts, lo), bisect_left(self.starts, hi)
+        return list(zip(self.starts[i:j], self.ends[i:j], self.jobs[i:j]))
+
+
+def time_minutes(t) -> int:
+    return t.hour * 60 + t.minute
+
+
+def book_appointments(remaining, plan_days, week_start: date, day_sessions, time_mode, global_times, day_override_times):
+    """
+    Take this week's booked jobs out of `remaining` onto per-day timelines and return
+    ({(day, session): [(start, end, job), ...] in time order}, held back). `remaining` is in priority order, so of two clashing bookings
+    the more urgent one keeps its slot. A booking falls in AM if it starts before the AM window ends.
+    Held back (left unplanned): bookings in a later week, on a day or session this plan doesn't run,
+    or clashing with an earlier booking. Bookings before week_start have lapsed and plan like any job.
+    """
+    timelines = {d: DayTimeline() for d in plan_days}
+    am_end = {
+        d: time_minutes(session_window(time_mode, global_times, day_override_times, d, "AM")[1]) for d in plan_days
+    }
+    kept, held_back = [], []
+    for job in remaining:
+        start = job.get(APPT_COL)
+        if start is None or pd.isna(start) or start.date() < week_start:
+            kept.append(job)
+            continue
+        offset = (start.date() - week_start).days
+        d = WEEKDAYS[offset] if offset < 7 else None
+        if d not in timelines:
+            held_back.append(job)
+            continue
+        begin = time_minutes(start)
+        sess = "AM" if begin < am_end[d] else "PM"
+        if not day_sessions[d][sess]["enabled"] or not timelines[d].add(begin, begin + int(job.get("_mins", 15)), job):
+            held_back.append(job)
+    remaining[:] = kept
+
+    booked = {}
+    for d, timeline in timelines.items():
+        for sess, lo, hi in (("AM", float("-inf"), am_end[d]), ("PM", am_end[d], float("inf"))):
+            items = timeline.between(lo, hi)
+            if items:
+                booked[(d, sess)] = items
+    return booked, held_back
+
+
+def sequence_around_bookings(flexible, bookings, start: int):
+    """
+    Interleave a session's flexible jobs (picked order kept) with its bookings ((start, end, job),
+    time order): a flexible job goes in the current gap if it ends before the next booking starts,
+    otherwise that booking comes first and the clock jumps to its end.
+    """
+    out = []
+    t = start
+    bi = 0
+    for job in flexible:
+        m = int(job.get("_mins", 15))
+        while bi < len(bookings) and t + m > bookings[bi][0]:
+            out.append(bookings[bi][2])
+            t = max(t, bookings[bi][1])
+            bi += 1
+        out.append(job)
+        t += m
+    out.extend(b[2] for b in bookings[bi:])
+    return out
+
+
+# -----------------------------
+# Area neighbours (spillover when the focus area runs dry)
+# -----------------------------
+NEIGHBOUR_COUNT = 3
+NEIGHBOUR_MAX_KM = 10.0
+EARTH_RADIUS_KM = 6371.0
+
+
+def parse_adjacency(text: str) -> dict:
+    """
+    "Area: Neighbour, Neighbour" per line -> {area: [neighbours]}, in the order written.
+    Pairs are mirrored, so "Glebe: Ultimo" also makes Glebe a neighbour of Ultimo.
+    """
+    adjacency = {}
+    for line in (text or "").splitlines():
+        if ":" not in line:
+            continue
+        area, rest = line.split(":", 1)
+        area = area.strip()
+        for nb in (n.strip() for n in rest.split(",")):
+            if not area or not nb or nb == area:
+                continue
+            adjacency.setdefault(area, [])
+            if nb not in adjacency[area]:
+                adjacency[area].append(nb)
+            adjacency.setdefault(nb, [])
+            if area not in adjacency[nb]:
+                adjacency[nb].append(area)
+    return adjacency
+
+
+def build_neighbour_index(areas, centroids=None, adjacency=None, k: int = NEIGHBOUR_COUNT, max_km: float = NEIGHBOUR_MAX_KM) -> dict:
+    """
+    {area: [other backlog areas, nearest first]}, built once per backlog.
+    Centroid neighbours are the k closest areas within max_km (equirectangular distance over the
+    area x area matrix; backlogs have tens of areas, so one vectorised pass beats a tree).
+    An area listed in `adjacency` takes those neighbours instead.
+    """
+    areas = [str(a) for a in areas]
+    index = {a: [] for a in areas}
+
+    placed = [a for a in areas if centroids and a in centroids]
+    if len(placed) > 1:
+        lat = np.radians([centroids[a][0] for a in placed])
+        lon = np.radians([centroids[a][1] for a in placed])
+        x = (lon[None, :] - lon[:, None]) * np.cos((lat[None, :] + lat[:, None]) / 2)
+        y = lat[None, :] - lat[:, None]
+        dist = EARTH_RADIUS_KM * np.hypot(x, y)
+        np.fill_diagonal(dist, np.inf)
+        nearest = np.argsort(dist, axis=1, kind="stable")[:, :k]
+        for i, a in enumerate(placed):
+            index[a] = [placed[j] for j in nearest[i] if dist[i, j] <= max_km]
+
+    for a, nbs in (adjacency or {}).items():
+        if a in index:
+            index[a] = [n for n in nbs if n in index and n != a]
+    return index
+
+
+# -----------------------------
+# Territory-to-day assignment (Lookahead mode)
+# -----------------------------
+ASSIGNMENT_MODES = ["Greedy", "Lookahead"]
+URGENCY_WEIGHT = {"Dark Blue": 100, "Light Blue": 10, "Flexible": 1}
+
+
+def day_session_budgets(day_sessions, time_mode, global_times, day_override_times, day_name):
+    """Capacity (minutes) of each enabled session of a day, in AM, PM order."""
+    return [
+        session_capacity_minutes(time_mode, global_times, day_override_times, day_name, sess, day_sessions[day_name][sess]["load"])
+        for sess in ["AM", "PM"]
+        if day_sessions[day_name][sess]["enabled"]
+    ]
+
+
+def assign_day_territories(jobs, plan_days, day_budgets, day_allowed=None, day_focus=None, cluster_keys=None):
+    """
+    Decide every plan day's territory up front instead of day by day.
+    jobs: records in planner priority order; day_budgets: {day: [session minutes]}.
+    Sessions only ever draw from their day's territory, so a territory's set of days is scored
+    exactly by running fill_session over its own jobs (urgency weight 100/10/1 of what gets placed).
+    The (territory x day) total is improved by single-day moves and pairwise swaps, starting from
+    the planner's own day-by-day greedy choice and from a marginal-gain construction; the better
+    result wins, so Lookahead never scores below Greedy. Focus overrides stay fixed, day_allowed
+    is respected, and days that add nothing map to None.
+    """
+    if cluster_keys is None:
+        cluster_keys = {}
+    jobs_by_terr = {}
+    for job in jobs:
+        jobs_by_terr.setdefault(str(job.get("_territory", "Unknown")), []).append(job)
+
+    memo = {}
+
+    def state(terr, days):
+        """(urgency weight placed, jobs left) once territory `terr` has worked `days` (week order)."""
+        key = (terr, days)
+        if key not in memo:
+            if not days:
+                memo[key] = (0, jobs_by_terr.get(terr, []))
+            else:
+                placed, left = state(terr, days[:-1])
+                left = list(left)
+                for budget in day_budgets[days[-1]]:
+                    picked = fill_session(left, terr, budget, cluster_keys=cluster_keys)
+                    placed += sum(URGENCY_WEIGHT.get(j.get("_urgency"), 1) for j in picked)
+                memo[key] = (placed, left)
+        return memo[key]
+
+    def value(terr, days):
+        return state(terr, days)[0]
+
+    def total(assignment):
+        days_of = {}
+        for d in plan_days:
+            if assignment.get(d) is not None:
+                days_of.setdefault(assignment[d], []).append(d)
+        return sum(value(t, tuple(ds)) for t, ds in days_of.items())
+
+    fixed = {}
+    candidates = {}
+    for d in plan_days:
+        allowed_today = set(day_allowed.get(d, [])) if day_allowed is not None else set()
+        focus = (day_focus or {}).get(d, "(auto)")
+        if focus is not None and focus != "(auto)" and (not allowed_today or str(focus) in allowed_today):
+            fixed[d] = str(focus)
+        else:
+            candidates[d] = [t for t in jobs_by_terr if not allowed_today or t in allowed_today]
+    free_days = [d for d in plan_days if d in candidates]
+
+    # Start 1: the planner's day-by-day choice (most urgent weight left, first seen wins ties)
+    by_day = dict(fixed)
+    left = {t: list(js) for t, js in jobs_by_terr.items()}
+    for d in plan_days:
+        if d in candidates:
+            weight_left = {t: sum(URGENCY_WEIGHT.get(j.get("_urgency"), 1) for j in left[t]) for t in candidates[d]}
+            weight_left = {t: w for t, w in weight_left.items() if w > 0}
+            by_day[d] = max(weight_left, key=weight_left.get) if weight_left else None
+        if by_day.get(d) in left:
+            for budget in day_budgets[d]:
+                fill_session(left[by_day[d]], by_day[d], budget, cluster_keys=cluster_keys)
+
+    # Start 2: repeatedly take the (day, territory) with the largest marginal gain
+    by_gain = dict(fixed)
+    open_days = list(free_days)
+    while open_days:
+        base = total(by_gain)
+        best = None
+        for d in open_days:
+            for terr in candidates[d]:
+                g = total({**by_gain, d: terr}) - base
+                if best is None or g > best[0]:
+                    best = (g, d, terr)
+        if best is None or best[0] <= 0:
+            break
+        by_gain[best[1]] = best[2]
+        open_days.remove(best[1])
+
+    best_assignment, best_score = None, None
+    for start in (by_day, by_gain):
+        assignment = {d: start.get(d) for d in plan_days}
+        current = total(assignment)
+        improved = True
+        while improved:
+            improved = False
+            trials = [{d: terr} for d in free_days for terr in candidates[d] if terr != assignment[d]]
+            trials += [
+                {d1: assignment[d2], d2: assignment[d1]}
+                for i, d1 in enumerate(free_days)
+                for d2 in free_days[i + 1:]
+                if assignment[d1] != assignment[d2]
+                and assignment[d2] in candidates[d1] + [None]
+                and assignment[d1] in candidates[d2] + [None]
+            ]
+            for change in trials:
+                trial = {**assignment, **change}
+                score = total(trial)
+                if score > current:
+                    assignment, current, improved = trial, score, True
+                    break
+        if best_score is None or current > best_score:
+            best_assignment, best_score = assignment, current
+    return best_assignment
+
+
+# -----------------------------
+# Per-Area worklists + candidate pre-filter (planning cost follows the week's capacity)
+# -----------------------------
+CANDIDATE_MIN_JOBS = 5000  # smaller backlogs are cheaper to plan in full
+
+
+class AreaWorklist(list):
+    """One Area's unplanned jobs in planner order; jobs put back at the front are stamped in the owner."""
+
+    def __init__(self, owner):
+        super().__init__()
+        self.owner = owner
+
+    def insert(self, index, job):
+        if index == 0:
+            self.owner.put_back[id(job)] = next(self.owner.stamps)
+        super().insert(index, job)
+
+
+class AreaWorklists:
+    """
+    The unplanned jobs split into one worklist per Area, so a session only scans its own Area.
+    Every fill_session predicate names the Area, so filling from its worklist picks exactly what
+    a scan of the whole list would. `unplanned` rebuilds the single list a whole-list run leaves:
+    jobs put back at the front (newest first), then the rest in priority order, merged with the
+    jobs plan_candidate_mask left out. Those are never touched, so they stay frame rows
+    (`tail`: frame, its rows and their priority positions) until `unplanned` builds their records.
+    """
+
+    def __init__(self, jobs, position, tail=None):
+        self.position = position  # {id(job): priority position}
+        self.by_area = {}
+        self.put_back = {}
+        self.stamps = count()
+        for job in jobs:
+            self.area(str(job.get("_territory", "Unknown"))).append(job)
+
+        self.tail = tail
+        self.tail_weight, self.tail_mins = {}, {}
+        if tail is not None:
+            frame, rows, _ = tail
+            keys = frame[["_territory", "_urgency", "_mins"]].take(rows)
+            territories = keys["_territory"].astype(object).map(str).tolist()
+            for terr, urg, m in zip(territories, keys["_urgency"].astype(object).tolist(), keys["_mins"].astype(int).tolist()):
+                self.tail_weight[terr] = self.tail_weight.get(terr, 0) + URGENCY_WEIGHT.get(urg, 1)
+                self.tail_mins[(terr, urg)] = min(m, self.tail_mins.get((terr, urg), m))
+
+    def area(self, terr) -> AreaWorklist:
+        if terr not in self.by_area:
+            self.by_area[terr] = AreaWorklist(self)
+        return self.by_area[terr]
+
+    def place_in_list(self, job) -> tuple:
+        """Where the job sits in the whole list: put-back jobs (newest first) ahead of the rest."""
+        stamp = self.put_back.get(id(job))
+        return (0, -stamp) if stamp is not None else (1, self.position[id(job)])
+
+    def areas_in_list_order(self):
+        """Areas with jobs left, in the order their first job appears in the whole list."""
+        heads = [(self.place_in_list(jobs[0]), terr) for terr, jobs in self.by_area.items() if jobs]
+        return [terr for _, terr in sorted(heads)]
+
+    def weight(self, terr) -> int:
+        """Urgency weight (100/10/1) of the Area's jobs left, left-out jobs included."""
+        jobs = self.by_area.get(terr, ())
+        return sum(URGENCY_WEIGHT.get(j.get("_urgency", "Flexible"), 1) for j in jobs) + self.tail_weight.get(terr, 0)
+
+    def unplanned(self) -> list:
+        left = [(self.place_in_list(j), j) for jobs in self.by_area.values() for j in jobs]
+        if self.tail is not None:
+            frame, rows, positions = self.tail
+            left += [((1, p), j) for p, j in zip(positions.tolist(), frame.take(rows).to_dict(orient="records"))]
+        left.sort(key=lambda kj: kj[0])
+        return [j for _, j in left]
+
+
+def area_horizon_minutes(plan_days, day_sessions, time_mode, global_times, day_override_times, day_focus, day_allowed=None, neighbours=None):
+    """
+    Most minutes a Greedy week can take from each Area: every session it could fill (auto days it
+    is allowed on, days focused on it or on a neighbour it can spill into) at 110% of budget.
+    Returns (minutes any Area gets, {area: extra minutes}).
+    """
+    common, extra = 0, {}
+    for d in plan_days:
+        cap = sum(int(b * 1.10) for b in day_session_budgets(day_sessions, time_mode, global_times, day_override_times, d))
+        allowed_today = set(day_allowed.get(d, [])) if day_allowed is not None else set()
+        focus = day_focus.get(d, "(auto)")
+        if focus is not None and focus != "(auto)" and (not allowed_today or str(focus) in allowed_today):
+            reach = [str(focus)] + [
+                nb for nb in (neighbours or {}).get(str(focus), []) if not allowed_today or nb in allowed_today
+            ]
+        elif allowed_today:
+            reach = allowed_today
+        else:
+            common += cap
+            continue
+        for area in set(reach):
+            extra[area] = extra.get(area, 0) + cap
+    return common, extra
+
+
+def plan_candidate_mask(jobs: pd.DataFrame, order, horizon, pinned=None) -> np.ndarray:
+    """
+    Which jobs (in priority order) a Greedy week can reach. Sessions take an Area's tier in
+    priority (cutoff) order, jumping ahead only within the anchor's cluster, and never take more
+    than the Area's horizon minutes, so a job matters only while the minutes ahead of it fit the
+    horizon: that prefix per (Area, urgency), plus the same prefix per (Area, urgency, cluster)
+    for each cluster a kept job could anchor. Booked and pinned jobs are always kept.
+    jobs: the planner's frame; order: its rows in priority order (None: already in order);
+    horizon: area_horizon_minutes. Reads columns only, so it runs before any records exist.
+    """
+    tag_cols = [c for c in INGEST_TAG_COLS if c in jobs.columns] if pinned else []
+    cols = [c for c in ("_territory", "_urgency", "_mins", "_label", "_geo_key", APPT_COL) if c in jobs.columns]
+    keys = jobs[cols + tag_cols] if order is None else jobs[cols + tag_cols].take(order)
+    keys = keys.reset_index(drop=True)
+
+    terr = keys["_territory"].astype(object).map(str).to_numpy()
+    mins = pd.to_numeric(keys["_mins"], errors="coerce").fillna(15).to_numpy(dtype=float)
+    forced = keys[APPT_COL].notna().to_numpy() if APPT_COL in keys.columns else np.zeros(len(keys), dtype=bool)
+    if pinned:
+        tags = zip(*(keys[c].tolist() for c in tag_cols)) if tag_cols else ((),) * len(keys)
+        is_pinned = (job_key(dict(zip(tag_cols, t))) in pinned for t in tags)
+        forced = forced | np.fromiter(is_pinned, dtype=bool, count=len(keys))
+
+    t_codes, areas = pd.factorize(terr)
+    u_codes, _ = pd.factorize(keys["_urgency"].astype(object).to_numpy(), use_na_sentinel=False)
+    c_codes, _ = pd.factorize(cluster_key_series(keys).to_numpy(), use_na_sentinel=False)
+    common, extra = horizon
+    reach = np.array([common + extra.get(a, 0) for a in areas], dtype=float)[t_codes]
+
+    # Minutes of the tier ahead of each job (booked / pinned jobs never come off a session's budget)
+    own = pd.Series(np.where(forced, 0.0, mins))
+    ahead = own.groupby([t_codes, u_codes]).cumsum().to_numpy() - own.to_numpy()
+    keep = ahead <= reach
+    area_cluster = t_codes.astype(np.int64) * (int(c_codes.max(initial=0)) + 1) + c_codes
+    ahead_in_cluster = own.groupby([t_codes, u_codes, c_codes]).cumsum().to_numpy() - own.to_numpy()
+    keep |= np.isin(area_cluster, area_cluster[keep]) & (ahead_in_cluster <= reach)
+    return keep | forced
+
+
+def build_week_plan(df_in: pd.DataFrame, week_start: date, active_days, day_sessions, time_mode, global_times, day_override_times, day_focus, day_allowed=None, street_col=None, progress=None, cancel=None, prepared=False, assignment="Greedy", pinned=None, neighbours=None):
+    """
+    street_col: mapped street column used for the light geo grouping key.
+    progress: optional callable(dict) with days/sessions done, jobs placed and the live buckets.
+    cancel: optional threading.Event; when set, planning stops with PlanCancelled.
+    prepared: df_in already came from prepare_plan_jobs (it is read, never modified).
+    assignment: "Greedy" picks each auto day's territory as the day comes up; "Lookahead"
+    decides all of them up front with assign_day_territories.
+    pinned: optional {job_key: (day, session)}; those jobs are placed first and the session is
+    filled around them. Pins on days or sessions this plan doesn't run stay in `remaining`.
+    neighbours: optional build_neighbour_index map; once the focus area has no jobs left, a
+    session's spare capacity is filled from its nearest neighbours allowed that day.
+    Booked jobs (APPT_COL) are placed at their appointment first (book_appointments), whatever the
+    day's Area; the session's flexible jobs then fill the budget left and the gaps between them.
+    Sessions fill from per-Area worklists (AreaWorklists); Greedy plans of large backlogs only
+    load the jobs the week can reach (plan_candidate_mask), the rest go back into `remaining` untouched.
+    """
+    if prepared:
+        jobs, order = df_in, None
+    else:
+        jobs = with_plan_keys(df_in, street_col)
+        order = plan_sort_order(jobs)
+
+    keep = None
+    if assignment != "Lookahead" and len(jobs) >= CANDIDATE_MIN_JOBS:
+        horizon = area_horizon_minutes(
+            [wd for wd in WEEKDAYS if active_days.get(wd, False)], day_sessions, time_mode, global_times,
+            day_override_times, day_focus, day_allowed, neighbours,
+        )
+        # Before the records are built, so the mask's temporaries and the records never peak together
+        keep = plan_candidate_mask(jobs, order, horizon, pinned)
+
+    left_out = None
+    if keep is None:
+        # Records straight off the (unsorted) frame, then reordered as a list: no sorted frame copy
+        records = jobs.to_dict(orient="records")
+        remaining = records if order is None else [records[i] for i in order]
+        position = {id(job): p for p, job in enumerate(remaining)}
+    else:
+        # Records for the kept jobs only; the left-out ones stay frame rows until AreaWorklists.unplanned
+        rows = np.arange(len(jobs)) if order is None else order  # frame row at each priority position
+        kept, dropped = np.flatnonzero(keep), np.flatnonzero(~keep)
+        remaining = jobs.take(rows[kept]).to_dict(orient="records")
+        position = dict(zip(map(id, remaining), kept.tolist()))
+        left_out = (jobs, rows[dropped], dropped)
+
+    # -----------------------------
+    # Buckets init
+    # -----------------------------
+    buckets = {}
+    for d in WEEKDAYS:
+        if not active_days.get(d, False):
+            continue
+        buckets[d] = {"AM": [], "PM": []}
+
+    pinned_count = 0
+    if pinned:
+        unpinned = []
+        for job in remaining:
+            loc = pinned.get(job_key(job))
+            if loc is not None and loc[0] in buckets and day_sessions[loc[0]][loc[1]]["enabled"]:
+                held = buckets[loc[0]][loc[1]]
+                held.append(job)
+                job["_planned_day"] = loc[0]
+                job["_planned_date"] = week_start + timedelta(days=WEEKDAYS.index(loc[0]))
+                job["_planned_session"] = loc[1]
+                job["_planned_seq"] = len(held)
+                pinned_count += 1
+            else:
+                unpinned.append(job)
+        remaining[:] = unpinned
+
+    # Booked appointments go on their day's timeline before any territory is filled
+    booked, held_back = {}, []
+    if remaining and APPT_COL in remaining[0]:
+        booked, held_back = book_appointments(
+            remaining, list(buckets), week_start, day_sessions, time_mode, global_times, day_override_times
+        )
+
+    def held_minutes(d, sess):
+        return sum(int(j.get("_mins", 15)) for j in buckets[d][sess])
+
+    def booked_minutes(d, sess):
+        return sum(int(b[2].get("_mins", 15)) for b in booked.get((d, sess), []))
+
+    def place(d, sess, picked):
+        """Number picked jobs into the session after its pinned ones, sequenced around its bookings."""
+        held = buckets[d][sess]
+        bookings = booked.get((d, sess))
+        if bookings:
+            start = time_minutes(session_window(time_mode, global_times, day_override_times, d, sess)[0])
+            picked = sequence_around_bookings(picked, bookings, start + held_minutes(d, sess))
+        for i, job in enumerate(picked, start=len(held) + 1):
+            job["_planned_day"] = d
+            job["_planned_date"] = week_start + timedelta(days=WEEKDAYS.index(d))
+            job["_planned_session"] = sess
+            job["_planned_seq"] = i
+        buckets[d][sess] = held + picked
+        return len(picked)
+
+    # -----------------------------
+    # Territory choice (existing behaviour)
+    # -----------------------------
+    def choose_auto_territory(areas, allowed_terr=None):
+        """Pick the territory with the most urgent weight remaining (Dark > Light > Flexible); first seen wins ties."""
+        score = {}
+        for terr in areas.areas_in_list_order():
+            if allowed_terr is not None and terr not in allowed_terr:
+                continue
+            score[terr] = areas.weight(terr)
+        return max(score.items(), key=lambda kv: kv[1])[0] if score else None
+
+    # -----------------------------
+    # Core scheduling loop
+    # -----------------------------
+    plan_days = [wd for wd in WEEKDAYS if active_days.get(wd, False)]
+    status = {
+        "days_done": 0,
+        "days_total": len(plan_days),
+        "sessions_done": 0,
+        "sessions_total": sum(
+            1 for wd in plan_days for s in ["AM", "PM"] if day_sessions[wd][s]["enabled"]
+        ),
+        "jobs_placed": pinned_count,
+        "buckets": buckets,
+    }
+
+    def report():
+        if progress is not None:
+            progress(dict(status))
+
+    def check_cancel():
+        if cancel is not None and cancel.is_set():
+            raise PlanCancelled()
+
+    cluster_keys = {}
+    lookahead = {}
+    if assignment == "Lookahead":
+        day_budgets = {
+            wd: day_session_budgets(day_sessions, time_mode, global_times, day_override_times, wd) for wd in plan_days
+        }
+        if pinned_count or booked:
+            # Pinned and booked minutes come off the session budgets the territories are scored against
+            for wd in plan_days:
+                enabled = [s for s in ["AM", "PM"] if day_sessions[wd][s]["enabled"]]
+                day_budgets[wd] = [
+                    b - held_minutes(wd, s) - booked_minutes(wd, s) for b, s in zip(day_budgets[wd], enabled)
+                ]
+        lookahead = assign_day_territories(remaining, plan_days, day_budgets, day_allowed, day_focus, cluster_keys)
+
+    areas = AreaWorklists(remaining, position, left_out)
+    report()
+    for d in plan_days:
+        check_cancel()
+        allowed_today = None
+        if day_allowed is not None:
+            allowed_today = set(day_allowed.get(d, []))
+            if not allowed_today:
+                allowed_today = None
+
+        focus = day_focus.get(d, "(auto)")
+        if focus is not None and focus != "(auto)" and allowed_today is not None and str(focus) not in allowed_today:
+            focus = "(auto)"
+        focus_terr = None if (focus is None or focus == "(auto)") else str(focus)
+
+        if focus_terr is None and lookahead.get(d) is not None:
+            planned_terr = lookahead[d]
+            if areas.by_area.get(planned_terr):
+                focus_terr = planned_terr
+
+        if focus_terr is None:
+            focus_terr = choose_auto_territory(areas, allowed_today)
+
+        if focus_terr is None:
+            # Nothing left to fill from, but the day's bookings still stand
+            for sess in ["AM", "PM"]:
+                if day_sessions[d][sess]["enabled"] and (d, sess) in booked:
+                    status["jobs_placed"] += place(d, sess, [])
+            status["days_done"] += 1
+            report()
+            continue
+
+        for sess in ["AM", "PM"]:
+            if not day_sessions[d][sess]["enabled"]:
+                continue
+
+            load = day_sessions[d][sess]["load"]
+            budget = session_capacity_minutes(time_mode, global_times, day_override_times, d, sess, load)
+
+            taken = held_minutes(d, sess) + booked_minutes(d, sess)
+            picked = fill_session(areas.area(focus_terr), focus_terr, budget, check_cancel, cluster_keys, taken, areas.tail_mins)
+
+            if neighbours and not areas.by_area.get(focus_terr):
+                used = taken + sum(int(j.get("_mins", 15)) for j in picked)
+                for nb in neighbours.get(focus_terr, []):
+                    if used >= budget:
+                        break
+                    if allowed_today is not None and nb not in allowed_today:
+                        continue
+                    spill = fill_session(areas.area(nb), nb, budget, check_cancel, cluster_keys, used, areas.tail_mins)
+                    picked += spill
+                    used += sum(int(j.get("_mins", 15)) for j in spill)
+
+            status["sessions_done"] += 1
+            status["jobs_placed"] += place(d, sess, picked)
+            report()
+
+        status["days_done"] += 1
+        report()
+
+    remaining = areas.unplanned()
+    remaining.extend(held_back)
+    plan_df = plan_rows_frame(buckets)
+    return buckets, plan_df, remaining
+
+
+def compare_assignment_modes(df_work: pd.DataFrame, week_start: date, active_days, day_sessions, time_mode, global_times, day_override_times, day_focus, day_allowed=None, street_col=None, pinned=None, neighbours=None) -> pd.DataFrame:
+    """Plan the week once per ASSIGNMENT_MODES and report urgent jobs cleared, plus Lookahead minus Greedy."""
+    jobs = prepare_plan_jobs(df_work, street_col)
+    rows = []
+    for mode in ASSIGNMENT_MODES:
+        buckets, _, remaining = build_week_plan(
+            jobs, week_start, active_days, day_sessions, time_mode, global_times, day_override_times, day_focus,
+            day_allowed, prepared=True, assignment=mode, pinned=pinned, neighbours=neighbours,
+        )
+        planned = [job for sessions in buckets.values() for items in sessions.values() for job in items]
+        rows.append({
+            "Assignment": mode,
+            "Dark Blue cleared": sum(1 for j in planned if j.get("_urgency") == "Dark Blue"),
+            "Light Blue cleared": sum(1 for j in planned if j.get("_urgency") == "Light Blue"),
+            "Jobs planned": len(planned),
+            "Minutes used": int(sum(int(j.get("_mins", 15)) for j in planned)),
+        })
+    out = pd.DataFrame(rows)
+    delta = (out.iloc[1, 1:] - out.iloc[0, 1:]).to_dict()
+    return pd.concat([out, pd.DataFrame([{"Assignment": "Lookahead − Greedy", **delta}])], ignore_index=True)
+
+
+# -----------------------------
+# Manual edits on a finished plan (review board)
+# -----------------------------
+class PlanBoard:
+    """
+    Move, swap and pin jobs on a finished plan, in place on its buckets and remaining list.
+    An index from job_key to (day, session) plus running per-session minutes, past-cutoff
+    counts and the Dark Blue left unplanned mean an edit touches only the sessions involved.
+    Unplanned jobs carry stamps that ascend along `remaining` (jobs sent back to the front take
+    stamps below its head), so finding one is a bisect rather than a scan of the whole list.
+    `pinned` ({job_key: (day, session)}) is shared with the caller and fed to the next replan.
+    """
+
+    def __init__(self, buckets, remaining, week_start: date, day_sessions, time_mode, global_times, day_override_times, pinned=None):
+        self.buckets = buckets
+        self.remaining = remaining
+        self.week_start = week_start
+        self.pinned = pinned if pinned is not None else {}
+        self.jobs = {}
+        self.where = {}
+        self.capacity = {}
+        self.minutes = {}
+        self.late = {}
+        self.off_appointment = {}
+        self.dark_unplanned = 0
+        self.stamp = {}  # {job_key: stamp} of the unplanned jobs
+        self.stamps = []  # their stamps in `remaining` order (ascending)
+
+        for d, sessions in buckets.items():
+            for sess, items in sessions.items():
+                if not day_sessions[d][sess]["enabled"]:
+                    continue
+                loc = (d, sess)
+                self.capacity[loc] = session_capacity_minutes(
+                    time_mode, global_times, day_override_times, d, sess, day_sessions[d][sess]["load"]
+                )
+                self.minutes[loc] = 0
+                self.late[loc] = 0
+                self.off_appointment[loc] = 0
+                for job in items:
+                    self._track(job, loc)
+        for job in remaining:
+            self._track(job, None)
+        self._stamp_front(remaining)
+
+        # Pins the plan couldn't honour (day or session not planned) are released
+        for key, loc in list(self.pinned.items()):
+            if self.where.get(key) != loc:
+                del self.pinned[key]
+
+    @property
+    def locations(self):
+        """Every enabled (day, session) of the plan, in week order."""
+        return list(self.capacity)
+
+    def session_date(self, day: str) -> date:
+        return self.week_start + timedelta(days=WEEKDAYS.index(day))
+
+    def _is_late(self, job, loc) -> bool:
+        """Placed after a cutoff it could still have made this week (already-overdue jobs don't count)."""
+        cutoff = as_date(job.get("_cutoff_date"))
+        return cutoff is not None and self.week_start <= cutoff < self.session_date(loc[0])
+
+    def _is_off_appointment(self, job, loc) -> bool:
+        """Booked for another day of this week than the one it sits on."""
+        start = job.get(APPT_COL)
+        if start is None or pd.isna(start):
+            return False
+        booked_day = start.date()
+        return self.week_start <= booked_day < self.week_start + timedelta(days=7) and booked_day != self.session_date(loc[0])
+
+    def _count(self, job, loc, sign: int):
+        if loc is None:
+            self.dark_unplanned += sign * (job.get("_urgency") == "Dark Blue")
+        else:
+            self.minutes[loc] += sign * int(job.get("_mins", 15))
+            self.late[loc] += sign * self._is_late(job, loc)
+            self.off_appointment[loc] += sign * self._is_off_appointment(job, loc)
+
+    def _track(self, job, loc):
+        key = job_key(job)
+        self.jobs[key] = job
+        self.where[key] = loc
+        self._count(job, loc, +1)
+
+    def _items(self, loc):
+        return self.remaining if loc is None else self.buckets[loc[0]][loc[1]]
+
+    def _position(self, key) -> int:
+        loc = self.where[key]
+        if loc is None:
+            return bisect_left(self.stamps, self.stamp[key])
+        job = self.jobs[key]
+        return next(i for i, j in enumerate(self._items(loc)) if j is job)
+
+    def _stamp_front(self, jobs):
+        """Stamp jobs just put at the front of `remaining`, in their order there."""
+        head = self.stamps[0] if self.stamps else 0
+        new = list(range(head - len(jobs), head))
+        for job, stamp in zip(jobs, new):
+            self.stamp[job_key(job)] = stamp
+        self.stamps[:0] = new
+
+    def _resequence(self, loc):
+        if loc is not None:
+            for i, job in enumerate(self.buckets[loc[0]][loc[1]], start=1):
+                job["_planned_seq"] = i
+
+    def _settle(self, key, loc):
+        """Record a job's new location: planned columns, index, and a pin that follows it."""
+        job = self.jobs[key]
+        self.where[key] = loc
+        if loc is None:
+            for c in PLANNED_COLS:
+                job.pop(c, None)
+            self.pinned.pop(key, None)
+        else:
+            job["_planned_day"] = loc[0]
+            job["_planned_date"] = self.session_date(loc[0])
+            job["_planned_session"] = loc[1]
+            if key in self.pinned:
+                self.pinned[key] = loc
+
+    def move(self, key, loc):
+        """Move a job to the end of session loc ((day, session)), or to the front of `remaining` when loc is None."""
+        src = self.where[key]
+        if src == loc:
+            return
+        job = self.jobs[key]
+        pos = self._position(key)
+        self._items(src).pop(pos)
+        if src is None:
+            self.stamps.pop(pos)
+            del self.stamp[key]
+        self._count(job, src, -1)
+        self._items(loc).insert(len(self._items(loc)) if loc is not None else 0, job)
+        if loc is None:
+            self._stamp_front([job])
+        self._count(job, loc, +1)
+        self._settle(key, loc)
+        self._resequence(src)
+        self._resequence(loc)
+
+    def swap(self, key_a, key_b):
+        """Exchange two jobs' places (either may be unplanned)."""
+        loc_a, loc_b = self.where[key_a], self.where[key_b]
+        job_a, job_b = self.jobs[key_a], self.jobs[key_b]
+        pos_a, pos_b = self._position(key_a), self._position(key_b)
+        self._count(job_a, loc_a, -1)
+        self._count(job_b, loc_b, -1)
+        self._items(loc_a)[pos_a] = job_b
+        self._items(loc_b)[pos_b] = job_a
+        # Each job takes over the other's place, stamp included
+        stamp_a, stamp_b = self.stamp.pop(key_a, None), self.stamp.pop(key_b, None)
+        if stamp_a is not None:
+            self.stamp[key_b] = stamp_a
+        if stamp_b is not None:
+            self.stamp[key_a] = stamp_b
+        self._count(job_b, loc_a, +1)
+        self._count(job_a, loc_b, +1)
+        self._settle(key_a, loc_b)
+        self._settle(key_b, loc_a)
+        self._resequence(loc_a)
+        self._resequence(loc_b)
+
+    def pin(self, key):
+        """Keep a planned job in its session across replans."""
+        if self.where[key] is not None:
+            self.pinned[key] = self.where[key]
+
+    def unpin(self, key):
+        self.pinned.pop(key, None)
+
+    def reset_day(self, day: str):
+        """Send a day's unpinned jobs back to the front of `remaining` (pinned jobs stay)."""
+        for sess in ["AM", "PM"]:
+            loc = (day, sess)
+            if loc not in self.capacity:
+                continue
+            items = self._items(loc)
+            freed = [j for j in items if job_key(j) not in self.pinned]
+            items[:] = [j for j in items if job_key(j) in self.pinned]
+            for job in freed:
+                self._count(job, loc, -1)
+                self._count(job, None, +1)
+                self._settle(job_key(job), None)
+            self.remaining[:0] = freed
+            self._stamp_front(freed)
+            self._resequence(loc)
+
+    def warnings(self, loc):
+        """Capacity, urgency and appointment warnings for one session."""
+        out = []
+        used, cap = self.minutes[loc], self.capacity[loc]
+        if used > int(cap * 1.10):
+            out.append(f"Over capacity: {used} of {cap} mins")
+        if self.late[loc]:
+            out.append(f"{self.late[loc]} job(s) placed after their cutoff")
+        if self.off_appointment[loc]:
+            out.append(f"{self.off_appointment[loc]} booked job(s) away from their appointment day")
+        return out
+
+
+# -----------------------------
+# Plan quality metrics (vectorised over plan_df / remaining)
+# -----------------------------
+METRICS_REMAINING_COLS = ["_territory", "_urgency", "_cutoff_date", "_mins"]
+
+
+def session_capacity_frame(day_sessions, time_mode, global_times, day_override_times) -> pd.DataFrame:
+    rows = []
+    for d in WEEKDAYS:
+        cfg = day_sessions.get(d)
+        if not cfg:
+            continue
+        for sess in ["AM", "PM"]:
+            if cfg[sess]["enabled"]:
+                rows.append({
+                    "Day": d,
+                    "Session": sess,
+                    "Capacity": session_capacity_minutes(time_mode, global_times, day_override_times, d, sess, cfg[sess]["load"]),
+                })
+    return pd.DataFrame(rows, columns=["Day", "Session", "Capacity"])
+
+
+def plan_quality_metrics(plan_df: pd.DataFrame, remaining, week_start: date, day_sessions, time_mode, global_times, day_override_times):
+    """
+    Returns {table name: DataFrame}: Summary, Session utilisation, Unplanned urgent, Cutoff at risk,
+    Territory switches and Cluster batches.
+    """
+    cap = session_capacity_frame(day_sessions, time_mode, global_times, day_override_times)
+
+    plan = plan_df if plan_df is not None and not plan_df.empty else pd.DataFrame(
+        columns=["_planned_day", "_planned_date", "_planned_session", "_planned_seq", "_territory", "_urgency", "_mins", "_label", "_geo_key"]
+    )
+    rem = pd.DataFrame.from_records(remaining or [], columns=METRICS_REMAINING_COLS)
+
+    # Session utilisation
+    used = (
+        plan.groupby(["_planned_day", "_planned_session"])["_mins"]
+        .agg(Jobs="size", Minutes="sum")
+        .reset_index()
+        .rename(columns={"_planned_day": "Day", "_planned_session": "Session"})
+    )
+    util = cap.merge(used, on=["Day", "Session"], how="left")
+    util[["Jobs", "Minutes"]] = util[["Jobs", "Minutes"]].fillna(0).astype(int)
+    util["Utilisation %"] = (100 * util["Minutes"] / util["Capacity"].where(util["Capacity"] > 0)).round(1)
+
+    # Dark / Light Blue left unplanned, per area
+    urgent_rem = rem[rem["_urgency"].isin(["Dark Blue", "Light Blue"])]
+    unplanned = (
+        urgent_rem.groupby(["_territory", "_urgency"]).size()
+        .unstack(fill_value=0)
+        .reindex(columns=["Dark Blue", "Light Blue"], fill_value=0)
+        .reset_index()
+        .rename(columns={"_territory": "Area"})
+    )
+    unplanned.columns.name = None
+    unplanned = unplanned.sort_values(by=["Dark Blue", "Light Blue"], ascending=False, kind="mergesort")
+
+    # Cutoff dates falling (or already fallen) inside this week, still unplanned
+    week_end = pd.Timestamp(week_start + timedelta(days=6))
+    rem_cutoff = pd.to_datetime(rem["_cutoff_date"], errors="coerce")
+    risk_mask = rem_cutoff.notna() & (rem_cutoff <= week_end)
+    at_risk = (
+        pd.DataFrame({
+            "Area": rem["_territory"][risk_mask],
+            "Cutoff": rem_cutoff[risk_mask].dt.date,
+            "Overdue": (rem_cutoff[risk_mask] < pd.Timestamp(week_start)),
+        })
+        .groupby(["Area", "Cutoff", "Overdue"]).size().rename("Jobs")
+        .reset_index()
+        .sort_values(by=["Cutoff", "Jobs"], ascending=[True, False], kind="mergesort")
+    )
+
+    # Territory switches between consecutive stops, per day
+    ordered = plan.assign(
+        _sess_sort=plan["_planned_session"].map({"AM": 0, "PM": 1}),
+    ).sort_values(by=["_planned_date", "_sess_sort", "_planned_seq"], kind="mergesort")
+    terr = ordered["_territory"].astype(str)
+    day = ordered["_planned_day"]
+    switched = (terr != terr.groupby(day).shift()) & day.duplicated()
+    switches = (
+        pd.DataFrame({"Day": day, "Area": terr, "Switch": switched})
+        .groupby("Day", sort=False)
+        .agg(Areas=("Area", "nunique"), Switches=("Switch", "sum"))
+        .reset_index()
+    )
+    switches["Switches"] = switches["Switches"].astype(int)
+
+    # Cluster batch sizes: runs of consecutive stops sharing a cluster key within a session
+    ck = cluster_key_series(ordered) if len(ordered) else pd.Series(dtype=object)
+    sess_id = ordered["_planned_day"].astype(str) + "|" + ordered["_planned_session"].astype(str)
+    new_run = (ck != ck.shift()) | (sess_id != sess_id.shift())
+    run_sizes = new_run.cumsum().value_counts()
+    batches = (
+        run_sizes.value_counts().rename_axis("Batch size").rename("Batches").reset_index()
+        .sort_values(by="Batch size", kind="mergesort")
+    )
+    batches["Jobs"] = batches["Batch size"] * batches["Batches"]
+
+    total_cap = int(util["Capacity"].sum())
+    total_used = int(util["Minutes"].sum())
+    summary = pd.DataFrame([{
+        "Jobs planned": int(len(plan)),
+        "Minutes used": total_used,
+        "Capacity minutes": total_cap,
+        "Utilisation %": round(100 * total_used / total_cap, 1) if total_cap else None,
+        "Dark Blue unplanned": int((rem["_urgency"] == "Dark Blue").sum()),
+        "Light Blue unplanned": int((rem["_urgency"] == "Light Blue").sum()),
+        "Cutoff at risk": int(risk_mask.sum()),
+        "Territory switches": int(switches["Switches"].sum()),
+        "Avg cluster batch": round(float(run_sizes.mean()), 2) if len(run_sizes) else None,
+    }])
+
+    return {
+        "Summary": summary,
+        "Session utilisation": util,
+        "Unplanned urgent": unplanned.reset_index(drop=True),
+        "Cutoff at risk": at_risk.reset_index(drop=True),
+        "Territory switches": switches,
+        "Cluster batches": batches.reset_index(drop=True),
+    }
+
+
+# -----------------------------
+# Background planning (worker thread, cancellable)
+# -----------------------------
+class BackgroundPlan:
+    """
+    Runs build_week_plan on a daemon thread so the UI stays responsive.
+    `progress` holds the latest report (including live buckets for partial viewing);
+    `result` is (buckets, plan_df, remaining) once status == "done".
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
+        self.progress = {"days_done": 0, "days_total": 0, "sessions_done": 0, "sessions_total": 0, "jobs_placed": 0, "buckets": {}}
+        self.status = "pending"
+        self.result = None
+        self.error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _on_progress(self, report):
+        self.progress = report
+
+    def _run(self):
+        self.status = "running"
+        try:
+            self.result = build_week_plan(*self.args, progress=self._on_progress, cancel=self.cancel_event, **self.kwargs)
+            self.status = "done"
+        except PlanCancelled:
+            self.status = "cancelled"
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "failed")
+
+
+# -----------------------------
+# Plan cache (memoised plans) + speculative pre-planning of adjacent weeks
+# -----------------------------
+PLAN_CACHE_ENTRIES = 8
+PRE_PLAN_WEEK_OFFSETS = (7, -7)  # next week first: flipping forward is the common case
+PRE_PLAN_POLL_SECONDS = 0.2
+PRE_PLAN_NICENESS = 10
+
+
+def canonical_settings(value):
+    """Nested settings -> hashable tuples with dict / set members sorted, so equal settings repr equally."""
+    if isinstance(value, dict):
+        return tuple(sorted((repr(k), canonical_settings(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(v) for v in value))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical_settings(v) for v in value)
+    return repr(value)
+
+
+def settings_fingerprint(settings: dict) -> str:
+    """Short stable digest of everything the planner reads besides the backlog and the week."""
+    return hashlib.sha256(repr(canonical_settings(settings)).encode("utf-8")).hexdigest()[:16]
+
+
+WEEK_BAND_COLS = ["_urgency", "_urg_order", DUP_KEEP_COL]  # rewritten per week by reband_work_frame
+
+
+def work_frame_fingerprint(df_work: pd.DataFrame) -> str:
+    """
+    Short digest of a working frame's content (row hashes, column names and dtypes). The week bands are
+    left out, so every week of one backlog shares a fingerprint and the week goes in the cache key.
+    """
+    cols = [c for c in df_work.columns if c not in WEEK_BAND_COLS]
+    digest = hashlib.sha256(repr([(str(c), df_work[c].dtype.name) for c in cols]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df_work[cols], index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def plan_cache_key(scope, week_start: date):
+    """scope is (work frame fingerprint, settings fingerprint); None means the plan can't be cached."""
+    return None if scope is None else (scope[0], week_start, scope[1])
+
+
+def copy_plan_result(result):
+    """(buckets, plan_df, remaining) with fresh lists and job dicts: the review board edits them in place."""
+    buckets, plan_df, remaining = result
+    buckets = {d: {sess: [dict(j) for j in items] for sess, items in sessions.items()} for d, sessions in buckets.items()}
+    return buckets, plan_df, [dict(j) for j in remaining]
+
+
+class PlanCache:
+    """
+    Bounded LRU of finished plans keyed by (work frame fingerprint, week_start, settings fingerprint).
+    The planner is deterministic, so a hit is the plan PLAN would produce. Plans under other
+    settings stay until evicted: changing a setting and back finds its plan again.
+    Thread-safe, since PrePlanner fills it from its worker thread.
+    """
+
+    def __init__(self, max_entries: int = PLAN_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._plans.get(key)
+            if result is None:
+                return None
+            self._plans.move_to_end(key)
+        return copy_plan_result(result)
+
+    def put(self, key, result):
+        if key is None:
+            return
+        with self._lock:
+            self._plans[key] = result
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._plans
+
+    def __len__(self):
+        with self._lock:
+            return len(self._plans)
+
+
+_PRE_PLAN_FRAME = None
+
+
+def _init_pre_plan_worker(df_work):
+    global _PRE_PLAN_FRAME
+    _PRE_PLAN_FRAME = df_work
+    if hasattr(os, "nice"):
+        os.nice(PRE_PLAN_NICENESS)  # speculative work: reruns get the CPU first
+
+
+def _pre_plan_week(week_start, args, kwargs):
+    return build_week_plan(reband_work_frame(_PRE_PLAN_FRAME, week_start), week_start, *args, **kwargs)
+
+
+class PrePlanner(BackgroundPlan):
+    """
+    Plans other weeks with one set of settings and stores each result in a PlanCache.
+    Planning runs in a single low-priority worker process (the working frame is sent once and
+    re-banded there per week), so it doesn't compete with reruns for the GIL; the thread only waits.
+    args / kwargs are build_week_plan's, minus df and week. Weeks already cached are skipped.
+    """
+
+    def __init__(self, cache: PlanCache, scope, weeks, df_work, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+        self.scope = scope
+        self.weeks = list(weeks)
+        self.df_work = df_work
+        self.planned = []
+
+    def _run(self):
+        self.status = "running"
+        pool = ProcessPoolExecutor(max_workers=1, initializer=_init_pre_plan_worker, initargs=(self.df_work,))
+        try:
+            for week in self.weeks:
+                key = plan_cache_key(self.scope, week)
+                if key in self.cache:
+                    continue
+                future = pool.submit(_pre_plan_week, week, self.args, self.kwargs)
+                while not self.cancel_event.is_set():
+                    try:
+                        result = future.result(timeout=PRE_PLAN_POLL_SECONDS)
+                        break
+                    except FuturesTimeout:
+                        continue
+                else:
+                    self.status = "cancelled"
+                    return
+                self.cache.put(key, result)
+                self.planned.append(week)
+            self.status = "done"
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# -----------------------------
+# What-if scenario sweep (process pool, shared read-only backlog)
+# -----------------------------
+SWEEP_LOADS_AS_SET = "As set"
+
+_SWEEP_JOBS = None
+
+
+def build_scenario_grid(active_days, day_sessions, day_override_times, load_modes, extra_days=(), try_global_times=False):
+    """
+    Cartesian grid of planner configurations:
+    load modes (applied to every session, or SWEEP_LOADS_AS_SET) x day sets (current days plus every
+    combination of extra_days) x times (per-day overrides as set, optionally global times only).
+    """
+    base_days = [d for d in WEEKDAYS if active_days.get(d, False)]
+    day_sets = []
+    for k in range(len(extra_days) + 1):
+        for combo in combinations(extra_days, k):
+            day_sets.append([d for d in WEEKDAYS if d in base_days or d in combo])
+
+    time_sets = [("As set", day_override_times)]
+    if try_global_times and day_override_times:
+        time_sets.append(("Global only", {}))
+
+    scenarios = []
+    for load in load_modes:
+        for days in day_sets:
+            for times_label, overrides in time_sets:
+                sessions = {}
+                for d in days:
+                    cfg = day_sessions.get(d, {})
+                    sessions[d] = {}
+                    for sess in ["AM", "PM"]:
+                        cur = cfg.get(sess, {"enabled": True, "load": "Normal"})
+                        sessions[d][sess] = {
+                            "enabled": cur.get("enabled", True),
+                            "load": cur.get("load", "Normal") if load == SWEEP_LOADS_AS_SET else load,
+                        }
+                scenarios.append({
+                    "Load": load,
+                    "Days": " ".join(d[:3] for d in days),
+                    "Times": times_label,
+                    "active_days": {d: d in days for d in WEEKDAYS},
+                    "day_sessions": sessions,
+                    "day_override_times": overrides,
+                })
+    return scenarios
+
+
+def summarise_plan(buckets, remaining, day_sessions, time_mode, global_times, day_override_times):
+    planned = [job for sessions in buckets.values() for items in sessions.values() for job in items]
+    capacity = sum(
+        session_capacity_minutes(time_mode, global_times, day_override_times, d, sess, cfg[sess]["load"])
+        for d, cfg in day_sessions.items()
+        for sess in ["AM", "PM"]
+        if cfg[sess]["enabled"]
+    )
+    dark_planned = sum(1 for j in planned if j.get("_urgency") == "Dark Blue")
+    dark_left = sum(1 for j in remaining if j.get("_urgency") == "Dark Blue")
+    light_left = sum(1 for j in remaining if j.get("_urgency") == "Light Blue")
+    return {
+        "Dark Blue cleared": dark_planned,
+        "Dark Blue total": dark_planned + dark_left,
+        "Overflow (Dark + Light left)": dark_left + light_left,
+        "Jobs planned": len(planned),
+        "Minutes used": int(sum(int(j.get("_mins", 15)) for j in planned)),
+        "Capacity minutes": int(capacity),
+    }
+
+
+def _init_sweep_worker(df_work, street_col):
+    global _SWEEP_JOBS
+    _SWEEP_JOBS = prepare_plan_jobs(df_work, street_col)
+
+
+def _run_scenario(scenario, week_start, time_mode, global_times, day_focus, day_allowed, assignment="Greedy", pinned=None, neighbours=None):
+    buckets, _, remaining = build_week_plan(
+        _SWEEP_JOBS, week_start, scenario["active_days"], scenario["day_sessions"], time_mode, global_times,
+        scenario["day_override_times"], day_focus, day_allowed, prepared=True, assignment=assignment,
+        pinned=pinned, neighbours=neighbours,
+    )
+    row = {"Load": scenario["Load"], "Days": scenario["Days"], "Times": scenario["Times"]}
+    row.update(summarise_plan(
+        buckets, remaining, scenario["day_sessions"], time_mode, global_times, scenario["day_override_times"]
+    ))
+    return row
+
+
+def run_scenario_sweep(df_work, scenarios, week_start, time_mode, global_times, day_focus, day_allowed=None, street_col=None, max_workers=None, assignment="Greedy", pinned=None, neighbours=None) -> pd.DataFrame:
+    """
+    Plan every scenario in a process pool. Each worker prepares the (read-only) backlog once
+    in its initializer, so only the small scenario configs and summary rows cross processes.
+    """
+    if not scenarios:
+        return pd.DataFrame()
+
+    run_one = partial(
+        _run_scenario,
+        week_start=week_start,
+        time_mode=time_mode,
+        global_times=global_times,
+        day_focus=day_focus,
+        day_allowed=day_allowed,
+        assignment=assignment,
+        pinned=pinned,
+        neighbours=neighbours,
+    )
+    workers = max_workers or min(len(scenarios), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker, initargs=(df_work, street_col)) as pool:
+        rows = list(pool.map(run_one, scenarios))
+
+    out = pd.DataFrame(rows)
+    out["Utilisation %"] = (100 * out["Minutes used"] / out["Capacity minutes"].where(out["Capacity minutes"] > 0)).round(1)
+    return out.sort_values(
+        by=["Dark Blue cleared", "Overflow (Dark + Light left)", "Capacity minutes"],
+        ascending=[False, True, True],
+        kind="mergesort",
+    ).reset_index(drop=True)
+
+
+# -----------------------------
+# Backlog clearance forecast (weeks ahead at current capacity)
+# -----------------------------
+FORECAST_WEEKS = 52
+FORECAST_NO_CUTOFF = 1 << 30  # day number standing in for a missing cutoff: never Dark Blue, never overdue
+_FORECAST_KEY_SPAN = 1 << 32  # (Area code, day) packed into one sortable int64
+
+
+def forecast_day_numbers(values) -> np.ndarray:
+    """datetime64 Series -> int64 days since 1970-01-01, FORECAST_NO_CUTOFF where NaT."""
+    days = to_datetime_days(values).to_numpy().astype("datetime64[D]")
+    out = days.astype(np.int64)
+    out[np.isnat(days)] = FORECAST_NO_CUTOFF
+    return np.clip(out, -FORECAST_NO_CUTOFF, FORECAST_NO_CUTOFF)
+
+
+def capacity_forecast_weeks(df_work: pd.DataFrame, week_start: date, weeks: int, active_days, day_sessions, time_mode, global_times, day_override_times, day_allowed=None, neighbours=None):
+    """
+    Capacity-only stand-in for build_week_plan run `weeks` weeks in a row (every day on auto focus).
+    Within an Area the planner's priority order is cutoff order whatever the week's bands, so each Area
+    is one queue sorted by cutoff: a session takes the longest queue prefix fitting 110% of its budget,
+    as fill_session stops at the first job that doesn't fit, and auto days pick the Area with the most
+    urgent weight left (100/10/1, banded per week). Cluster batching, pins and bookings aren't modelled.
+    Returns (areas, weekly rows, jobs per Area, Dark Blue per Area at week_start).
+    """
+    jobs = df_work[df_work[DUP_KEEP_COL].to_numpy()] if DUP_KEEP_COL in df_work.columns else df_work
+    codes, uniques = pd.factorize(jobs["_territory"].astype(object).map(str), sort=True)
+    areas = [str(a) for a in uniques]
+    cut = forecast_day_numbers(jobs["_cutoff_date"])
+    # Monday of the cutoff week (1970-01-01 was a Thursday)
+    last_week = np.where(cut == FORECAST_NO_CUTOFF, FORECAST_NO_CUTOFF, cut - (cut + 3) % 7)
+    mins = jobs["_mins"].to_numpy().astype(np.int64)
+
+    order = np.lexsort((mins, cut, codes))
+    codes, cut, last_week, mins = codes[order], cut[order], last_week[order], mins[order]
+    cum = np.concatenate(([0], np.cumsum(mins)))
+    span = codes.astype(np.int64) * _FORECAST_KEY_SPAN + FORECAST_NO_CUTOFF
+    cut_key, band_key = span + cut, span + last_week
+
+    area_codes = np.arange(len(areas), dtype=np.int64)
+    end = np.searchsorted(codes, area_codes, side="right")
+    ptr = np.searchsorted(codes, area_codes, side="left")
+    total = end - ptr
+
+    def left_before(keys, day, side="right"):
+        """Per Area: jobs still queued whose key day is <= day ("right") or < day ("left")."""
+        hit = np.searchsorted(keys, area_codes * _FORECAST_KEY_SPAN + FORECAST_NO_CUTOFF + day, side=side)
+        return np.maximum(hit - ptr, 0)
+
+    def take(area, cap, used):
+        """Advance an Area's queue by the prefix fitting cap - used minutes; returns minutes used after."""
+        stop = np.searchsorted(cum, cum[ptr[area]] + cap - used, side="right") - 1
+        stop = min(max(int(stop), int(ptr[area])), int(end[area]))
+        used += int(cum[stop] - cum[ptr[area]])
+        ptr[area] = stop
+        return used
+
+    code_of = {a: i for i, a in enumerate(areas)}
+    plan_days = [d for d in WEEKDAYS if active_days.get(d, False)]
+    budgets = {d: day_session_budgets(day_sessions, time_mode, global_times, day_override_times, d) for d in plan_days}
+    allowed = {}
+    for d in plan_days:
+        names = (day_allowed or {}).get(d)
+        allowed[d] = np.isin(area_codes, [code_of[a] for a in names if a in code_of]) if names else None
+
+    first_day = (pd.Timestamp(week_start) - pd.Timestamp(0)).days
+    dark_now = left_before(band_key, first_day)
+    rows = []
+    for w in range(weeks):
+        day0 = first_day + 7 * w
+        before = ptr.copy()
+        for d in plan_days:
+            dark = left_before(band_key, day0)
+            urgent = left_before(band_key, day0 + 14)
+            left = end - ptr
+            score = 100 * dark + 10 * (urgent - dark) + (left - urgent)
+            pick = left > 0 if allowed[d] is None else (left > 0) & allowed[d]
+            cand = np.flatnonzero(pick)
+            if not len(cand):
+                continue
+            # Ties go to the Area whose next job comes first in priority order
+            head = cut[np.minimum(ptr[cand], len(cut) - 1)]
+            area = int(cand[np.lexsort((cand, head, -score[cand]))[0]])
+
+            for budget in budgets[d]:
+                used = take(area, int(budget * 1.10), 0)
+                if neighbours and ptr[area] == end[area]:
+                    for nb in neighbours.get(areas[area], []):
+                        if used >= budget:
+                            break
+                        nb_code = code_of.get(nb)
+                        if nb_code is None or (allowed[d] is not None and not allowed[d][nb_code]):
+                            continue
+                        used = take(nb_code, int(budget * 1.10), used)
+
+        next_day = day0 + 7
+        rows.append((
+            week_start + timedelta(days=7 * w),
+            ptr - before,
+            end - ptr,
+            left_before(band_key, next_day),
+            left_before(cut_key, next_day, side="left"),
+        ))
+    return areas, rows, total, dark_now
+
+
+def planner_forecast_weeks(df_work: pd.DataFrame, week_start: date, weeks: int, active_days, day_sessions, time_mode, global_times, day_override_times, day_allowed=None, neighbours=None, street_col=None, status_col=None):
+    """capacity_forecast_weeks with the real planner: build_week_plan every week, unplanned jobs rolled forward."""
+    frame = reband_work_frame(df_work, week_start)
+    kept = frame[frame[DUP_KEEP_COL].to_numpy()] if DUP_KEEP_COL in frame.columns else frame
+    territory = kept["_territory"].astype(object).map(str)
+    areas = sorted(territory.unique())
+    total = territory.value_counts().reindex(areas, fill_value=0).to_numpy()
+    dark_now = territory[(kept["_urgency"] == "Dark Blue").to_numpy()].value_counts().reindex(areas, fill_value=0).to_numpy()
+
+    def per_area(series):
+        return series.astype(object).map(str).value_counts().reindex(areas, fill_value=0).to_numpy()
+
+    rows = []
+    for w in range(weeks):
+        ws = week_start + timedelta(days=7 * w)
+        next_ws = ws + timedelta(days=7)
+        if frame.empty:
+            planned = np.zeros(len(areas), dtype=np.int64)
+        else:
+            _, plan_df, remaining = build_week_plan(
+                frame, ws, active_days, day_sessions, time_mode, global_times, day_override_times, {}, day_allowed,
+                street_col=street_col, neighbours=neighbours,
+            )
+            planned = per_area(plan_df["_territory"]) if not plan_df.empty else np.zeros(len(areas), dtype=np.int64)
+            frame = roll_forward_frame(remaining, next_ws, street_col, status_col)
+        if frame.empty:
+            zeros = np.zeros(len(areas), dtype=np.int64)
+            rows.append((ws, planned, zeros, zeros, zeros))
+            continue
+        overdue = (frame["_cutoff_date"] < pd.Timestamp(next_ws)).to_numpy()
+        rows.append((
+            ws,
+            planned,
+            per_area(frame["_territory"]),
+            per_area(frame["_territory"][(frame["_urgency"] == "Dark Blue").to_numpy()]),
+            per_area(frame["_territory"][overdue]),
+        ))
+    return areas, rows, total, dark_now
+
+
+def forecast_clearance(df_work: pd.DataFrame, week_start: date, weeks: int, active_days, day_sessions, time_mode, global_times, day_override_times, day_allowed=None, neighbours=None, exact=False, street_col=None, status_col=None):
+    """
+    Weeks until each Area's backlog clears at the current days, sessions and Area matrix, assuming no
+    new work arrives. exact=False is the vectorised capacity model (a year in well under a second);
+    exact=True plans every week with build_week_plan instead, to validate it.
+    Returns {"Clearance": per Area, "Weekly": per week x Area}. "Dark Blue left" / "Overdue" count jobs
+    still unplanned at the week's end that are Dark Blue for the next week / past their cutoff by then.
+    """
+    run = planner_forecast_weeks if exact else capacity_forecast_weeks
+    kwargs = {"street_col": street_col, "status_col": status_col} if exact else {}
+    areas, rows, total, dark_now = run(
+        df_work, week_start, weeks, active_days, day_sessions, time_mode, global_times, day_override_times,
+        day_allowed, neighbours, **kwargs,
+    )
+
+    n = len(areas)
+    weekly = pd.DataFrame({
+        "Week": np.repeat([r[0] for r in rows], n),
+        "Area": np.tile(np.array(areas, dtype=object), len(rows)),
+        "Planned": np.concatenate([r[1] for r in rows]) if rows else [],
+        "Left": np.concatenate([r[2] for r in rows]) if rows else [],
+        "Dark Blue left": np.concatenate([r[3] for r in rows]) if rows else [],
+        "Overdue": np.concatenate([r[4] for r in rows]) if rows else [],
+    })
+
+    week_starts = [r[0] for r in rows]
+    summary = []
+    for i, area in enumerate(areas):
+        dark_left = np.array([r[3][i] for r in rows])
+        left = np.array([r[2][i] for r in rows])
+        dark_weeks = np.flatnonzero(dark_left > 0)
+        dark_clear = 0 if not len(dark_weeks) else int(dark_weeks[-1]) + 1
+        all_clear = np.flatnonzero(left == 0)
+        summary.append({
+            "Area": area,
+            "Jobs": int(total[i]),
+            "Dark Blue now": int(dark_now[i]),
+            "Weeks to clear Dark Blue": dark_clear + 1 if dark_clear < len(rows) else None,
+            "Dark Blue clear (week of)": week_starts[dark_clear] if dark_clear < len(rows) else None,
+            "Backlog clear (week of)": week_starts[int(all_clear[0])] if len(all_clear) else None,
+            "Overdue at horizon": int(rows[-1][4][i]) if rows else 0,
+        })
+    clearance = pd.DataFrame(summary, columns=[
+        "Area", "Jobs", "Dark Blue now", "Weeks to clear Dark Blue", "Dark Blue clear (week of)",
+        "Backlog clear (week of)", "Overdue at horizon",
+    ])
+    clearance["Weeks to clear Dark Blue"] = clearance["Weeks to clear Dark Blue"].astype("Int64")
+    clearance = clearance.sort_values(
+        by=["Weeks to clear Dark Blue", "Dark Blue now"], ascending=[False, False], na_position="first", kind="mergesort"
+    ).reset_index(drop=True)
+    return {"Clearance": clearance, "Weekly": weekly}
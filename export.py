@@ -0,0 +1,632 @@
+import csv
+import html
+import io
+import zipfile
+from copy import copy as pycopy
+from datetime import date, datetime, timezone
+from io import BytesIO, StringIO
+from itertools import groupby
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from engine import WEEKDAYS, as_date, session_window
+from ingest import COLUMN_CANDIDATES, SOURCE_FILE_COL, SOURCE_SHEET_COL, is_export_sheet, pick_col
+
+# =========================================================
+# Flowboard — exports
+# - Styled write-back into the source workbook(s) (colour coding preserved),
+#   one week or several from a single parse of the workbook
+# - Lean streamed xlsx / CSV of the planned rows
+# - Values-only sheet for CSV / Parquet backlogs (no source workbook to style)
+# - Per-session export pack: CSVs, printable run sheets and an ICS calendar, in one zip
+# - Plan metrics sheet
+# - Importable without Streamlit (used by the page and the planning service)
+# =========================================================
+
+EXPORT_SHEET_NAME = "Completed Schedule"
+EXPORT_DATE_COL = "Survey_Date"
+EXPORT_AMPM_COL = "am_pm"
+EXPORT_ISO_WEEK_COL = "ISO_Week"
+
+URGENCY_COLORS = {"Dark Blue": "#1f4cff", "Light Blue": "#5aa9ff", "Flexible": "#9aa3af"}
+
+
+# -----------------------------
+# Excel styled export
+# -----------------------------
+def find_or_add_column(ws, header_name: str) -> int:
+    max_col = ws.max_column
+    for c in range(1, max_col + 1):
+        val = ws.cell(row=1, column=c).value
+        if str(val).strip() == header_name:
+            return c
+
+    new_col = max_col + 1
+    hdr_cell = ws.cell(row=1, column=new_col)
+    hdr_cell.value = header_name
+
+    if max_col >= 1:
+        prev = ws.cell(row=1, column=max_col)
+        hdr_cell._style = pycopy(prev._style)
+        hdr_cell.font = pycopy(prev.font)
+        hdr_cell.fill = pycopy(prev.fill)
+        hdr_cell.border = pycopy(prev.border)
+        hdr_cell.alignment = pycopy(prev.alignment)
+        hdr_cell.number_format = prev.number_format
+        hdr_cell.protection = pycopy(prev.protection)
+
+    ws.column_dimensions[get_column_letter(new_col)].width = max(
+        14, ws.column_dimensions[get_column_letter(max_col)].width or 14
+    )
+    return new_col
+
+
+def copy_cells(src_cells, ws_dst, dst_row: int, columns=None):
+    """
+    Copy one row of cells (values, styles, comments) into ws_dst. Both sheets share a workbook, so the
+    style is copied as its style-table ids: re-assigning font / fill / border objects would re-register
+    the very same entries and costs far more than the copy itself.
+    columns: [(destination column, source position)] instead of copying cell n to column n.
+    """
+    if columns is None:
+        columns = enumerate(range(len(src_cells)), start=1)
+    for c, pos in columns:
+        if pos >= len(src_cells):
+            continue
+        cell_src = src_cells[pos]
+        cell_dst = ws_dst.cell(row=dst_row, column=c)
+        cell_dst.value = cell_src.value
+        cell_dst._style = pycopy(cell_src._style)
+        if cell_src.comment:
+            cell_dst.comment = pycopy(cell_src.comment)
+
+
+class StyledTemplate:
+    """
+    A source workbook parsed once (load_workbook is the dominant export cost), with the planned-field
+    columns added and every row of its ingested sheets indexed, so any number of Completed Schedule
+    sheets or workbooks can be written from the one parse.
+    sheet_names: the sheets of this workbook that were ingested (default: the active sheet).
+    """
+
+    def __init__(self, original_bytes: bytes, sheet_names=None):
+        self.wb = load_workbook(BytesIO(original_bytes))
+        src_sheets = [self.wb[s] for s in (sheet_names or []) if s in self.wb.sheetnames]
+        self.src_sheets = src_sheets or [self.wb.active]
+        self.ws_src = self.src_sheets[0]
+        self.sheets_by_title = {ws.title: ws for ws in self.src_sheets}
+        self.export_cols = {
+            ws.title: (
+                find_or_add_column(ws, EXPORT_DATE_COL),
+                find_or_add_column(ws, EXPORT_AMPM_COL),
+                find_or_add_column(ws, EXPORT_ISO_WEEK_COL),
+            )
+            for ws in self.src_sheets
+        }
+        # rows[title][r] = cells of Excel row r (1 = header); cells are live, so written fields show up in copies
+        self.rows = {
+            ws.title: [()] + list(ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=ws.max_column))
+            for ws in self.src_sheets
+        }
+        self.schedule_header, self.schedule_columns = self.schedule_layout()
+
+    def schedule_layout(self):
+        """
+        Completed Schedule header: the first sheet's columns, then any column only later sheets have.
+        Other sheets' rows are remapped onto it by header, the way ingest.harmonise_columns lines the
+        frames up: same header first, else the column pick_col finds for the same mapping key.
+        Returns ([(sheet title, source position)] per schedule column, {title: [(column, position)]}).
+        """
+        def headers(title):
+            return [str(c.value).strip() if c.value is not None else "" for c in self.rows[title][1]]
+
+        first = self.ws_src.title
+        ref = headers(first)
+        canonical = {}
+        for key, cands in COLUMN_CANDIDATES.items():
+            hit = pick_col([h for h in ref if h], cands)
+            if hit is not None:
+                canonical[hit] = key
+
+        header = [(first, pos) for pos in range(len(ref))]
+        names = list(ref)
+        columns = {first: None}
+        for ws in self.src_sheets[1:]:
+            own = headers(ws.title)
+            present = [h for h in own if h]
+            mapped, taken = [], set()
+            for c, name in enumerate(names, start=1):
+                src = name if name and name in own else None
+                if src is None and name in canonical:
+                    src = pick_col(present, COLUMN_CANDIDATES[canonical[name]])
+                if src is not None and own.index(src) not in taken:
+                    mapped.append((c, own.index(src)))
+                    taken.add(own.index(src))
+            for pos, name in enumerate(own):
+                if name and pos not in taken and name not in names:
+                    header.append((ws.title, pos))
+                    names.append(name)
+                    mapped.append((len(names), pos))
+            columns[ws.title] = mapped
+        return header, columns
+
+    def plan_rows(self, plan_df: pd.DataFrame):
+        """(sheet title, Excel row) per plan row; untagged plans (or unknown sheets) go to the first sheet."""
+        if SOURCE_SHEET_COL in plan_df.columns:
+            titles = [t if t in self.sheets_by_title else self.ws_src.title for t in plan_df[SOURCE_SHEET_COL].tolist()]
+        else:
+            titles = [self.ws_src.title] * len(plan_df)
+        return list(zip(titles, [int(x) for x in plan_df["_excel_row"].tolist()]))
+
+    def write_planned_fields(self, plan_df: pd.DataFrame):
+        """Survey_Date / am_pm / ISO_Week into each planned job's source row; returns [(cell, previous value, style)]."""
+        written = []
+
+        def put(ws, row, col, value):
+            cell = ws.cell(row=row, column=col)
+            written.append((cell, cell.value, pycopy(cell._style)))  # a date value also sets a number format
+            cell.value = value
+
+        if plan_df is None or plan_df.empty:
+            return written
+        for (title, excel_row), pdate, psess in zip(
+            self.plan_rows(plan_df), plan_df["_planned_date"].tolist(), plan_df["_planned_session"].tolist()
+        ):
+            ws = self.sheets_by_title[title]
+            date_col_idx, ampm_col_idx, iso_week_col_idx = self.export_cols[title]
+            if pd.notna(pdate) and pdate is not None:
+                put(ws, excel_row, date_col_idx, as_date(pdate))
+                try:
+                    put(ws, excel_row, iso_week_col_idx, int(as_date(pdate).isocalendar()[1]))
+                except Exception:
+                    put(ws, excel_row, iso_week_col_idx, None)
+            if psess:
+                put(ws, excel_row, ampm_col_idx, str(psess))
+        return written
+
+    @staticmethod
+    def restore(written):
+        """Undo write_planned_fields (latest write first), so the next week starts from the source values."""
+        for cell, value, style in reversed(written):
+            cell.value = value
+            cell._style = style
+
+    def add_schedule_sheet(self, plan_df: pd.DataFrame, title: str = EXPORT_SHEET_NAME, index: int = 0):
+        """
+        Completed Schedule sheet at tab `index`: header, the planned rows in export order, then every other
+        row of the ingested sheets in source order, styles and column widths kept, each sheet's cells placed
+        under the schedule_layout header. Replaces any sheet of that title.
+        """
+        if title in self.wb.sheetnames:
+            del self.wb[title]
+        ws_out = self.wb.create_sheet(title, index)
+
+        scheduled_rows = []
+        if plan_df is not None and not plan_df.empty:
+            rows = self.plan_rows(plan_df)
+            scheduled_rows = [rows[pos] for pos in plan_export_order(plan_df)]
+        scheduled_set = set(scheduled_rows)
+
+        for c, (title_src, pos) in enumerate(self.schedule_header, start=1):
+            copy_cells(self.rows[title_src][1], ws_out, 1, [(c, pos)])
+            width = self.sheets_by_title[title_src].column_dimensions[get_column_letter(pos + 1)].width
+            ws_out.column_dimensions[get_column_letter(c)].width = width
+
+        out_row = 2
+        for title_src, src_r in scheduled_rows:
+            sheet_rows = self.rows[title_src]
+            if 2 <= src_r < len(sheet_rows):
+                copy_cells(sheet_rows[src_r], ws_out, out_row, self.schedule_columns[title_src])
+                out_row += 1
+
+        for ws in self.src_sheets:
+            sheet_rows = self.rows[ws.title]
+            for src_r in range(2, len(sheet_rows)):
+                if (ws.title, src_r) not in scheduled_set:
+                    copy_cells(sheet_rows[src_r], ws_out, out_row, self.schedule_columns[ws.title])
+                    out_row += 1
+        return ws_out
+
+    def save(self, active_title: str = EXPORT_SHEET_NAME) -> bytes:
+        """Workbook bytes, opening on active_title."""
+        self.wb.active = self.wb.sheetnames.index(active_title)
+        out = BytesIO()
+        self.wb.save(out)
+        return out.getvalue()
+
+
+def build_styled_completed_workbook(original_bytes: bytes, plan_df: pd.DataFrame, sheet_names=None) -> bytes:
+    """
+    sheet_names: the sheets of this workbook that were ingested (default: the active sheet).
+    Plan rows tagged with SOURCE_SHEET_COL are written back to their own sheet.
+    """
+    template = StyledTemplate(original_bytes, sheet_names)
+    template.write_planned_fields(plan_df)
+    # The export OPENS on the sorted sheet, moved to the first tab for clarity
+    template.add_schedule_sheet(plan_df)
+    return template.save()
+
+
+def week_sheet_title(week_start) -> str:
+    """Per-week Completed Schedule tab, e.g. "Completed Schedule 2026-10-19" (Excel allows 31 characters)."""
+    return f"{EXPORT_SHEET_NAME} {as_date(week_start).isoformat()}"
+
+
+def build_styled_completed_weeks(original_bytes: bytes, plans: dict, sheet_names=None, per_week_files: bool = False, file_stem: str = "flowboard_completed") -> bytes:
+    """
+    Several weeks ({week_start: plan_df}) from a single parse of the source workbook.
+    Default: one workbook, every week's fields written back and one Completed Schedule tab per week
+    (week_sheet_title, in week order). per_week_files: a zip of one workbook per week, each the same as
+    build_styled_completed_workbook for that week alone (fields are restored between weeks).
+    """
+    template = StyledTemplate(original_bytes, sheet_names)
+    weeks = sorted(plans, key=as_date)
+
+    if per_week_files:
+        out = BytesIO()
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for week in weeks:
+                written = template.write_planned_fields(plans[week])
+                template.add_schedule_sheet(plans[week])
+                zf.writestr(f"{file_stem}_{as_date(week).isoformat()}.xlsx", template.save())
+                template.restore(written)
+        return out.getvalue()
+
+    for title in [t for t in template.wb.sheetnames if is_export_sheet(t)]:
+        del template.wb[title]
+    for week in weeks:
+        template.write_planned_fields(plans[week])
+    for i, week in enumerate(weeks):
+        template.add_schedule_sheet(plans[week], week_sheet_title(week), index=i)
+    return template.save(week_sheet_title(weeks[0]) if weeks else template.ws_src.title)
+
+
+def build_styled_completed_archive(source_files: dict, plan_df: pd.DataFrame, sheets_by_file: dict) -> bytes:
+    """One styled workbook per source file (rows routed by SOURCE_FILE_COL), zipped together."""
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for file_name, original_bytes in source_files.items():
+            if plan_df is not None and not plan_df.empty and SOURCE_FILE_COL in plan_df.columns:
+                file_plan = plan_df[plan_df[SOURCE_FILE_COL] == file_name]
+            else:
+                file_plan = plan_df
+            wb_bytes = build_styled_completed_workbook(original_bytes, file_plan, sheets_by_file.get(file_name))
+            stem = file_name.rsplit(".", 1)[0]
+            zf.writestr(f"{stem}_completed.xlsx", wb_bytes)
+    return out.getvalue()
+
+
+# -----------------------------
+# Lean export (streamed, no source workbook)
+# -----------------------------
+LEAN_EXPORT_MAPPED_KEYS = ["ref", "number", "street", "suburb", "city", "target", "bed", "type", "status"]
+LEAN_HEADER_FONT = Font(bold=True)
+LEAN_URGENCY_FILLS = {
+    urg: PatternFill("solid", fgColor="FF" + hex_col.lstrip("#").upper())
+    for urg, hex_col in URGENCY_COLORS.items()
+}
+LEAN_URGENCY_FONT = Font(bold=True, color="FFFFFFFF")
+
+
+def plain_cell_value(v):
+    """numpy/pandas scalars -> plain Python values that openpyxl and csv accept."""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    if hasattr(v, "dtype"):
+        return pd.Timestamp(v).to_pydatetime() if v.dtype.kind == "M" else v.item()
+    return v
+
+
+def plan_export_order(plan_df: pd.DataFrame):
+    """Positions of plan_df rows in export order: Survey_Date, then am_pm, then stop sequence."""
+    keys = pd.DataFrame({
+        "d": pd.to_datetime(plan_df["_planned_date"], errors="coerce"),
+        "s": plan_df["_planned_session"].map({"AM": 0, "PM": 1}).fillna(9),
+        "q": pd.to_numeric(plan_df.get("_planned_seq", 0), errors="coerce"),
+    })
+    keys.index = range(len(keys))
+    return keys.sort_values(by=["d", "s", "q"], kind="mergesort").index.to_numpy()
+
+
+def lean_export_columns(plan_df: pd.DataFrame, colmap: dict):
+    mapped = []
+    for k in LEAN_EXPORT_MAPPED_KEYS:
+        c = colmap.get(k)
+        if c is not None and c in plan_df.columns and c not in mapped:
+            mapped.append(c)
+    return mapped
+
+
+def iter_lean_export_rows(plan_df: pd.DataFrame, colmap: dict):
+    """
+    Yield the header and then one plain-value row per planned job, in export order.
+    Rows are produced one at a time from column arrays, so nothing row-shaped is materialised.
+    """
+    mapped = lean_export_columns(plan_df, colmap)
+    yield [EXPORT_DATE_COL, EXPORT_AMPM_COL, EXPORT_ISO_WEEK_COL, "Stop", "Urgency", "Area", "Est_Mins"] + [str(c) for c in mapped]
+
+    if plan_df is None or plan_df.empty:
+        return
+
+    n = len(plan_df)
+    dates = plan_df["_planned_date"].to_numpy()
+    sess = plan_df["_planned_session"].to_numpy()
+    seq = plan_df["_planned_seq"].to_numpy() if "_planned_seq" in plan_df.columns else [None] * n
+    urg = plan_df["_urgency"].to_numpy() if "_urgency" in plan_df.columns else ["Flexible"] * n
+    terr = plan_df["_territory"].to_numpy() if "_territory" in plan_df.columns else ["Unknown"] * n
+    mins = plan_df["_mins"].to_numpy() if "_mins" in plan_df.columns else [None] * n
+    mapped_arrays = [plan_df[c].to_numpy() for c in mapped]
+
+    for pos in plan_export_order(plan_df):
+        pdate = as_date(dates[pos])
+        iso_wk = int(pdate.isocalendar()[1]) if pdate else None
+        row = [
+            pdate,
+            str(sess[pos]) if sess[pos] else None,
+            iso_wk,
+            None if pd.isna(seq[pos]) else int(seq[pos]),
+            str(urg[pos]),
+            str(terr[pos]),
+            None if pd.isna(mins[pos]) else int(mins[pos]),
+        ]
+        for arr in mapped_arrays:
+            row.append(plain_cell_value(arr[pos]))
+        yield row
+
+
+def build_lean_export_workbook(plan_df: pd.DataFrame, colmap: dict) -> bytes:
+    """Write-only xlsx of the sorted plan with predefined urgency styles; memory stays flat in row count."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(EXPORT_SHEET_NAME)
+    ws.freeze_panes = "A2"
+
+    rows = iter_lean_export_rows(plan_df, colmap)
+    header = next(rows)
+    for c in range(1, len(header) + 1):
+        ws.column_dimensions[get_column_letter(c)].width = 14
+
+    hdr_cells = []
+    for v in header:
+        cell = WriteOnlyCell(ws, value=v)
+        cell.font = LEAN_HEADER_FONT
+        hdr_cells.append(cell)
+    ws.append(hdr_cells)
+
+    for row in rows:
+        date_cell = WriteOnlyCell(ws, value=row[0])
+        date_cell.number_format = "DD/MM/YYYY"
+        urg_cell = WriteOnlyCell(ws, value=row[4])
+        fill = LEAN_URGENCY_FILLS.get(row[4])
+        if fill is not None:
+            urg_cell.fill = fill
+            urg_cell.font = LEAN_URGENCY_FONT
+        ws.append([date_cell] + row[1:4] + [urg_cell] + row[5:])
+
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def build_lean_export_csv(plan_df: pd.DataFrame, colmap: dict) -> bytes:
+    out = StringIO()
+    writer = csv.writer(out)
+    for row in iter_lean_export_rows(plan_df, colmap):
+        writer.writerow(["" if v is None else (v.isoformat() if isinstance(v, date) else v) for v in row])
+    return out.getvalue().encode("utf-8-sig")
+
+
+def iter_values_export_rows(plan_df: pd.DataFrame):
+    """
+    Header, then one row per planned job in export order: every source column (internal
+    "_" columns dropped) followed by Survey_Date, am_pm and ISO_Week, like the styled sheet.
+    """
+    added = [EXPORT_DATE_COL, EXPORT_AMPM_COL, EXPORT_ISO_WEEK_COL]
+    source_cols = [c for c in plan_df.columns if not str(c).startswith("_") and str(c).strip() not in added]
+    yield [str(c) for c in source_cols] + added
+
+    if plan_df.empty:
+        return
+
+    dates = plan_df["_planned_date"].to_numpy()
+    sess = plan_df["_planned_session"].to_numpy()
+    source_arrays = [plan_df[c].to_numpy() for c in source_cols]
+
+    for pos in plan_export_order(plan_df):
+        pdate = as_date(dates[pos])
+        row = [plain_cell_value(arr[pos]) for arr in source_arrays]
+        row += [pdate, str(sess[pos]) if sess[pos] else None, int(pdate.isocalendar()[1]) if pdate else None]
+        yield row
+
+
+def build_values_export_workbook(plan_df: pd.DataFrame) -> bytes:
+    """Values-only Completed Schedule for CSV / Parquet backlogs, which have no workbook to style from."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(EXPORT_SHEET_NAME)
+    ws.freeze_panes = "A2"
+
+    rows = iter_values_export_rows(plan_df)
+    header = next(rows)
+    date_idx = len(header) - 3
+    for c in range(1, len(header) + 1):
+        ws.column_dimensions[get_column_letter(c)].width = 14
+
+    hdr_cells = []
+    for v in header:
+        cell = WriteOnlyCell(ws, value=v)
+        cell.font = LEAN_HEADER_FONT
+        hdr_cells.append(cell)
+    ws.append(hdr_cells)
+
+    for row in rows:
+        date_cell = WriteOnlyCell(ws, value=row[date_idx])
+        date_cell.number_format = "DD/MM/YYYY"
+        row[date_idx] = date_cell
+        ws.append(row)
+
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+# -----------------------------
+# Export pack (per-session CSV + run sheet, ICS calendar)
+# -----------------------------
+PACK_RUN_SHEET_CSS = (
+    "body{font-family:sans-serif;margin:24px}table{border-collapse:collapse;width:100%}"
+    "th,td{border:1px solid #9aa3af;padding:4px 6px;text-align:left;font-size:12px}"
+    "th{background:#f3f4f6}td.done{width:60px}@media print{body{margin:8mm}}"
+)
+
+
+def iter_pack_sessions(plan_df: pd.DataFrame, colmap: dict):
+    """
+    Yield the lean header, then one (date, session, rows, labels) per planned session in export order.
+    Rows come off iter_lean_export_rows one at a time; only the current session's rows are held.
+    """
+    rows = iter_lean_export_rows(plan_df, colmap)
+    yield next(rows)
+    if plan_df is None or plan_df.empty:
+        return
+
+    order = plan_export_order(plan_df)
+    labels = plan_df["_label"].to_numpy()[order] if "_label" in plan_df.columns else [""] * len(order)
+    for (pdate, sess), group in groupby(zip(rows, labels), key=lambda rl: (rl[0][0], rl[0][1])):
+        group = list(group)
+        yield pdate, sess, [r for r, _ in group], ["" if pd.isna(lb) else str(lb) for _, lb in group]
+
+
+def ics_text(value) -> str:
+    return str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def ics_line(line: str) -> str:
+    """Fold to 75-octet lines (RFC 5545), CRLF terminated."""
+    raw = line.encode("utf-8")
+    parts = []
+    while len(raw) > 75:
+        cut = 75 if not parts else 74
+        while cut > 0 and (raw[cut] & 0xC0) == 0x80:  # don't split a UTF-8 sequence
+            cut -= 1
+        parts.append(raw[:cut].decode("utf-8"))
+        raw = raw[cut:]
+    parts.append(raw.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def pack_entry_stem(pdate: date, sess: str) -> str:
+    return f"{pdate.isoformat()}_{WEEKDAYS[pdate.weekday()]}_{sess}"
+
+
+def write_pack_session_csv(stream, header, rows, labels):
+    writer = csv.writer(stream)
+    writer.writerow(header[:4] + ["Address"] + header[4:])
+    for row, label in zip(rows, labels):
+        row = ["" if v is None else (v.isoformat() if isinstance(v, date) else v) for v in row]
+        writer.writerow(row[:4] + [label] + row[4:])
+
+
+def run_sheet_cell(v) -> str:
+    if v is None:
+        return "<td></td>"
+    return f"<td>{html.escape(v.strftime('%d/%m/%Y') if isinstance(v, date) else str(v))}</td>"
+
+
+def write_pack_run_sheet(stream, header, pdate, sess, window, rows, labels):
+    """Printable HTML run sheet: stop order, address, urgency, area, estimate, blank Done / Notes columns."""
+    mapped = header[7:]
+    total = sum(r[6] or 0 for r in rows)
+    areas = ", ".join(dict.fromkeys(str(r[5]) for r in rows))
+    title = f"{WEEKDAYS[pdate.weekday()]} {pdate.strftime('%d %b %Y')} — {sess}"
+    stream.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>")
+    stream.write(f"<style>{PACK_RUN_SHEET_CSS}</style></head><body>")
+    stream.write(f"<h2>{html.escape(title)}</h2>")
+    stream.write(
+        f"<p>{window[0].strftime('%H:%M')}–{window[1].strftime('%H:%M')} • {html.escape(areas)} • "
+        f"{len(rows)} stops • est {total} mins</p>"
+    )
+    cols = ["Stop", "Address", "Urgency", "Area", "Est mins"] + [str(c) for c in mapped] + ["Done", "Notes"]
+    stream.write("<table><tr>" + "".join(f"<th>{html.escape(c)}</th>" for c in cols) + "</tr>")
+    for row, label in zip(rows, labels):
+        cells = [row[3], label, row[4], row[5], row[6]] + row[7:]
+        stream.write("<tr>" + "".join(run_sheet_cell(v) for v in cells) + "<td class='done'></td><td></td></tr>")
+    stream.write("</table></body></html>")
+
+
+def ics_session_event(pdate, sess, window, rows, labels, stamp: str):
+    total = sum(r[6] or 0 for r in rows)
+    areas = ", ".join(dict.fromkeys(str(r[5]) for r in rows))
+    stops = "\n".join(
+        f"{r[3]}. {label} ({r[4]}, {r[6] if r[6] is not None else '?'} mins)" for r, label in zip(rows, labels)
+    )
+    start = datetime.combine(pdate, window[0]).strftime("%Y%m%dT%H%M%S")
+    end = datetime.combine(pdate, window[1]).strftime("%Y%m%dT%H%M%S")
+    return [
+        "BEGIN:VEVENT",
+        f"UID:{pdate.isoformat()}-{sess}@flowboard",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{start}",
+        f"DTEND:{end}",
+        f"SUMMARY:{ics_text(f'{sess} — {areas} ({len(rows)} stops, {total} mins)')}",
+        f"DESCRIPTION:{ics_text(stops)}",
+        "END:VEVENT",
+    ]
+
+
+def build_export_pack(plan_df: pd.DataFrame, colmap: dict, week_start: date, time_mode, global_times, day_override_times) -> bytes:
+    """
+    Zip of csv/<date>_<day>_<session>.csv and run_sheets/<...>.html per planned session plus
+    flowboard_<week>.ics (one event per session block listing its stops). Every entry is
+    written straight into the archive as the plan is walked once in export order.
+    """
+    out = BytesIO()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    events = []
+    sessions = iter_pack_sessions(plan_df, colmap)
+    header = next(sessions)
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for pdate, sess, rows, labels in sessions:
+            window = session_window(time_mode, global_times, day_override_times, WEEKDAYS[pdate.weekday()], sess)
+            stem = pack_entry_stem(pdate, sess)
+            with zf.open(f"csv/{stem}.csv", "w") as raw, io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as stream:
+                write_pack_session_csv(stream, header, rows, labels)
+            with zf.open(f"run_sheets/{stem}.html", "w") as raw, io.TextIOWrapper(raw, encoding="utf-8") as stream:
+                write_pack_run_sheet(stream, header, pdate, sess, window, rows, labels)
+            events.extend(ics_session_event(pdate, sess, window, rows, labels, stamp))
+
+        with zf.open(f"flowboard_{week_start.isoformat()}.ics", "w") as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as stream:
+            for line in ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Flowboard//Export pack//EN", "CALSCALE:GREGORIAN"] + events + ["END:VCALENDAR"]:
+                stream.write(ics_line(line))
+    return out.getvalue()
+
+
+# -----------------------------
+# Plan metrics export
+# -----------------------------
+METRICS_SHEET_NAME = "Plan Metrics"
+
+
+def build_metrics_workbook(metrics: dict) -> bytes:
+    """All metric tables stacked on one sheet, each under a bold title row."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(METRICS_SHEET_NAME)
+    for c in range(1, 11):
+        ws.column_dimensions[get_column_letter(c)].width = 18
+
+    for title, table in metrics.items():
+        title_cell = WriteOnlyCell(ws, value=title)
+        title_cell.font = LEAN_HEADER_FONT
+        ws.append([title_cell])
+        ws.append([str(c) for c in table.columns])
+        for values in table.itertuples(index=False, name=None):
+            ws.append([plain_cell_value(v) for v in values])
+        ws.append([])
+
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
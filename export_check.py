@@ -0,0 +1,231 @@
+import argparse
+import sys
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from engine import (
+    DUP_KEY_COL,
+    WEEKDAYS,
+    build_week_plan,
+    derive_work_frame,
+    monday_of_week,
+    roll_forward_frame,
+    with_duplicate_rows,
+)
+from export import EXPORT_DATE_COL, EXPORT_SHEET_NAME, StyledTemplate, build_styled_completed_weeks
+from ingest import COLUMN_CANDIDATES, SOURCE_SHEET_COL, ingested_sheets, pick_col, read_backlogs
+
+# =========================================================
+# Flowboard — styled export check
+# - Writes a small synthetic workbook of two sheets (the second with
+#   its columns reordered, renamed and one extra), ingests every sheet
+#   and plans every other row
+# - Writes the planned fields back and adds the Completed Schedule sheet
+# - Checks the Survey_Date cells hold dates (not datetimes) with the
+#   yyyy-mm-dd number format, in memory and after a save / reload
+#   (openpyxl reads every date cell back as a datetime, so only the
+#   format is checked there)
+# - Checks every Completed Schedule row sits under the right headers
+# - Plans a backlog of duplicated jobs over three weeks (rolling the
+#   unplanned jobs forward twice) and checks the all-weeks export dates
+#   every source row of each job planned, duplicate copies included
+# - Exits 1 when any check fails
+#
+# Usage: python export_check.py [--rows 40]
+# =========================================================
+
+DATE_FORMAT = "yyyy-mm-dd"
+FIRST_HEADER = ["Reference", "Number", "Street", "Suburb", "Target Date", "Status"]
+# second sheet: another order, other names for the same mapping keys, one column of its own
+SECOND_HEADER = ["Suburb", "Street Number", "Street", "Survey Status", "Property Reference", "Due", "Notes"]
+
+
+def job_values(sheet: str, i: int, week_start: date) -> dict:
+    """Cell values of job i of sheet, keyed by the first sheet's headers (plus Notes)."""
+    return {
+        "Reference": f"{sheet[0]}{i:05d}",
+        "Number": i % 40 + 1,
+        "Street": f"{sheet} St",
+        "Suburb": "Glebe" if sheet == "Backlog" else "Ryde",
+        "Target Date": datetime.combine(week_start + timedelta(days=i % 20), datetime.min.time()),
+        "Status": "Open",
+        "Notes": f"note {i}" if sheet != "Backlog" else None,
+    }
+
+
+def source_workbook(n_rows: int, week_start: date) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Backlog"
+    ws.append(FIRST_HEADER)
+    for i in range(n_rows):
+        values = job_values(ws.title, i, week_start)
+        ws.append([values[h] for h in FIRST_HEADER])
+
+    ws = wb.create_sheet("North")
+    ws.append(SECOND_HEADER)
+    as_first = dict(zip(SECOND_HEADER, ["Suburb", "Number", "Street", "Status", "Reference", "Target Date", "Notes"]))
+    for i in range(n_rows):
+        values = job_values(ws.title, i, week_start)
+        ws.append([values[as_first[h]] for h in SECOND_HEADER])
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def planned_frame(backlog: pd.DataFrame, week_start: date) -> pd.DataFrame:
+    """Every other row planned on a weekday of week_start, alternating sessions."""
+    plan_df = backlog.iloc[::2].copy()
+    n = len(plan_df)
+    plan_df["_planned_date"] = [week_start + timedelta(days=i % 5) for i in range(n)]
+    plan_df["_planned_session"] = ["AM" if i % 2 == 0 else "PM" for i in range(n)]
+    plan_df["_planned_seq"] = list(range(1, n + 1))
+    return plan_df
+
+
+def header_index(ws):
+    return {str(c.value).strip(): c.column for c in ws[1] if c.value is not None}
+
+
+def check_survey_dates(wb, sheet_title: str, excel_rows, check_type: bool = True):
+    """Failure messages for the Survey_Date cells of excel_rows in sheet_title."""
+    ws = wb[sheet_title]
+    header = header_index(ws)
+    if EXPORT_DATE_COL not in header:
+        return [f"{sheet_title}: no {EXPORT_DATE_COL} column"]
+
+    failures = []
+    for excel_row in excel_rows:
+        cell = ws.cell(row=int(excel_row), column=header[EXPORT_DATE_COL])
+        if check_type and (not isinstance(cell.value, date) or isinstance(cell.value, datetime)):
+            failures.append(f"{sheet_title}!{cell.coordinate}: {cell.value!r} is not a date")
+        elif cell.number_format != DATE_FORMAT:
+            failures.append(f"{sheet_title}!{cell.coordinate}: number format {cell.number_format!r}, expected {DATE_FORMAT!r}")
+    return failures
+
+
+def check_schedule_columns(wb, n_rows: int, week_start: date, n_planned: int):
+    """Failure messages for Completed Schedule rows whose cells sit under the wrong header."""
+    ws = wb[EXPORT_SHEET_NAME]
+    header = header_index(ws)
+    missing = [h for h in FIRST_HEADER + ["Notes", EXPORT_DATE_COL] if h not in header]
+    if missing:
+        return [f"{EXPORT_SHEET_NAME}: no {', '.join(missing)} column(s)"]
+
+    expected = {}
+    for sheet in ("Backlog", "North"):
+        for i in range(n_rows):
+            values = job_values(sheet, i, week_start)
+            expected[values["Reference"]] = values
+
+    failures = []
+    seen = 0
+    for r in range(2, ws.max_row + 1):
+        ref = ws.cell(row=r, column=header["Reference"]).value
+        want = expected.get(ref)
+        if want is None:
+            failures.append(f"{EXPORT_SHEET_NAME}!row {r}: unknown Reference {ref!r}")
+            continue
+        seen += 1
+        for name, value in want.items():
+            got = ws.cell(row=r, column=header[name]).value
+            if got != value:
+                failures.append(f"{EXPORT_SHEET_NAME}!row {r} {name}: {got!r}, expected {value!r}")
+        planned = ws.cell(row=r, column=header[EXPORT_DATE_COL]).value is not None
+        if planned != (r - 2 < n_planned):
+            failures.append(f"{EXPORT_SHEET_NAME}!row {r}: planned rows must come first")
+    if seen != len(expected):
+        failures.append(f"{EXPORT_SHEET_NAME}: {seen} rows, expected {len(expected)}")
+    return failures
+
+
+def duplicated_workbook(n_jobs: int, week_start: date) -> bytes:
+    """One Area, every job twice: the copy has the street in capitals and a later target date."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Backlog"
+    ws.append(FIRST_HEADER)
+    for i in range(n_jobs):
+        values = job_values(ws.title, i, week_start - timedelta(days=30))
+        ws.append([values[h] for h in FIRST_HEADER])
+        values["Street"] = values["Street"].upper()
+        values["Target Date"] += timedelta(days=14)
+        ws.append([values[h] for h in FIRST_HEADER])
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def check_rolled_duplicates(n_jobs: int, week_start: date, weeks: int = 3):
+    """(failure messages, jobs planned per week) for duplicated jobs planned across rolled-forward weeks."""
+    data = duplicated_workbook(n_jobs, week_start)
+    backlog = read_backlogs([("dups.xlsx", data)])
+    cm = {key: pick_col(list(backlog.columns), cands) for key, cands in COLUMN_CANDIDATES.items()}
+    # One short session a week, so most jobs roll forward at least once
+    active_days = {d: d == "Monday" for d in WEEKDAYS}
+    day_sessions = {"Monday": {"AM": {"enabled": True, "load": "Normal"}, "PM": {"enabled": False, "load": "Normal"}}}
+    global_times = {"start_first": time(8, 30), "latest_arrival_last": time(15, 30), "depart_depot": None, "return_depot": None}
+
+    plans, per_week = {}, []
+    df_work = derive_work_frame(backlog, cm, week_start)
+    for w in range(weeks):
+        ws = week_start + timedelta(days=7 * w)
+        _, plan_df, remaining = build_week_plan(
+            df_work, ws, active_days, day_sessions, "Inspection window", global_times, {}, {}, None,
+            street_col=cm["street"],
+        )
+        plans[ws] = with_duplicate_rows(plan_df, df_work)
+        per_week.append(len(plan_df))
+        df_work = roll_forward_frame(remaining, ws + timedelta(days=7), cm["street"], cm["status"], df_work=df_work)
+
+    wb = load_workbook(BytesIO(build_styled_completed_weeks(data, plans, ["Backlog"])))
+    ws_src = wb["Backlog"]
+    header = header_index(ws_src)
+    planned_keys = {k for plan_df in plans.values() if not plan_df.empty for k in plan_df[DUP_KEY_COL].tolist()}
+    keys = backlog.assign(**{DUP_KEY_COL: derive_work_frame(backlog, cm, week_start)[DUP_KEY_COL].to_numpy()})
+
+    failures = []
+    for key, excel_row in zip(keys[DUP_KEY_COL].tolist(), keys["_excel_row"].tolist()):
+        if key in planned_keys and ws_src.cell(row=int(excel_row), column=header[EXPORT_DATE_COL]).value is None:
+            failures.append(f"dups.xlsx!row {excel_row}: planned job without a {EXPORT_DATE_COL}")
+    if len(per_week) < 3 or not all(per_week[1:]):
+        failures.append(f"rolled weeks planned nothing ({per_week}), so the roll-forward check proves nothing")
+    return failures, per_week
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check the styled Completed workbook export.")
+    parser.add_argument("--rows", type=int, default=40, help="rows per source sheet")
+    args = parser.parse_args(argv)
+
+    week_start = monday_of_week(date.today())
+    data = source_workbook(args.rows, week_start)
+    backlog = read_backlogs([("backlog.xlsx", data)], all_sheets=True)
+    plan_df = planned_frame(backlog, week_start)
+
+    template = StyledTemplate(data, ingested_sheets(backlog)["backlog.xlsx"])
+    template.write_planned_fields(plan_df)
+    template.add_schedule_sheet(plan_df)
+    schedule_rows = range(2, len(plan_df) + 2)  # planned rows come first on the schedule
+
+    failures = []
+    for wb, check_type in ((template.wb, True), (load_workbook(BytesIO(template.save())), False)):
+        for sheet, rows in plan_df.groupby(SOURCE_SHEET_COL, sort=False)["_excel_row"]:
+            failures += check_survey_dates(wb, sheet, rows.tolist(), check_type)
+        failures += check_survey_dates(wb, EXPORT_SHEET_NAME, schedule_rows, check_type)
+    failures += check_schedule_columns(template.wb, args.rows, week_start, len(plan_df))
+    rolled_failures, per_week = check_rolled_duplicates(args.rows, week_start)
+    failures += rolled_failures
+
+    for msg in failures[:20]:
+        print(msg)
+    print(f"{len(backlog)} rows • {len(plan_df)} planned • duplicated jobs planned per rolled week {per_week}")
+    print(f"{len(failures)} failed check(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
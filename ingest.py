@@ -0,0 +1,240 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+
+# =========================================================
+# Flowboard — backlog ingestion
+# - One or many workbooks (first sheet or every sheet), CSV or Parquet files
+# - Files parsed concurrently (one process per file)
+# - CSV read in chunks, text columns kept as categoricals so the raw
+#   backlog never exists as full-length object columns
+# - Columns harmonised via pick_col so regional exports line up
+# - Every row tagged with source file, sheet and Excel row for write-back
+# =========================================================
+
+SOURCE_FILE_COL = "_source_file"
+SOURCE_SHEET_COL = "_source_sheet"
+EXCEL_ROW_COL = "_excel_row"
+INGEST_TAG_COLS = [SOURCE_FILE_COL, SOURCE_SHEET_COL, EXCEL_ROW_COL]
+
+# Sheet written by the styled export (multi-week exports append the week); never re-ingest it as backlog
+SKIP_SHEETS = {"Completed Schedule"}
+
+WORKBOOK_EXTS = ("xlsx", "xls")
+CSV_EXTS = ("csv",)
+PARQUET_EXTS = ("parquet", "pq")
+CSV_CHUNK_ROWS = 50_000
+
+# Auto-detect candidates per mapping key (order matters: first hit wins)
+COLUMN_CANDIDATES = {
+    "target": ["target_date", "target date", "due", "target"],
+    "status": ["status", "survey_status", "survey status", "state"],
+    "bed": ["bdrm", "bed", "bedroom", "bdrm_no", "bdrm no"],
+    "type": ["inspection type", "type", "visit type"],
+    "ref": ["reference", "property_reference", "property reference", "id"],
+    "street": ["street"],
+    "number": ["number", "street number", "no."],
+    "suburb": ["suburb"],
+    "city": ["city", "town", "region", "area"],
+    "appt_date": ["appointment date", "appt date", "booking date", "booked date"],
+    "appt_time": ["appointment time", "appt time", "booking time", "booked time"],
+}
+
+
+def pick_col(cols, candidates):
+    """Return first matching column (case-insensitive contains). Works even if Excel has date headers."""
+    cols_str = [str(c) for c in cols]
+    cols_lower = {c.lower(): orig for c, orig in zip(cols_str, cols)}
+    for cand in candidates:
+        for c_str, orig in zip(cols_str, cols):
+            if cand in c_str.lower():
+                return orig
+    for cand in candidates:
+        if cand in cols_lower:
+            return cols_lower[cand]
+    return None
+
+
+def is_export_sheet(sheet_name) -> bool:
+    return any(str(sheet_name) == s or str(sheet_name).startswith(f"{s} ") for s in SKIP_SHEETS)
+
+
+def read_workbook_sheets(file_name: str, data: bytes, all_sheets: bool = False):
+    """
+    Parse one workbook into a list of tagged frames (one per non-empty sheet).
+    Runs inside a worker process, so it must stay importable and side-effect free.
+    """
+    frames = []
+    with pd.ExcelFile(BytesIO(data)) as xl:
+        sheets = [sh for sh in xl.sheet_names if not is_export_sheet(sh)]
+        if not all_sheets:
+            sheets = sheets[:1]
+        for sheet in sheets:
+            frame = xl.parse(sheet)
+            if frame.empty:
+                continue
+            frame[SOURCE_FILE_COL] = file_name
+            frame[SOURCE_SHEET_COL] = sheet
+            frame[EXCEL_ROW_COL] = range(2, len(frame) + 2)
+            frames.append(frame)
+    return frames
+
+
+def file_ext(file_name: str) -> str:
+    return str(file_name).rsplit(".", 1)[-1].lower() if "." in str(file_name) else ""
+
+
+def is_workbook(file_name: str) -> bool:
+    """Only workbooks can take the styled write-back; CSV / Parquet get the values-only export."""
+    return file_ext(file_name) in WORKBOOK_EXTS
+
+
+def compact_text_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """Text (object / str) columns -> categoricals, in place."""
+    for c in frame.columns:
+        if pd.api.types.is_object_dtype(frame[c].dtype) or pd.api.types.is_string_dtype(frame[c].dtype):
+            frame[c] = frame[c].astype("category")
+    return frame
+
+
+def concat_compact(parts):
+    """
+    Concatenate frames whose categorical columns carry different categories without
+    falling back to object: categories are unioned (lexically sorted) first.
+    """
+    parts = [p for p in parts if len(p.columns)]
+    if not parts:
+        return pd.DataFrame()
+    if len(parts) == 1:
+        return parts[0]
+    parts = [p.copy(deep=False) for p in parts]
+    for c in parts[0].columns:
+        cats = [p[c].cat.categories for p in parts if c in p.columns and isinstance(p[c].dtype, pd.CategoricalDtype)]
+        if len(cats) != sum(1 for p in parts if c in p.columns):
+            continue
+        if all(cats[0].equals(x) for x in cats[1:]):
+            continue
+        union = pd.Index(sorted(set().union(*[set(x) for x in cats]), key=str))
+        for p in parts:
+            if c in p.columns:
+                p[c] = p[c].cat.set_categories(union)
+    return pd.concat(parts, ignore_index=True, sort=False)
+
+
+def read_csv_backlog(file_name: str, data: bytes, chunk_rows: int = CSV_CHUNK_ROWS):
+    """Parse a CSV backlog chunk by chunk; each chunk is tagged and its text columns made categorical."""
+    parts = []
+    start = 2  # header is line 1, like a sheet's header row
+    for chunk in pd.read_csv(BytesIO(data), chunksize=chunk_rows):
+        chunk[SOURCE_FILE_COL] = file_name
+        chunk[SOURCE_SHEET_COL] = None
+        chunk[EXCEL_ROW_COL] = range(start, start + len(chunk))
+        start += len(chunk)
+        parts.append(compact_text_columns(chunk))
+    return [concat_compact(parts)] if parts else []
+
+
+def read_parquet_backlog(file_name: str, data: bytes):
+    try:
+        frame = pd.read_parquet(BytesIO(data))
+    except ImportError as e:
+        raise ValueError(f"{file_name}: Parquet input needs pyarrow ({e})")
+    if frame.empty:
+        return []
+    frame[SOURCE_FILE_COL] = file_name
+    frame[SOURCE_SHEET_COL] = None
+    frame[EXCEL_ROW_COL] = range(2, len(frame) + 2)
+    return [frame]
+
+
+def read_backlog_file(file_name: str, data: bytes, all_sheets: bool = False):
+    """One uploaded file -> list of tagged frames, by extension (workbook, CSV or Parquet)."""
+    ext = file_ext(file_name)
+    if ext in CSV_EXTS:
+        return read_csv_backlog(file_name, data)
+    if ext in PARQUET_EXTS:
+        return read_parquet_backlog(file_name, data)
+    return read_workbook_sheets(file_name, data, all_sheets)
+
+
+def harmonise_columns(frames):
+    """Rename each frame's detected mapping columns to the header used by the first frame."""
+    if len(frames) < 2:
+        return frames
+
+    ref_cols = list(frames[0].columns)
+    canonical = {}
+    for key, cands in COLUMN_CANDIDATES.items():
+        hit = pick_col(ref_cols, cands)
+        if hit is not None:
+            canonical[key] = hit
+
+    out = [frames[0]]
+    for frame in frames[1:]:
+        renames = {}
+        for key, target in canonical.items():
+            src = pick_col(list(frame.columns), COLUMN_CANDIDATES[key])
+            if src is not None and src != target and target not in frame.columns and src not in renames:
+                renames[src] = target
+        out.append(frame.rename(columns=renames) if renames else frame)
+    return out
+
+
+def read_backlogs(files, all_sheets: bool = False, max_workers=None) -> pd.DataFrame:
+    """
+    files: list of (file_name, bytes). Returns one merged, tagged backlog frame.
+    Several files are parsed in a process pool, so the merge takes about as long as the slowest file.
+    """
+    if not files:
+        return pd.DataFrame(columns=INGEST_TAG_COLS)
+
+    if len(files) == 1:
+        per_file = [read_backlog_file(files[0][0], files[0][1], all_sheets)]
+    else:
+        workers = max_workers or min(len(files), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(read_backlog_file, name, data, all_sheets) for name, data in files]
+            per_file = [f.result() for f in futures]
+
+    frames = harmonise_columns([fr for file_frames in per_file for fr in file_frames])
+    if not frames:
+        return pd.DataFrame(columns=INGEST_TAG_COLS)
+    if len(frames) == 1:
+        return frames[0]
+    return concat_compact(frames)
+
+
+# Area centroid table (optional, for the neighbour index): area / lat / lon columns
+CENTROID_CANDIDATES = {
+    "area": ["suburb", "area", "territory", "city", "town", "name"],
+    "lat": ["latitude", "lat"],
+    "lon": ["longitude", "lng", "lon"],
+}
+
+
+def read_area_centroids(file_name: str, data: bytes) -> dict:
+    """Centroid table (CSV or workbook) -> {area: (lat, lon)}; rows without both coordinates are skipped."""
+    frame = pd.read_csv(BytesIO(data)) if file_ext(file_name) in CSV_EXTS else pd.read_excel(BytesIO(data))
+    cols = {key: pick_col(list(frame.columns), cands) for key, cands in CENTROID_CANDIDATES.items()}
+    missing = [key for key, col in cols.items() if col is None]
+    if missing:
+        raise ValueError(f"{file_name}: no {' / '.join(missing)} column")
+
+    area = frame[cols["area"]].astype(object).fillna("").astype(str).str.strip()
+    lat = pd.to_numeric(frame[cols["lat"]], errors="coerce")
+    lon = pd.to_numeric(frame[cols["lon"]], errors="coerce")
+    ok = (area != "") & lat.notna() & lon.notna()
+    return dict(zip(area[ok], zip(lat[ok].astype(float), lon[ok].astype(float))))
+
+
+def ingested_sheets(df: pd.DataFrame):
+    """{file_name: [sheet, ...]} in ingestion order, for writing results back to the right sheets."""
+    if df is None or SOURCE_FILE_COL not in df.columns:
+        return {}
+    pairs = df[[SOURCE_FILE_COL, SOURCE_SHEET_COL]].drop_duplicates()
+    out = {}
+    for f, sh in zip(pairs[SOURCE_FILE_COL], pairs[SOURCE_SHEET_COL]):
+        out.setdefault(f, []).append(sh)
+    return out
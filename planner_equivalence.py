@@ -0,0 +1,245 @@
+import argparse
+import importlib
+import random
+import sys
+import time as _time
+from datetime import date, time, timedelta
+
+import pandas as pd
+
+from engine import LOAD_MODES, WEEKDAYS, compact_work_frame, cutoff_date, monday_of_week, urgency_band
+from planner_reference import reference_build_week_plan
+
+# =========================================================
+# Flowboard — planner equivalence harness
+# - Random backlogs + day configurations (empty areas, focus overrides,
+#   disallowed territories, disabled sessions, odd time bounds)
+# - Runs the frozen reference planner and a candidate engine on each case
+# - Asserts identical buckets (job order per session) and `remaining` order
+# - Reports the speed ratio reference / candidate
+# - --compact feeds the candidate the compact-dtype working frame instead
+# - --candidate-min-jobs lowers the engine's pre-filter threshold so the
+#   large-backlog candidate filter runs on these small cases too
+#
+# Usage: python planner_equivalence.py [--cases 2000] [--seed 0] [--engine engine:build_week_plan] [--compact]
+#        python planner_equivalence.py --candidate-min-jobs 0
+# =========================================================
+
+STREET_COL = "Street"
+
+AREA_POOL = ["Ashfield", "Burwood", "Croydon", "Drummoyne", "Enfield", "Five Dock", "Glebe", "Haberfield", "Unknown"]
+STREET_POOL = [
+    ("Smith", "St"), ("King", "Rd"), ("Queen", "Avenue"), ("Park", "Cres"), ("Hill", "Pl"),
+    ("Bay", "Drive"), ("Long Gully", "Road"), ("Church", "Lane"), ("Ocean View", "Tce"),
+]
+STATUS_POOL = ["Open", "Futile 1", "futile2", "Futile 2", "", None]
+
+
+def random_label(rng: random.Random, number: int, street: str, st_type: str, area: str) -> str:
+    kind = rng.random()
+    if kind < 0.05:
+        return ""
+    if kind < 0.15:
+        return f"Unit {rng.randint(1, 9)}, {number} {street} {st_type} — {area}"
+    if kind < 0.25:
+        return f"{rng.randint(1, 20)}/{number} {street} {st_type} — {area}"
+    if kind < 0.30:
+        return f"Lot {number} off {street} — {area}"
+    return f"{number} {street} {st_type} — {area}"
+
+
+def random_backlog(rng: random.Random, n_jobs: int, areas, week_start: date) -> pd.DataFrame:
+    rows = []
+    for i in range(n_jobs):
+        area = rng.choice(areas)
+        street, st_type = rng.choice(STREET_POOL[: rng.randint(2, len(STREET_POOL))])
+        number = rng.randint(1, 12)
+        target = None if rng.random() < 0.08 else week_start + timedelta(days=rng.randint(-75, 40))
+        rows.append({
+            "_excel_row": i + 2,
+            STREET_COL: f"{street} {st_type}" if rng.random() > 0.05 else None,
+            "_target_date": target,
+            "_cutoff_date": cutoff_date(target),
+            "_urgency": urgency_band(target, week_start),
+            "_label": random_label(rng, number, street, st_type, area),
+            "_mins": rng.choice([7, 9, 15, 20, 40, 54]),
+            "_futile_rank": rng.choice([0, 0, 0, 1, 2]) if rng.choice(STATUS_POOL) else 0,
+            "_territory": area,
+        })
+    if not rows:
+        return pd.DataFrame(columns=["_excel_row", STREET_COL, "_target_date", "_cutoff_date", "_urgency", "_label", "_mins", "_futile_rank", "_territory"])
+    return pd.DataFrame(rows)
+
+
+def random_times(rng: random.Random):
+    a = time(rng.randint(6, 10), rng.choice([0, 15, 30, 45]))
+    b = time(rng.randint(11, 18), rng.choice([0, 15, 30, 45]))
+    if rng.random() < 0.05:
+        a, b = b, a
+    return a, b
+
+
+def random_config(rng: random.Random, backlog_areas, all_areas):
+    n_days = rng.choice([0, 1, 2, 3, 5, 5, 5, 6, 7])
+    days = set(rng.sample(WEEKDAYS, n_days))
+    active_days = {d: d in days for d in WEEKDAYS}
+
+    day_sessions = {}
+    for d in WEEKDAYS:
+        if d in days:
+            day_sessions[d] = {
+                "AM": {"enabled": rng.random() > 0.1, "load": rng.choice(LOAD_MODES)},
+                "PM": {"enabled": rng.random() > 0.1, "load": rng.choice(LOAD_MODES)},
+            }
+
+    time_mode = rng.choice(["Inspection window", "Depot window"])
+    a, b = random_times(rng)
+    if time_mode == "Inspection window":
+        global_times = {"start_first": a, "latest_arrival_last": b, "depart_depot": None, "return_depot": None}
+    else:
+        global_times = {"start_first": None, "latest_arrival_last": None, "depart_depot": a, "return_depot": b}
+
+    day_override_times = {}
+    for d in days:
+        if rng.random() < 0.2:
+            oa, ob = random_times(rng)
+            day_override_times[d] = dict(global_times)
+            if time_mode == "Inspection window":
+                day_override_times[d].update(start_first=oa, latest_arrival_last=ob)
+            else:
+                day_override_times[d].update(depart_depot=oa, return_depot=ob)
+
+    day_focus = {}
+    for d in days:
+        r = rng.random()
+        if r < 0.6:
+            day_focus[d] = "(auto)"
+        elif r < 0.85 and backlog_areas:
+            day_focus[d] = rng.choice(backlog_areas)
+        elif r < 0.95:
+            day_focus[d] = rng.choice(all_areas)  # may be an area with no jobs
+        else:
+            day_focus[d] = None
+
+    day_allowed = None
+    if rng.random() < 0.6:
+        day_allowed = {}
+        for d in days:
+            r = rng.random()
+            if r < 0.15:
+                day_allowed[d] = set()
+            elif r < 0.5:
+                day_allowed[d] = set(all_areas)
+            else:
+                day_allowed[d] = set(rng.sample(all_areas, rng.randint(1, len(all_areas))))
+
+    return active_days, day_sessions, time_mode, global_times, day_override_times, day_focus, day_allowed
+
+
+def plan_signature(buckets, plan_df, remaining):
+    bucket_ids = {
+        d: {sess: [int(j["_excel_row"]) for j in items] for sess, items in sessions.items()}
+        for d, sessions in buckets.items()
+    }
+    plan_ids = [] if plan_df is None or plan_df.empty else [int(x) for x in plan_df["_excel_row"].tolist()]
+    remaining_ids = [int(j["_excel_row"]) for j in remaining]
+    return bucket_ids, plan_ids, remaining_ids
+
+
+def describe_mismatch(ref_sig, new_sig) -> str:
+    names = ["buckets", "plan_df rows", "remaining order"]
+    lines = []
+    for name, a, b in zip(names, ref_sig, new_sig):
+        if a == b:
+            continue
+        if isinstance(a, dict):
+            for d in sorted(set(a) | set(b), key=lambda x: WEEKDAYS.index(x)):
+                if a.get(d) != b.get(d):
+                    lines.append(f"  {name}[{d}]: reference={a.get(d)} candidate={b.get(d)}")
+        else:
+            first = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+            lines.append(f"  {name}: first difference at position {first} (len {len(a)} vs {len(b)})")
+    return "\n".join(lines)
+
+
+def load_engine(spec: str, candidate_min_jobs=None):
+    """
+    candidate_min_jobs: overrides the engine's CANDIDATE_MIN_JOBS, so the candidate pre-filter of large
+    Greedy plans also runs on the harness's small backlogs (0 = every plan).
+    """
+    module_name, func_name = spec.split(":", 1)
+    module = importlib.import_module(module_name)
+    if candidate_min_jobs is not None:
+        if not hasattr(module, "CANDIDATE_MIN_JOBS"):
+            raise SystemExit(f"{module_name} has no CANDIDATE_MIN_JOBS to override")
+        module.CANDIDATE_MIN_JOBS = candidate_min_jobs
+    return getattr(module, func_name)
+
+
+def run_cases(candidate, cases: int, seed: int, max_jobs: int, stop_on_first: bool = True, verbose: bool = False, compact: bool = False):
+    """Returns (mismatches, reference_seconds, candidate_seconds)."""
+    ref_total = 0.0
+    new_total = 0.0
+    mismatches = 0
+
+    for case in range(cases):
+        rng = random.Random(seed * 1_000_003 + case)
+        week_start = monday_of_week(date(2026, 1, 5) + timedelta(days=rng.randint(0, 364)))
+        all_areas = rng.sample(AREA_POOL, rng.randint(1, len(AREA_POOL)))
+        backlog_areas = all_areas[: rng.randint(1, len(all_areas))]
+        n_jobs = 0 if rng.random() < 0.03 else rng.randint(1, max_jobs)
+        df = random_backlog(rng, n_jobs, backlog_areas, week_start)
+        config = random_config(rng, backlog_areas, all_areas)
+        cand_df = compact_work_frame(df.copy(), STREET_COL) if compact else df
+
+        t0 = _time.perf_counter()
+        ref = reference_build_week_plan(df, week_start, *config, street_col=STREET_COL)
+        t1 = _time.perf_counter()
+        new = candidate(cand_df, week_start, *config, street_col=STREET_COL)
+        t2 = _time.perf_counter()
+        ref_total += t1 - t0
+        new_total += t2 - t1
+
+        ref_sig = plan_signature(*ref)
+        new_sig = plan_signature(*new)
+        if ref_sig != new_sig:
+            mismatches += 1
+            print(f"MISMATCH case {case} (seed {seed}, {n_jobs} jobs, week {week_start}):")
+            print(describe_mismatch(ref_sig, new_sig))
+            if stop_on_first:
+                break
+        elif verbose:
+            print(f"case {case}: ok ({n_jobs} jobs)")
+
+    return mismatches, ref_total, new_total
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check a planner against the frozen reference planner.")
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-jobs", type=int, default=250)
+    parser.add_argument("--engine", default="engine:build_week_plan", help="module:function of the planner under test")
+    parser.add_argument("--compact", action="store_true", help="give the candidate compact dtypes (categoricals, datetime64, small ints)")
+    parser.add_argument(
+        "--candidate-min-jobs", type=int, default=None,
+        help="backlog size from which the candidate pre-filters jobs the week can reach (0 = always)",
+    )
+    parser.add_argument("--keep-going", action="store_true", help="don't stop at the first mismatch")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    candidate = load_engine(args.engine, args.candidate_min_jobs)
+    mismatches, ref_s, new_s = run_cases(
+        candidate, args.cases, args.seed, args.max_jobs, stop_on_first=not args.keep_going, verbose=args.verbose,
+        compact=args.compact,
+    )
+
+    ratio = (ref_s / new_s) if new_s > 0 else float("inf")
+    print(f"{args.engine}: {args.cases} cases, {mismatches} mismatches")
+    print(f"reference {ref_s:.2f}s • candidate {new_s:.2f}s • speed ratio {ratio:.2f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
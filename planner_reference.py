@@ -0,0 +1,241 @@
+import re
+import pandas as pd
+from datetime import date, timedelta
+
+from engine import WEEKDAYS, session_capacity_minutes
+
+# =========================================================
+# Flowboard — frozen reference planner
+# - Verbatim copy of build_week_plan as of MVP v0.3 (street column passed in
+#   instead of read from the page's column map; geo key built with str() per
+#   cell so missing streets read "nan" on pandas 3 as they did on pandas 2)
+# - DO NOT optimise or "fix" this file: it is the behaviour every faster
+#   planner is checked against (see planner_equivalence.py)
+# =========================================================
+
+
+def reference_build_week_plan(df_in: pd.DataFrame, week_start: date, active_days, day_sessions, time_mode, global_times, day_override_times, day_focus, day_allowed=None, street_col=None):
+    jobs = df_in.copy()
+
+    # -----------------------------
+    # Priority hierarchy (lower = more urgent)
+    # -----------------------------
+    urgency_order = {"Dark Blue": 0, "Light Blue": 1, "Flexible": 2}
+    jobs["_urg_order"] = jobs["_urgency"].map(urgency_order).fillna(2).astype(int)
+
+    # Tie-breakers / sorts
+    jobs["_dark_tie"] = jobs.apply(lambda r: r.get("_futile_rank", 0) if r.get("_urgency") == "Dark Blue" else 0, axis=1)
+    jobs["_cutoff_sort"] = jobs["_cutoff_date"].fillna(date.max)
+
+    # Light geo grouping key (still helpful inside territory)
+    geo_key_cols = []
+    if street_col:
+        geo_key_cols.append(street_col)
+    if geo_key_cols and all(c in jobs.columns for c in geo_key_cols):
+        jobs["_geo_key"] = jobs[geo_key_cols].astype(object).apply(lambda c: c.map(str)).agg(" | ".join, axis=1)
+    else:
+        jobs["_geo_key"] = "Unknown"
+
+    # Sort primarily by urgency + cutoff + futile, then territory, then street
+    jobs = jobs.sort_values(
+        by=["_urg_order", "_cutoff_sort", "_dark_tie", "_territory", "_geo_key", "_mins"],
+        ascending=[True, True, True, True, True, True]
+    ).reset_index(drop=True)
+
+    # -----------------------------
+    # Buckets init
+    # -----------------------------
+    buckets = {}
+    for d in WEEKDAYS:
+        if not active_days.get(d, False):
+            continue
+        buckets[d] = {"AM": [], "PM": []}
+
+    remaining = jobs.to_dict(orient="records")
+
+    # -----------------------------
+    # Cluster key helper (conservative)
+    # -----------------------------
+    def derive_cluster_key(job: dict) -> str:
+        label = str(job.get("_label", "") or "").strip().lower()
+        if not label:
+            return f"geo|{str(job.get('_geo_key','Unknown')).strip().lower()}"
+
+        label = re.sub(r"^(unit|apt|apartment|flat)\s*\w+\s*,\s*", "", label)
+        label = re.sub(r"^[a-z0-9]+\s*/\s*", "", label)
+
+        m = re.match(r"^(\d+[a-z]?)\s+([a-z\s]+?)\s+(ave|avenue|rd|road|st|street|cres|crescent|pl|place|dr|drive|tce|terrace|ln|lane)\b", label)
+        if m:
+            num = m.group(1)
+            street = re.sub(r"\s+", " ", m.group(2).strip())
+            st_type = m.group(3)
+            return f"bldg|{num}|{street}|{st_type}"
+
+        return f"geo|{str(job.get('_geo_key','Unknown')).strip().lower()}"
+
+    # -----------------------------
+    # Territory choice (existing behaviour)
+    # -----------------------------
+    def choose_auto_territory(rem_list, allowed_terr=None):
+        """Pick the territory with the most urgent weight remaining (Dark > Light > Flexible)."""
+        if not rem_list:
+            return None
+        score = {}
+        for r in rem_list:
+            terr = str(r.get("_territory", "Unknown"))
+            if allowed_terr is not None and terr not in allowed_terr:
+                continue
+            urg = r.get("_urgency", "Flexible")
+            w = 100 if urg == "Dark Blue" else 10 if urg == "Light Blue" else 1
+            score[terr] = score.get(terr, 0) + w
+        return max(score.items(), key=lambda kv: kv[1])[0] if score else None
+
+    def pop_first_matching(predicate):
+        """Pop first item in remaining that matches predicate."""
+        for i, item in enumerate(remaining):
+            if predicate(item):
+                return remaining.pop(i)
+        return None
+
+    def peek_any(predicate):
+        """Check if any remaining item matches predicate."""
+        return any(predicate(x) for x in remaining)
+
+    # -----------------------------
+    # Core scheduling loop
+    # -----------------------------
+    for d in [wd for wd in WEEKDAYS if active_days.get(wd, False)]:
+        allowed_today = None
+        if day_allowed is not None:
+            allowed_today = set(day_allowed.get(d, []))
+            if not allowed_today:
+                allowed_today = None
+
+        focus = day_focus.get(d, "(auto)")
+        if focus is not None and focus != "(auto)" and allowed_today is not None and str(focus) not in allowed_today:
+            focus = "(auto)"
+        focus_terr = None if (focus is None or focus == "(auto)") else str(focus)
+
+        if focus_terr is None:
+            focus_terr = choose_auto_territory(remaining, allowed_today)
+
+        if focus_terr is None:
+            continue
+
+        for sess in ["AM", "PM"]:
+            if not day_sessions[d][sess]["enabled"]:
+                continue
+
+            load = day_sessions[d][sess]["load"]
+            budget = session_capacity_minutes(time_mode, global_times, day_override_times, d, sess, load)
+
+            used = 0
+            picked = []
+
+            while True:
+                tier_in_terr = None
+                for tier_name in ["Dark Blue", "Light Blue", "Flexible"]:
+                    if peek_any(lambda x, t=tier_name: str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == t):
+                        tier_in_terr = tier_name
+                        break
+
+                if tier_in_terr is None:
+                    break
+
+                anchor = pop_first_matching(lambda x: str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == tier_in_terr)
+                if not anchor:
+                    break
+
+                anchor_m = int(anchor.get("_mins", 15))
+                if used + anchor_m > int(budget * 1.10):
+                    remaining.insert(0, anchor)
+                    break
+
+                ck = derive_cluster_key(anchor)
+                batch = [anchor]
+                batch_minutes = anchor_m
+
+                def pop_same_tier_same_cluster():
+                    return pop_first_matching(
+                        lambda x: str(x.get("_territory", "Unknown")) == focus_terr
+                        and x.get("_urgency") == tier_in_terr
+                        and derive_cluster_key(x) == ck
+                    )
+
+                while len(batch) < 3:
+                    nxt = pop_same_tier_same_cluster()
+                    if not nxt:
+                        break
+                    m = int(nxt.get("_mins", 15))
+                    if used + batch_minutes + m <= int(budget * 1.10):
+                        batch.append(nxt)
+                        batch_minutes += m
+                    else:
+                        remaining.insert(0, nxt)
+                        break
+
+                if len(batch) < 3:
+                    if tier_in_terr == "Dark Blue":
+                        lower_tiers = ["Flexible", "Light Blue"]
+                    elif tier_in_terr == "Light Blue":
+                        lower_tiers = ["Flexible"]
+                    else:
+                        lower_tiers = []
+
+                    def would_starve_same_tier_if_add(extra_minutes: int) -> bool:
+                        remaining_budget_after = int(budget * 1.10) - (used + batch_minutes + extra_minutes)
+                        if remaining_budget_after <= 0:
+                            return True
+                        mins_same_tier = [
+                            int(x.get("_mins", 15))
+                            for x in remaining
+                            if str(x.get("_territory", "Unknown")) == focus_terr and x.get("_urgency") == tier_in_terr
+                        ]
+                        if not mins_same_tier:
+                            return False
+                        return remaining_budget_after < min(mins_same_tier)
+
+                    for lt in lower_tiers:
+                        while len(batch) < 3:
+                            pad = pop_first_matching(
+                                lambda x, lt=lt: str(x.get("_territory", "Unknown")) == focus_terr
+                                and x.get("_urgency") == lt
+                                and derive_cluster_key(x) == ck
+                            )
+                            if not pad:
+                                break
+
+                            m = int(pad.get("_mins", 15))
+                            if used + batch_minutes + m > int(budget * 1.10):
+                                remaining.insert(0, pad)
+                                break
+
+                            if would_starve_same_tier_if_add(m):
+                                remaining.insert(0, pad)
+                                break
+
+                            batch.append(pad)
+                            batch_minutes += m
+
+                        if len(batch) >= 3:
+                            break
+
+                for item in batch:
+                    picked.append(item)
+                used += batch_minutes
+
+            for i, job in enumerate(picked, start=1):
+                job["_planned_day"] = d
+                job["_planned_date"] = week_start + timedelta(days=WEEKDAYS.index(d))
+                job["_planned_session"] = sess
+                job["_planned_seq"] = i
+
+            buckets[d][sess] = picked
+
+    planned_rows = []
+    for d, sessions in buckets.items():
+        for sess, items in sessions.items():
+            planned_rows.extend(items)
+
+    plan_df = pd.DataFrame(planned_rows) if planned_rows else pd.DataFrame()
+    return buckets, plan_df, remaining
@@ -0,0 +1,230 @@
+import argparse
+import hashlib
+import logging
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from io import BytesIO
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from engine import WEEKDAYS, monday_of_week
+from ingest import read_backlogs
+
+# =========================================================
+# Flowboard — rerun latency harness
+# - Drives app.py headless through Streamlit's AppTest
+# - Synthetic backlogs of increasing size (Areas grow with the backlog)
+# - Scripts the usual clicks: upload, toggle days, tick matrix cells,
+#   change focus, PLAN, the review page, flipping to the pre-planned
+#   next week, export modes, Reset
+# - Records script execution time per interaction (every sample kept,
+#   the slowest one checked against that interaction's budget); matrix,
+#   focus and Reset clicks rerun only their fragment, as in the browser
+# - Exits 1 when any budget is exceeded
+#
+# Usage: python rerun_latency.py [--sizes 1000,10000,50000] [--budget plan=20 --budget matrix=1] [--format csv]
+# =========================================================
+
+APP_PATH = "app.py"
+
+# Agreed budgets, seconds per rerun (plan: click -> review page rendered)
+LATENCY_BUDGETS = {
+    "upload": 10.0,
+    "idle": 1.5,
+    "toggle_day": 1.5,
+    "matrix": 1.5,
+    "focus": 1.5,
+    "plan": 30.0,
+    "review": 2.0,
+    "week_flip": 2.0,
+    "export": 5.0,
+    "reset": 2.0,
+}
+
+SUBURB_STEMS = ["Ash", "Bur", "Croy", "Drum", "En", "Five", "Gle", "Haber", "Kings", "Lei", "Mar", "New"]
+SUBURB_TAILS = ["field", "wood", "don", "moyne", "dock", "be", "ford", "ton", "hardt", "ville"]
+STREETS = ["Smith St", "King Rd", "Queen Avenue", "Park Cres", "Hill Pl", "Bay Drive", "Church Lane", "Ocean View Tce"]
+TYPES = ["Routine", "Full condition", "Plus"]
+STATUSES = ["Open", "Futile 1", "Futile 2", ""]
+
+MATRIX_CLICKS = 3  # matrix cells unticked and re-ticked per size
+PLAN_POLL_SECONDS = 0.1
+
+
+def synthetic_backlog(n_rows: int, week_start: date, seed: int = 0) -> pd.DataFrame:
+    """Backlog rows shaped like a regional export; roughly one Area per 150 jobs (at least 5)."""
+    rng = random.Random(seed)
+    n_areas = max(5, min(len(SUBURB_STEMS) * len(SUBURB_TAILS), n_rows // 150))
+    suburbs = [f"{s}{t}" for s in SUBURB_STEMS for t in SUBURB_TAILS][:n_areas]
+    rows = []
+    for i in range(n_rows):
+        rows.append({
+            "Reference": f"REF{i:06d}",
+            "Number": rng.randint(1, 120),
+            "Street": rng.choice(STREETS),
+            "Suburb": rng.choice(suburbs),
+            "Target Date": (week_start + timedelta(days=rng.randint(-60, 30))).isoformat(),
+            "Bdrm": rng.choice([1, 2, 3, 4, None]),
+            "Inspection Type": rng.choice(TYPES),
+            "Status": rng.choice(STATUSES),
+        })
+    return pd.DataFrame(rows)
+
+
+def backlog_file(frame: pd.DataFrame, fmt: str):
+    buf = BytesIO()
+    if fmt == "xlsx":
+        frame.to_excel(buf, index=False)
+    else:
+        frame.to_csv(buf, index=False)
+    return f"synthetic_backlog.{fmt}", buf.getvalue()
+
+
+class Recorder:
+    def __init__(self, size: int):
+        self.size = size
+        self.samples = {}
+
+    def timed(self, name: str, step):
+        """Run one interaction (a callable returning the AppTest) and keep its wall time."""
+        t0 = time.perf_counter()
+        at = step()
+        self.samples.setdefault(name, []).append(time.perf_counter() - t0)
+        if at is not None and at.exception:
+            raise RuntimeError(f"{name} @ {self.size} rows: {at.exception[0].message}")
+        return at
+
+
+def upload(at: AppTest, files):
+    """What the uploader branch does, minus the widget: ingest, then put the backlog in session state."""
+    at.session_state["df"] = read_backlogs(files, all_sheets=False)
+    at.session_state["source_files"] = dict(files)
+    at.session_state["original_bytes"] = files[0][1] if files[0][0].endswith(".xlsx") else None
+    at.session_state["backlog_key"] = (tuple((name, hashlib.sha256(data).hexdigest()) for name, data in files), False)
+    return at.run()
+
+
+def refresh(at: AppTest):
+    """Untimed full rerun: after a fragment rerun AppTest only holds that fragment's elements."""
+    return at.run()
+
+
+def plan_until_review(at: AppTest, timeout: float):
+    """Click PLAN and rerun until the background plan lands on the review page."""
+    [b for b in at.button if "PLAN" in str(b.label)][0].click().run()
+    deadline = time.perf_counter() + timeout
+    while at.session_state["view"] != "review":
+        if at.exception or time.perf_counter() > deadline:
+            break
+        run = at.session_state["plan_run"]
+        if run is not None and run.status in ("pending", "running"):
+            time.sleep(PLAN_POLL_SECONDS)
+            continue
+        at.run()
+    return at
+
+
+def run_size(size: int, week_start: date, seed: int, fmt: str, timeout: float) -> Recorder:
+    rec = Recorder(size)
+    files = [backlog_file(synthetic_backlog(size, week_start, seed), fmt)]
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    rec.timed("upload", lambda: upload(at, files))
+    at.date_input(key="week_start_date").set_value(week_start).run()
+    rec.timed("idle", at.run)
+
+    for d in ("Friday", "Thursday"):
+        rec.timed("toggle_day", lambda: at.checkbox(key=f"day_{d}").uncheck().run())
+        rec.timed("toggle_day", lambda: at.checkbox(key=f"day_{d}").check().run())
+
+    areas = sorted(at.session_state["area_day_allowed"]["Monday"])
+    for a in areas[:MATRIX_CLICKS]:
+        rec.timed("matrix", lambda: at.checkbox(key=f"allow::{a}::Monday").uncheck().run())
+        rec.timed("matrix", lambda: at.checkbox(key=f"allow::{a}::Monday").check().run())
+
+    refresh(at)
+    focus = at.selectbox(key="focus_Monday")
+    if len(focus.options) > 1:
+        rec.timed("focus", lambda: at.selectbox(key="focus_Monday").set_value(focus.options[1]).run())
+        rec.timed("focus", lambda: at.selectbox(key="focus_Monday").set_value(focus.options[0]).run())
+
+    refresh(at)
+    rec.timed("plan", lambda: plan_until_review(at, timeout))
+    if at.session_state["view"] != "review":
+        raise RuntimeError(f"plan @ {size} rows: no review page after {timeout:.0f}s")
+    rec.timed("review", at.run)
+
+    # Flip to next week once the background pre-planner has it ready
+    pre = at.session_state["pre_plan"]
+    while pre is not None and not pre.finished:
+        time.sleep(PLAN_POLL_SECONDS)
+    next_week = week_start + timedelta(days=7)
+    rec.timed("week_flip", lambda: at.date_input(key="week_start_date").set_value(next_week).run())
+    if at.session_state["plan"]["week_start"] != next_week:
+        raise RuntimeError(f"week_flip @ {size} rows: next week was not pre-planned")
+
+    for mode in at.selectbox(key="export_mode").options:
+        rec.timed("export", lambda: at.selectbox(key="export_mode").set_value(mode).run())
+
+    for d in WEEKDAYS[:2]:
+        refresh(at)
+        rec.timed("reset", lambda: [b for b in at.button if b.key == f"reset_{d}"][0].click().run())
+    return rec
+
+
+def parse_budgets(items):
+    budgets = dict(LATENCY_BUDGETS)
+    for item in items or []:
+        name, _, secs = item.partition("=")
+        if name not in budgets or not secs:
+            raise SystemExit(f"--budget expects one of {', '.join(budgets)} as name=seconds, got {item!r}")
+        budgets[name] = float(secs)
+    return budgets
+
+
+def report(recorders, budgets) -> int:
+    over = 0
+    print(f"{'rows':>8}  {'interaction':<11} {'n':>3} {'median s':>9} {'max s':>8} {'budget s':>9}")
+    for rec in recorders:
+        for name, samples in rec.samples.items():
+            worst = max(samples)
+            flag = ""
+            if worst > budgets[name]:
+                over += 1
+                flag = "  OVER BUDGET"
+            print(
+                f"{rec.size:>8}  {name:<11} {len(samples):>3} {statistics.median(samples):>9.3f} "
+                f"{worst:>8.3f} {budgets[name]:>9.2f}{flag}"
+            )
+    return over
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time app.py reruns per interaction against latency budgets.")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated backlog sizes (rows)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="file type the synthetic backlog is uploaded as")
+    parser.add_argument("--budget", action="append", metavar="NAME=SECONDS", help="override a latency budget (repeatable)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-rerun AppTest timeout")
+    args = parser.parse_args(argv)
+
+    budgets = parse_budgets(args.budget)
+    logging.disable(logging.WARNING)  # keep Streamlit widget / deprecation warnings out of the report
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    week_start = monday_of_week(date.today())
+
+    recorders = []
+    for size in sizes:
+        recorders.append(run_size(size, week_start, args.seed, args.format, args.timeout))
+
+    over = report(recorders, budgets)
+    print(f"{len(sizes)} backlog sizes • {over} interaction(s) over budget")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
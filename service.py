@@ -0,0 +1,621 @@
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time as _time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import date, datetime, time, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from engine import (
+    ASSIGNMENT_MODES,
+    LOAD_MODES,
+    WEEKDAYS,
+    build_week_plan,
+    derive_work_frame,
+    monday_of_week,
+    summarise_plan,
+    with_duplicate_rows,
+)
+from export import (
+    build_lean_export_workbook,
+    build_styled_completed_workbook,
+    build_values_export_workbook,
+    plain_cell_value,
+    plan_export_order,
+)
+from ingest import (
+    COLUMN_CANDIDATES,
+    EXCEL_ROW_COL,
+    INGEST_TAG_COLS,
+    SOURCE_SHEET_COL,
+    ingested_sheets,
+    is_workbook,
+    pick_col,
+    read_backlogs,
+)
+
+# =========================================================
+# Flowboard — local planning service (HTTP/JSON)
+# - POST /plan: backlog (base64 workbook / CSV / Parquet, or JSON rows) + mapping + week + day/session config
+#   -> plan JSON, or the styled xlsx (values-only xlsx for CSV / Parquet, lean xlsx for JSON rows)
+# - GET /health
+# - Requests handled on a bounded thread pool; planning runs in a bounded process pool
+# - Every response carries per-stage timing (JSON "timing_ms" / X-Flowboard-Timing header)
+# - Stdlib only on top of the engine; `--self-test` exercises it fully offline
+#
+# Usage: python service.py [--host 127.0.0.1] [--port 8765] [--workers 2] [--timeout 120]
+#        python service.py --self-test
+# =========================================================
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+TIME_MODES = ["Inspection window", "Depot window"]
+DEFAULT_TIMES = {
+    "Inspection window": {"start_first": time(8, 30), "latest_arrival_last": time(15, 30), "depart_depot": None, "return_depot": None},
+    "Depot window": {"start_first": None, "latest_arrival_last": None, "depart_depot": time(8, 0), "return_depot": time(16, 30)},
+}
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class PlanRequestError(ValueError):
+    """Malformed /plan payload (answered with 400)."""
+
+
+# -----------------------------
+# Request parsing
+# -----------------------------
+def parse_time(value, field):
+    if value in (None, ""):
+        return None
+    try:
+        return time.fromisoformat(str(value))
+    except ValueError:
+        raise PlanRequestError(f"{field}: expected HH:MM, got {value!r}")
+
+
+def expect_object(raw, field, by_day=False):
+    """raw as a dict ({} when missing); by_day: its keys must be day names."""
+    if raw is None:
+        return {}
+    if not isinstance(raw, dict):
+        raise PlanRequestError(f"{field}: expected an object{' keyed by day' if by_day else ''}")
+    if by_day:
+        for d in raw:
+            if d not in WEEKDAYS:
+                raise PlanRequestError(f"{field}: unknown day {d!r}")
+    return raw
+
+
+def parse_day_focus(raw):
+    """`day_focus`: {day: area name}."""
+    focus = {}
+    for d, area in expect_object(raw, "day_focus", by_day=True).items():
+        if not isinstance(area, str):
+            raise PlanRequestError(f"day_focus.{d}: expected an area name")
+        focus[d] = area
+    return focus
+
+
+def parse_day_allowed(raw):
+    """`day_allowed`: {day: [area name, ...]}, or None for every area on every day."""
+    if raw is None:
+        return None
+    allowed = {}
+    for d, areas in expect_object(raw, "day_allowed", by_day=True).items():
+        if not isinstance(areas, list) or not all(isinstance(a, str) for a in areas):
+            raise PlanRequestError(f"day_allowed.{d}: expected a list of area names")
+        allowed[d] = set(areas)
+    return allowed
+
+
+def parse_colmap(raw):
+    """`colmap`: {mapping key: column name or null}; keys and columns are checked against the backlog later."""
+    colmap = expect_object(raw, "colmap")
+    for key, col in colmap.items():
+        if col is not None and not isinstance(col, str):
+            raise PlanRequestError(f"colmap.{key}: expected a column name or null")
+    return colmap
+
+
+def parse_times(raw, time_mode, field, base=None):
+    times = dict(base or DEFAULT_TIMES[time_mode])
+    for key, value in expect_object(raw, field).items():
+        if key not in times:
+            raise PlanRequestError(f"{field}: unknown time bound {key!r}")
+        times[key] = parse_time(value, f"{field}.{key}")
+    return times
+
+
+def parse_days(raw):
+    """`days`: list of day names (both sessions, Normal load) or {day: {"AM": {...}, "PM": {...}}}. Default Mon-Fri."""
+    if raw is None:
+        raw = WEEKDAYS[:5]
+    if isinstance(raw, list):
+        if not all(isinstance(d, str) for d in raw):
+            raise PlanRequestError("days: expected a list of day names")
+        raw = {d: {} for d in raw}
+    if not isinstance(raw, dict):
+        raise PlanRequestError("days: expected a list of day names or an object keyed by day")
+
+    day_sessions = {}
+    for d, cfg in raw.items():
+        if d not in WEEKDAYS:
+            raise PlanRequestError(f"days: unknown day {d!r}")
+        cfg = expect_object(cfg, f"days.{d}")
+        day_sessions[d] = {}
+        for sess in ["AM", "PM"]:
+            sess_cfg = expect_object(cfg.get(sess), f"days.{d}.{sess}")
+            load = sess_cfg.get("load", "Normal")
+            if load not in LOAD_MODES:
+                raise PlanRequestError(f"days.{d}.{sess}.load: expected one of {LOAD_MODES}")
+            enabled = sess_cfg.get("enabled", True)
+            if not isinstance(enabled, bool):
+                raise PlanRequestError(f"days.{d}.{sess}.enabled: expected true or false")
+            day_sessions[d][sess] = {"enabled": enabled, "load": load}
+    active_days = {d: d in day_sessions for d in WEEKDAYS}
+    return active_days, day_sessions
+
+
+def parse_plan_request(payload):
+    """Validated planner arguments from a /plan JSON payload."""
+    if not isinstance(payload, dict):
+        raise PlanRequestError("expected a JSON object")
+    if ("rows" in payload) == ("file" in payload):
+        raise PlanRequestError("send exactly one of `rows` (list of objects) or `file` ({name, content_base64})")
+
+    week_start = payload.get("week_start", date.today().isoformat())
+    try:
+        if not isinstance(week_start, str):
+            raise ValueError
+        week_start = monday_of_week(date.fromisoformat(week_start))
+    except ValueError:
+        raise PlanRequestError(f"week_start: expected YYYY-MM-DD, got {payload.get('week_start')!r}")
+
+    time_mode = payload.get("time_mode", "Inspection window")
+    if time_mode not in TIME_MODES:
+        raise PlanRequestError(f"time_mode: expected one of {TIME_MODES}")
+    global_times = parse_times(payload.get("times"), time_mode, "times")
+    day_override_times = {
+        d: parse_times(raw, time_mode, f"day_times.{d}", base=global_times)
+        for d, raw in expect_object(payload.get("day_times"), "day_times", by_day=True).items()
+    }
+
+    assignment = payload.get("assignment", "Greedy")
+    if assignment not in ASSIGNMENT_MODES:
+        raise PlanRequestError(f"assignment: expected one of {ASSIGNMENT_MODES}")
+
+    out_format = payload.get("format", "json")
+    if out_format not in ("json", "xlsx"):
+        raise PlanRequestError("format: expected 'json' or 'xlsx'")
+
+    active_days, day_sessions = parse_days(payload.get("days"))
+    return {
+        "week_start": week_start,
+        "active_days": active_days,
+        "day_sessions": day_sessions,
+        "time_mode": time_mode,
+        "global_times": global_times,
+        "day_override_times": day_override_times,
+        "day_focus": parse_day_focus(payload.get("day_focus")),
+        "day_allowed": parse_day_allowed(payload.get("day_allowed")),
+        "assignment": assignment,
+        "format": out_format,
+        "colmap": parse_colmap(payload.get("colmap")),
+    }
+
+
+def load_backlog(payload):
+    """(backlog frame, source workbook bytes or None, file name or None)."""
+    if "rows" in payload:
+        rows = payload["rows"]
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise PlanRequestError("rows: expected a list of objects")
+        df = pd.DataFrame(rows)
+        df[EXCEL_ROW_COL] = range(2, len(df) + 2)
+        return df, None, None
+
+    file = payload["file"]
+    if not isinstance(file, dict) or "content_base64" not in file:
+        raise PlanRequestError("file: expected {name, content_base64, all_sheets?}")
+    name = str(file.get("name") or "backlog.xlsx")
+    try:
+        data = base64.b64decode(file["content_base64"], validate=True)
+    except ValueError:
+        raise PlanRequestError("file.content_base64: not valid base64")
+    return read_backlogs([(name, data)], all_sheets=bool(file.get("all_sheets", False))), data, name
+
+
+def resolve_colmap(df, requested):
+    """Auto-detected mapping (same candidates as the page) with explicit overrides applied."""
+    cols = [c for c in df.columns if c not in INGEST_TAG_COLS]
+    cm = {key: pick_col(cols, cands) for key, cands in COLUMN_CANDIDATES.items()}
+    for key, col in requested.items():
+        if key not in COLUMN_CANDIDATES:
+            raise PlanRequestError(f"colmap: unknown key {key!r} (expected {sorted(COLUMN_CANDIDATES)})")
+        if col is not None and col not in df.columns:
+            raise PlanRequestError(f"colmap.{key}: column {col!r} not in backlog")
+        cm[key] = col
+    return cm
+
+
+# -----------------------------
+# Planning (runs in a worker process)
+# -----------------------------
+def json_value(v):
+    v = plain_cell_value(v)
+    return v.isoformat() if isinstance(v, (date, datetime)) else v
+
+
+def plan_rows_json(plan_df, cm, from_rows):
+    """Planned stops in export order (date, session, stop), read from column arrays."""
+    if plan_df is None or plan_df.empty:
+        return []
+    fields = {
+        "day": "_planned_day",
+        "date": "_planned_date",
+        "session": "_planned_session",
+        "stop": "_planned_seq",
+        "label": "_label",
+        "area": "_territory",
+        "urgency": "_urgency",
+        "est_mins": "_mins",
+        "target_date": "_target_date",
+    }
+    if from_rows:
+        fields["row"] = EXCEL_ROW_COL
+    else:
+        fields["excel_row"] = EXCEL_ROW_COL
+        if SOURCE_SHEET_COL in plan_df.columns:
+            fields["sheet"] = SOURCE_SHEET_COL
+    if cm.get("ref") in plan_df.columns:
+        fields["ref"] = cm["ref"]
+    arrays = {key: plan_df[col].to_numpy() for key, col in fields.items()}
+
+    out = []
+    for pos in plan_export_order(plan_df):
+        item = {key: json_value(arr[pos]) for key, arr in arrays.items()}
+        if from_rows:
+            item["row"] -= 2
+        out.append(item)
+    return out
+
+
+def run_plan_request(payload, submitted_at):
+    """Whole request in one worker: ingest, derive, plan, export. Returns (kind, body, timing_ms)."""
+    timing = {"queued_ms": round((_time.time() - submitted_at) * 1000, 1)}
+    t0 = _time.perf_counter()
+
+    def lap(name, since):
+        now = _time.perf_counter()
+        timing[name] = round((now - since) * 1000, 1)
+        return now
+
+    config = parse_plan_request(payload)
+    df, source_bytes, file_name = load_backlog(payload)
+    cm = resolve_colmap(df, config["colmap"])
+    t = lap("ingest_ms", t0)
+
+    df_work = derive_work_frame(df, cm, config["week_start"])
+    t = lap("derive_ms", t)
+
+    buckets, plan_df, remaining = build_week_plan(
+        df_work, config["week_start"], config["active_days"], config["day_sessions"], config["time_mode"],
+        config["global_times"], config["day_override_times"], config["day_focus"], config["day_allowed"],
+        street_col=cm.get("street"), assignment=config["assignment"],
+    )
+    t = lap("plan_ms", t)
+
+    if config["format"] == "xlsx":
+        if source_bytes is not None and is_workbook(file_name):
+            body = build_styled_completed_workbook(
+                source_bytes, with_duplicate_rows(plan_df, df_work), ingested_sheets(df).get(file_name)
+            )
+        elif source_bytes is not None:
+            body = build_values_export_workbook(with_duplicate_rows(plan_df, df_work))
+        else:
+            body = build_lean_export_workbook(plan_df, cm)
+        kind = "xlsx"
+    else:
+        summary = summarise_plan(
+            buckets, remaining, config["day_sessions"], config["time_mode"], config["global_times"], config["day_override_times"]
+        )
+        body = {
+            "week_start": config["week_start"].isoformat(),
+            "assignment": config["assignment"],
+            "colmap": cm,
+            "summary": {k: json_value(v) for k, v in summary.items()},
+            "plan": plan_rows_json(plan_df, cm, source_bytes is None),
+            "unplanned": len(remaining),
+        }
+        kind = "json"
+    lap("export_ms", t)
+    timing["total_ms"] = round((_time.perf_counter() - t0) * 1000 + timing["queued_ms"], 1)
+    return kind, body, timing
+
+
+# -----------------------------
+# HTTP server
+# -----------------------------
+class PlanningHandler(BaseHTTPRequestHandler):
+    server_version = "FlowboardPlanning/1.0"
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet:
+            super().log_message(fmt, *args)
+
+    def send_json(self, status, body, timing=None):
+        if timing is not None:
+            body = dict(body, timing_ms=timing)
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", "workers": self.server.workers})
+        else:
+            self.send_json(404, {"error": f"no route {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/plan":
+            self.send_json(404, {"error": f"no route {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.server.max_body_bytes:
+            self.send_json(413, {"error": f"body larger than {self.server.max_body_bytes} bytes"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"null")
+        except ValueError as e:
+            self.send_json(400, {"error": f"invalid JSON: {e}"})
+            return
+
+        if not self.server.slots.acquire(blocking=False):
+            self.send_json(503, {"error": "planner busy, retry later"})
+            return
+        try:
+            future = self.server.planner_pool.submit(run_plan_request, payload, _time.time())
+        except Exception as e:
+            self.server.slots.release()
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        # The slot is held until the worker is done, not until we answer: a timed-out plan still occupies it
+        future.add_done_callback(lambda _: self.server.slots.release())
+        try:
+            kind, body, timing = future.result(timeout=self.server.request_timeout)
+        except FutureTimeout:
+            future.cancel()  # drops it if it never left the queue
+            self.send_json(504, {"error": f"planning exceeded {self.server.request_timeout}s"})
+            return
+        except PlanRequestError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        if kind == "json":
+            self.send_json(200, body, timing)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", XLSX_MIME)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Disposition", 'attachment; filename="flowboard_completed.xlsx"')
+        self.send_header("X-Flowboard-Timing", json.dumps(timing))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PlanningServer(HTTPServer):
+    """
+    HTTP server with bounded concurrency: connections are handled on a thread pool and plans run
+    in a process pool of `workers`. At most `workers + queue` plans are accepted at once; beyond
+    that /plan answers 503. A timed-out plan is answered 504; it keeps its slot until its worker
+    finishes in the background (or is dropped from the queue), so timeouts cannot pile up work.
+    """
+
+    def __init__(self, address, workers=None, queue=None, request_timeout=120, max_body_bytes=MAX_BODY_BYTES, quiet=False):
+        super().__init__(address, PlanningHandler)
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+        self.quiet = quiet
+        self.slots = threading.BoundedSemaphore(self.workers + (self.workers if queue is None else queue))
+        self.planner_pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.request_pool = ThreadPoolExecutor(max_workers=self.workers * 2 + 2)
+
+    def process_request(self, request, client_address):
+        self.request_pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.request_pool.shutdown(wait=True)
+        self.planner_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def serve_in_thread(host="127.0.0.1", port=0, **kwargs):
+    """Start a PlanningServer on a daemon thread (port 0 = any free port). Returns (server, base_url)."""
+    server = PlanningServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def post_plan(base_url, payload, timeout=300):
+    """Client helper: POST /plan. Returns (status, content_type, body bytes, timing dict)."""
+    req = urllib.request.Request(
+        f"{base_url}/plan", data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, headers, body = resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        status, headers, body = e.code, e.headers, e.read()
+    ctype = headers.get("Content-Type", "")
+    if ctype == "application/json":
+        timing = json.loads(body).get("timing_ms", {})
+    else:
+        timing = json.loads(headers.get("X-Flowboard-Timing") or "{}")
+    return status, ctype, body, timing
+
+
+# -----------------------------
+# Offline self-test
+# -----------------------------
+def sample_backlog_rows(n, week_start, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    suburbs = ["Ashfield", "Burwood", "Croydon", "Drummoyne", "Enfield"]
+    streets = ["Smith St", "King Rd", "Queen Avenue", "Park Cres", "Hill Pl"]
+    rows = []
+    for i in range(n):
+        rows.append({
+            "Reference": f"REF{i:05d}",
+            "Number": rng.randint(1, 120),
+            "Street": rng.choice(streets),
+            "Suburb": rng.choice(suburbs),
+            "Target Date": (week_start + timedelta(days=rng.randint(-60, 30))).isoformat(),
+            "Bdrm": rng.choice([1, 2, 3, 4, None]),
+            "Inspection Type": rng.choice(["Routine", "Full condition", "Plus"]),
+            "Status": rng.choice(["Open", "Futile 1", "Futile 2", ""]),
+        })
+    return rows
+
+
+def self_test(workers=2, n_rows=400) -> int:
+    week_start = monday_of_week(date.today())
+    rows = sample_backlog_rows(n_rows, week_start)
+    buf = BytesIO()
+    pd.DataFrame(rows).to_excel(buf, index=False)
+    file_b64 = base64.b64encode(buf.getvalue()).decode("ascii")
+    base = {"week_start": week_start.isoformat(), "days": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]}
+
+    failures = []
+
+    def check(name, ok, detail=""):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{' — ' + detail if detail else ''}")
+        if not ok:
+            failures.append(name)
+
+    server, url = serve_in_thread(workers=workers, quiet=True)
+    try:
+        with urllib.request.urlopen(f"{url}/health", timeout=30) as resp:
+            check("GET /health", json.loads(resp.read())["status"] == "ok")
+
+        status, _, body, timing = post_plan(url, dict(base, rows=rows))
+        plan = json.loads(body)
+        check("POST /plan rows -> json", status == 200 and plan["plan"], f"{len(plan.get('plan', []))} stops, timing {timing}")
+
+        # Same answer as calling the engine directly
+        df = pd.DataFrame(rows)
+        cm = resolve_colmap(df, {})
+        config = parse_plan_request(dict(base, rows=rows))
+        _, direct_df, _ = build_week_plan(
+            derive_work_frame(df, cm, week_start), week_start, config["active_days"], config["day_sessions"],
+            config["time_mode"], config["global_times"], {}, {}, None, street_col=cm["street"],
+        )
+        direct = sorted(int(x) - 2 for x in direct_df["_excel_row"])
+        check("plan matches build_week_plan", sorted(p["row"] for p in plan["plan"]) == direct)
+
+        status, ctype, body, timing = post_plan(url, dict(base, file={"name": "backlog.xlsx", "content_base64": file_b64}, format="xlsx"))
+        check("POST /plan file -> styled xlsx", status == 200 and ctype == XLSX_MIME and body[:2] == b"PK", f"{len(body)} bytes, timing {timing}")
+
+        csv_b64 = base64.b64encode(pd.DataFrame(rows).to_csv(index=False).encode("utf-8")).decode("ascii")
+        status, ctype, body, _ = post_plan(url, dict(base, file={"name": "backlog.csv", "content_base64": csv_b64}, format="xlsx"))
+        values_ws = load_workbook(BytesIO(body), read_only=True).worksheets[0] if status == 200 else None
+        values_rows = sum(1 for _ in values_ws.iter_rows(min_row=2)) if values_ws is not None else -1
+        check("POST /plan csv -> values-only xlsx", status == 200 and values_rows == len(direct), f"{values_rows} rows")
+
+        status, _, body, _ = post_plan(url, dict(base, rows=rows, time_mode="Teleport"))
+        check("bad payload -> 400", status == 400, json.loads(body).get("error", ""))
+
+        malformed = [
+            {"day_allowed": ["Monday"]},
+            {"day_allowed": {"Monday": 5}},
+            {"day_allowed": {"Someday": ["Glebe"]}},
+            {"day_focus": {"Monday": ["Glebe"]}},
+            {"day_times": {"Monday": "08:00"}},
+            {"days": {"Monday": {"AM": "off"}}},
+            {"days": {"Monday": {"AM": {"enabled": "false"}}}},
+            {"days": {"Monday": {"PM": {"enabled": 0}}}},
+            {"week_start": 5},
+            {"week_start": None},
+            {"colmap": ["street"]},
+            {"times": "08:00"},
+        ]
+        statuses = [post_plan(url, dict(base, rows=rows, **bad))[0] for bad in malformed]
+        check("malformed week / day / mapping config -> 400", all(s == 400 for s in statuses), str(statuses))
+
+        # Concurrent requests share the bounded pool
+        t0 = _time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers * 2) as clients:
+            results = list(clients.map(lambda _: post_plan(url, dict(base, rows=rows))[0], range(workers * 2)))
+        check(f"{len(results)} concurrent requests", all(s == 200 for s in results), f"{_time.perf_counter() - t0:.2f}s wall")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # A timed-out plan keeps its slot until its worker is done, so a second request is turned away meanwhile
+    server, url = serve_in_thread(workers=1, queue=0, request_timeout=0.01, quiet=True)
+    try:
+        first = post_plan(url, dict(base, rows=rows))[0]
+        second = post_plan(url, dict(base, rows=rows))[0]
+        check("timed-out plan holds its slot", (first, second) == (504, 503), f"{first}, {second}")
+        released = server.slots.acquire(timeout=60)
+        if released:
+            server.slots.release()
+        check("slot released when the worker finishes", released)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print("self-test passed" if not failures else f"self-test FAILED: {', '.join(failures)}")
+    return 1 if failures else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Flowboard local planning service (HTTP/JSON).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="planner processes (default: min(4, CPUs))")
+    parser.add_argument("--queue", type=int, default=None, help="plans allowed to wait for a worker (default: --workers)")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a plan request answers 504")
+    parser.add_argument("--self-test", action="store_true", help="start on a free port, run offline checks, exit")
+    args = parser.parse_args(argv)
+
+    if args.self_test:
+        return self_test(workers=args.workers or 2)
+
+    server = PlanningServer((args.host, args.port), workers=args.workers, queue=args.queue, request_timeout=args.timeout)
+    print(f"Flowboard planning service on http://{args.host}:{server.server_address[1]} ({server.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())